@@ -1,6 +1,49 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from decimal import Decimal
+
+
+class ClientQuerySet(models.QuerySet):
+    """QuerySet des clients avec synthèse financière"""
+    
+    def with_summary(self):
+        """
+        Annote nombre de projets (total et en cours), total facturé TTC, reste à payer
+        des factures non soldées et date de la dernière facture, en une seule requête
+        (sous-requêtes corrélées)
+        """
+        from apps.invoicing.models import Facture
+        from apps.projects.models import Projet
+        
+        montant = models.DecimalField(max_digits=15, decimal_places=2)
+        
+        def agregat(queryset, expression, output_field, defaut):
+            return Coalesce(Subquery(
+                queryset.filter(client=OuterRef('pk')).order_by().values('client').annotate(
+                    valeur=expression
+                ).values('valeur'),
+                output_field=output_field
+            ), Value(defaut, output_field=output_field))
+        
+        return self.annotate(
+            nombre_projets=agregat(Projet.objects.all(), Count('pk'), models.IntegerField(), 0),
+            nombre_projets_actifs=agregat(
+                Projet.objects.filter(statut='En_cours'), Count('pk'), models.IntegerField(), 0
+            ),
+            total_factures=agregat(Facture.objects.all(), Sum('montant_ttc'), montant, Decimal('0')),
+            factures_impayees=agregat(
+                Facture.objects.exclude(statut_paiement='Payée'),
+                Sum(F('montant_ttc') - F('montant_paye')), montant, Decimal('0')
+            ),
+            derniere_facture=Subquery(
+                Facture.objects.filter(client=OuterRef('pk')).order_by().values('client').annotate(
+                    valeur=Max('date_emission')
+                ).values('valeur')
+            ),
+        )
 
 
 class Client(models.Model):
@@ -80,6 +123,8 @@ class Client(models.Model):
         verbose_name='Date de modification'
     )
     
+    objects = ClientQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Client'
         verbose_name_plural = 'Clients'
@@ -98,16 +143,26 @@ class Client(models.Model):
     def get_absolute_url(self):
         return reverse('clients:detail', kwargs={'pk': self.pk})
     
+    def has_summary(self):
+        """Indique si l'instance provient de Client.objects.with_summary()"""
+        return 'factures_impayees' in self.__dict__
+    
     def get_projets_count(self):
         """Retourne le nombre de projets du client"""
+        if self.has_summary():
+            return self.nombre_projets
         return self.projets.count()
     
     def get_projets_actifs_count(self):
         """Retourne le nombre de projets actifs du client"""
+        if self.has_summary():
+            return self.nombre_projets_actifs
         return self.projets.filter(statut='En_cours').count()
     
     def get_total_factures(self):
         """Retourne le montant total des factures du client"""
+        if self.has_summary():
+            return self.total_factures
         from apps.invoicing.models import Facture
         total = Facture.objects.filter(client=self).aggregate(
             total=models.Sum('montant_ttc')
@@ -116,12 +171,14 @@ class Client(models.Model):
     
     def get_factures_impayees(self):
         """Retourne le montant des factures impayées"""
+        if self.has_summary():
+            return self.factures_impayees
         from apps.invoicing.models import Facture
         total = Facture.objects.filter(
             client=self
         ).exclude(
             statut_paiement='Payée'
         ).aggregate(
-            total=models.Sum('montant_restant')
+            total=models.Sum(models.F('montant_ttc') - models.F('montant_paye'))
         )['total']
         return total or 0
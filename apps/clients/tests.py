@@ -0,0 +1,108 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date, timedelta
+
+from apps.clients.models import Client
+from apps.invoicing.models import Facture
+from apps.projects.models import Projet
+
+User = get_user_model()
+
+
+class ClientSyntheseTest(TestCase):
+    """Tests pour Client.objects.with_summary()"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client_a = Client.objects.create(nom_complet='Client A', telephone='622000000')
+        self.client_b = Client.objects.create(nom_complet='Client B', telephone='622000001')
+        self.client_c = Client.objects.create(nom_complet='Client C', telephone='622000002')
+        
+        for numero, statut in enumerate(['En_cours', 'En_cours', 'Terminé']):
+            Projet.objects.create(
+                code_projet=f'PROJ-TEST-{numero:03d}',
+                nom_projet=f'Projet {numero}',
+                client=self.client_a,
+                montant_prevu=Decimal('10000000.00'),
+                date_debut=date.today(),
+                statut=statut
+            )
+        
+        self.creer_facture(self.client_a, date(2026, 1, 10), montant_paye='118000.00')
+        self.creer_facture(self.client_a, date(2026, 3, 5), montant_paye='18000.00')
+        self.creer_facture(self.client_b, date(2026, 2, 1))
+    
+    def creer_facture(self, client, date_emission, montant_paye='0'):
+        """Crée une facture de 118 000 GNF TTC"""
+        facture = Facture.objects.create(
+            client=client,
+            date_emission=date_emission,
+            date_echeance=date_emission + timedelta(days=30),
+            montant_ht=Decimal('100000.00'),
+            taux_tva=Decimal('18.00'),
+            montant_paye=Decimal('0'),
+            cree_par=self.user
+        )
+        if Decimal(montant_paye):
+            Facture.appliquer_paiement(facture.pk, montant_paye)
+        return facture
+    
+    def test_annotations_identiques_aux_methodes(self):
+        """Test : Les annotations correspondent aux méthodes du modèle"""
+        for client in Client.objects.with_summary():
+            reference = Client.objects.get(pk=client.pk)
+            self.assertEqual(client.get_projets_count(), reference.get_projets_count())
+            self.assertEqual(client.get_projets_actifs_count(), reference.get_projets_actifs_count())
+            self.assertEqual(client.get_total_factures(), reference.get_total_factures())
+            self.assertEqual(client.get_factures_impayees(), reference.get_factures_impayees())
+    
+    def test_valeurs(self):
+        """Test : Valeurs de la synthèse, y compris pour un client sans projet ni facture"""
+        clients = {client.pk: client for client in Client.objects.with_summary()}
+        
+        client_a = clients[self.client_a.pk]
+        self.assertEqual(client_a.nombre_projets, 3)
+        self.assertEqual(client_a.nombre_projets_actifs, 2)
+        self.assertEqual(client_a.total_factures, Decimal('236000.00'))
+        self.assertEqual(client_a.factures_impayees, Decimal('100000.00'))
+        self.assertEqual(client_a.derniere_facture, date(2026, 3, 5))
+        
+        client_c = clients[self.client_c.pk]
+        self.assertEqual(client_c.nombre_projets, 0)
+        self.assertEqual(client_c.total_factures, Decimal('0'))
+        self.assertEqual(client_c.factures_impayees, Decimal('0'))
+        self.assertIsNone(client_c.derniere_facture)
+    
+    def test_une_seule_requete(self):
+        """Test : La synthèse de tous les clients est lue en une seule requête"""
+        with self.assertNumQueries(1):
+            for client in Client.objects.with_summary():
+                client.get_projets_count()
+                client.get_projets_actifs_count()
+                client.get_total_factures()
+                client.get_factures_impayees()
+    
+    def test_tri_par_reste_a_payer(self):
+        """Test : Les clients se trient par reste à payer en base"""
+        clients = list(Client.objects.with_summary().order_by('-factures_impayees', 'nom_complet'))
+        
+        self.assertEqual(clients, [self.client_b, self.client_a, self.client_c])
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_liste_triee_et_paginee(self):
+        """Test : La liste des clients est triée par reste à payer et paginée en base"""
+        self.client.force_login(self.user)
+        
+        reponse = self.client.get(reverse('clients:list'), {'tri': 'solde'})
+        
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(
+            [client.pk for client in reponse.context['clients']],
+            [self.client_b.pk, self.client_a.pk, self.client_c.pk]
+        )
@@ -4,7 +4,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.urls import reverse_lazy
-from django.db.models import Q
+from django.db.models import F, Q
 from .models import Client
 from .forms import ClientForm
 
@@ -16,8 +16,18 @@ class ClientListView(LoginRequiredMixin, ListView):
     context_object_name = 'clients'
     paginate_by = 20
     
+    # Tris proposés (paramètre GET `tri`), appliqués en base avant la pagination
+    TRIS = {
+        'nom': ['nom_complet', 'pk'],
+        'solde': ['-factures_impayees', 'nom_complet', 'pk'],
+        'facture': ['-total_factures', 'nom_complet', 'pk'],
+        'derniere_facture': [F('derniere_facture').desc(nulls_last=True), 'nom_complet', 'pk'],
+    }
+    
     def get_queryset(self):
-        queryset = Client.objects.all()
+        queryset = Client.objects.with_summary().order_by(
+            *self.TRIS.get(self.request.GET.get('tri'), self.TRIS['nom'])
+        )
         search = self.request.GET.get('search')
         if search:
             queryset = queryset.filter(
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.models import SequenceNumerotation
+
+
+class Command(BaseCommand):
+    help = 'Initialise les compteurs de numérotation des documents à partir des données existantes'
+
+    def handle(self, *args, **options):
+        nombre = SequenceNumerotation.initialiser()
+        self.stdout.write(self.style.SUCCESS(f'✓ {nombre} compteur(s) de numérotation initialisé(s)'))
+
+        for compteur in SequenceNumerotation.objects.all():
+            self.stdout.write(f'  {compteur}')
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceNumerotation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefixe', models.CharField(max_length=10, verbose_name='Préfixe')),
+                ('annee', models.PositiveIntegerField(verbose_name='Année')),
+                ('dernier_numero', models.PositiveIntegerField(default=0, verbose_name='Dernier numéro attribué')),
+                ('date_modification', models.DateTimeField(auto_now=True, verbose_name='Date de modification')),
+            ],
+            options={
+                'verbose_name': 'Séquence de numérotation',
+                'verbose_name_plural': 'Séquences de numérotation',
+                'ordering': ['prefixe', '-annee'],
+                'unique_together': {('prefixe', 'annee')},
+            },
+        ),
+    ]
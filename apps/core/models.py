@@ -1,4 +1,8 @@
-from django.db import models
+from datetime import datetime
+
+from django.apps import apps
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
@@ -304,3 +308,131 @@ class Notification(models.Model):
             'Succès': 'bg-success',
         }
         return type_classes.get(self.type, 'bg-secondary')
+
+
+class SequenceNumerotation(models.Model):
+    """
+    Compteur de numérotation des documents (une ligne par préfixe et par année).
+    
+    Les numéros sont alloués par un UPDATE atomique du compteur : deux créations
+    concurrentes ne peuvent pas obtenir le même numéro.
+    """
+    # Préfixe -> (modèle, champ du code, nombre de chiffres)
+    SOURCES = {
+        'PROJ': ('projects.Projet', 'code_projet', 3),
+        'DEV': ('invoicing.Devis', 'numero_devis', 3),
+        'FACT': ('invoicing.Facture', 'numero_facture', 3),
+        'ACH': ('inventory.Achat', 'numero_achat', 4),
+        'PROD': ('inventory.Produit', 'code_produit', 4),
+        'TRF': ('inventory.MouvementStock', 'numero_transfert', 4),
+    }
+    
+    prefixe = models.CharField(
+        max_length=10,
+        verbose_name='Préfixe'
+    )
+    annee = models.PositiveIntegerField(
+        verbose_name='Année'
+    )
+    dernier_numero = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Dernier numéro attribué'
+    )
+    date_modification = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Date de modification'
+    )
+    
+    class Meta:
+        verbose_name = 'Séquence de numérotation'
+        verbose_name_plural = 'Séquences de numérotation'
+        ordering = ['prefixe', '-annee']
+        unique_together = [['prefixe', 'annee']]
+    
+    def __str__(self):
+        return f"{self.prefixe}-{self.annee} : {self.dernier_numero}"
+    
+    @classmethod
+    def formater(cls, prefixe, annee, numero):
+        """Formate un numéro de document (ex : FACT-2025-007)"""
+        chiffres = cls.SOURCES[prefixe][2]
+        return f'{prefixe}-{annee}-{numero:0{chiffres}d}'
+    
+    @classmethod
+    def numero_max_existant(cls, prefixe, annee):
+        """Plus grand numéro déjà utilisé dans la table source pour ce préfixe et cette année"""
+        modele, champ, _ = cls.SOURCES[prefixe]
+        debut = f'{prefixe}-{annee}-'
+        numeros = [
+            int(code[len(debut):])
+            for code in apps.get_model(modele).objects.filter(
+                **{f'{champ}__startswith': debut}
+            ).values_list(champ, flat=True)
+            if code[len(debut):].isdigit()
+        ]
+        return max(numeros, default=0)
+    
+    @classmethod
+    def reserver(cls, prefixe, nombre=1, annee=None):
+        """
+        Réserve `nombre` numéros consécutifs et retourne la liste des codes formatés.
+        
+        Le compteur est incrémenté en une seule requête UPDATE ; s'il n'existe pas
+        encore, il est créé à partir des numéros déjà présents en base.
+        """
+        if nombre < 1:
+            return []
+        annee = annee or datetime.now().year
+        compteur = cls.objects.filter(prefixe=prefixe, annee=annee)
+        
+        with transaction.atomic():
+            if not compteur.update(dernier_numero=F('dernier_numero') + nombre):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(
+                            prefixe=prefixe,
+                            annee=annee,
+                            dernier_numero=cls.numero_max_existant(prefixe, annee) + nombre
+                        )
+                except IntegrityError:
+                    # Compteur créé entre-temps par une autre transaction
+                    compteur.update(dernier_numero=F('dernier_numero') + nombre)
+            dernier = compteur.select_for_update().values_list('dernier_numero', flat=True).get()
+        
+        return [
+            cls.formater(prefixe, annee, numero)
+            for numero in range(dernier - nombre + 1, dernier + 1)
+        ]
+    
+    @classmethod
+    def prochain_code(cls, prefixe, annee=None):
+        """Attribue le prochain numéro de document pour ce préfixe"""
+        return cls.reserver(prefixe, 1, annee)[0]
+    
+    @classmethod
+    def initialiser(cls):
+        """
+        (Re)cale tous les compteurs sur les numéros existants en base.
+        Un compteur n'est jamais diminué. Retourne le nombre de compteurs mis à jour.
+        """
+        nombre = 0
+        for prefixe, (modele, champ, _) in cls.SOURCES.items():
+            annees = {
+                int(code.split('-')[1])
+                for code in apps.get_model(modele).objects.filter(
+                    **{f'{champ}__regex': rf'^{prefixe}-[0-9]{{4}}-'}
+                ).values_list(champ, flat=True)
+            }
+            for annee in annees:
+                with transaction.atomic():
+                    maximum = cls.numero_max_existant(prefixe, annee)
+                    compteur, created = cls.objects.select_for_update().get_or_create(
+                        prefixe=prefixe,
+                        annee=annee,
+                        defaults={'dernier_numero': maximum}
+                    )
+                    if created or compteur.dernier_numero < maximum:
+                        compteur.dernier_numero = max(compteur.dernier_numero, maximum)
+                        compteur.save(update_fields=['dernier_numero', 'date_modification'])
+                        nombre += 1
+        return nombre
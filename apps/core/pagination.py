@@ -0,0 +1,316 @@
+"""
+Pagination des longues listes.
+
+- Par curseur (keyset) : au lieu d'un OFFSET, chaque page est lue à partir du
+  couple (date, id) de la dernière ligne affichée ; le coût d'une page ne dépend
+  plus de sa profondeur et aucune ligne n'est répétée ni sautée quand plusieurs
+  lignes partagent la même date. Les jetons de page sont opaques (signés) et
+  transmis dans le paramètre `page`.
+- Par numéro avec comptage approximatif : pas de COUNT(*) sur les listes non
+  filtrées ou largement filtrées ; la page suivante est détectée en lisant une
+  ligne de plus que la taille de page.
+"""
+from collections.abc import Sequence
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import cached_property
+
+SEL_JETON = 'apps.core.pagination'
+SUIVANT = 'suivant'
+PRECEDENT = 'precedent'
+
+
+class KeysetPage(Sequence):
+    """Page de résultats, compatible avec l'API de django.core.paginator.Page"""
+
+    def __init__(self, object_list, paginator, suivante, precedente):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._suivante = suivante
+        self._precedente = precedente
+
+    def __repr__(self):
+        return f'<KeysetPage de {len(self)} élément(s)>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._suivante
+
+    def has_previous(self):
+        return self._precedente
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_token(self):
+        """Jeton de la page suivante (None s'il n'y en a pas)"""
+        if not self.has_next():
+            return None
+        return self.paginator.encoder_jeton(SUIVANT, self.object_list[-1])
+
+    @property
+    def previous_token(self):
+        """Jeton de la page précédente (None s'il n'y en a pas)"""
+        if not self.has_previous():
+            return None
+        return self.paginator.encoder_jeton(PRECEDENT, self.object_list[0])
+
+    # Noms de django.core.paginator.Page, pour les liens ?page=... existants
+    def next_page_number(self):
+        return self.next_token
+
+    def previous_page_number(self):
+        return self.previous_token
+
+
+class KeysetPaginator:
+    """
+    Paginateur par curseur sur (champ de tri, id).
+
+    Le champ de tri est le premier champ de l'ordre du queryset (ou du Meta.ordering
+    du modèle) ; l'id départage les ex aequo. Un index composite (champ, id) rend
+    chaque page aussi rapide que la première. Ne calcule ni nombre total de lignes
+    ni nombre de pages.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.model = object_list.model
+
+        ordre = list(object_list.query.order_by or self.model._meta.ordering)
+        if not ordre or not isinstance(ordre[0], str):
+            raise ValueError('KeysetPaginator nécessite un queryset trié par un champ')
+        self.descendant = ordre[0].startswith('-')
+        self.champ = ordre[0].lstrip('-')
+        self.field = self.model._meta.get_field(self.champ)
+
+    def _ordre(self, descendant):
+        if descendant:
+            return (f'-{self.champ}', '-pk')
+        return (self.champ, 'pk')
+
+    def _apres(self, valeur, pk, descendant):
+        """Lignes situées après (valeur, pk) dans l'ordre indiqué"""
+        if descendant:
+            return Q(**{f'{self.champ}__lte': valeur}) & (
+                Q(**{f'{self.champ}__lt': valeur}) | Q(pk__lt=pk)
+            )
+        return Q(**{f'{self.champ}__gte': valeur}) & (
+            Q(**{f'{self.champ}__gt': valeur}) | Q(pk__gt=pk)
+        )
+
+    def encoder_jeton(self, sens, objet):
+        """Jeton opaque désignant la page située dans `sens` par rapport à `objet`"""
+        valeur = getattr(objet, self.champ)
+        return signing.dumps(
+            [sens, valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur, objet.pk],
+            salt=SEL_JETON
+        )
+
+    def decoder_jeton(self, jeton):
+        """Retourne (sens, valeur, pk) ; lève InvalidPage si le jeton est invalide"""
+        try:
+            sens, valeur, pk = signing.loads(jeton, salt=SEL_JETON)
+            if sens not in (SUIVANT, PRECEDENT):
+                raise ValueError(sens)
+            return sens, self.field.to_python(valeur), pk
+        except (signing.BadSignature, TypeError, ValueError):
+            raise InvalidPage('Jeton de page invalide')
+
+    def page(self, jeton=None):
+        """Retourne la page désignée par `jeton` (première page si vide)"""
+        sens = SUIVANT
+        queryset = self.object_list
+        if jeton:
+            sens, valeur, pk = self.decoder_jeton(jeton)
+
+        # Vers la page précédente, on lit dans l'ordre inverse puis on retourne la page
+        descendant = self.descendant if sens == SUIVANT else not self.descendant
+        if jeton:
+            queryset = queryset.filter(self._apres(valeur, pk, descendant))
+        lignes = list(queryset.order_by(*self._ordre(descendant))[:self.per_page + 1])
+        encore = len(lignes) > self.per_page
+        lignes = lignes[:self.per_page]
+
+        if sens == PRECEDENT:
+            lignes.reverse()
+            return KeysetPage(lignes, self, suivante=True, precedente=encore)
+        return KeysetPage(lignes, self, suivante=encore, precedente=bool(jeton))
+
+    def get_page(self, jeton=None):
+        """Comme page(), mais retourne la première page si le jeton est invalide"""
+        try:
+            return self.page(jeton)
+        except InvalidPage:
+            return self.page()
+
+
+class KeysetPaginationMixin:
+    """
+    Pagination par curseur pour les ListView : le paramètre `page` porte un
+    jeton opaque au lieu d'un numéro
+    """
+    paginator_class = KeysetPaginator
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(queryset, page_size)
+        page = paginator.get_page(self.request.GET.get(self.page_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+# ===== COMPTAGE APPROXIMATIF =====
+
+DUREE_COMPTEUR = 300  # secondes
+_modeles_comptes = set()
+
+
+def _cle_compteur(model):
+    return f'pagination:compteur:{model._meta.db_table}'
+
+
+def _ligne_creee(sender, instance, created, **kwargs):
+    if created:
+        try:
+            cache.incr(_cle_compteur(sender))
+        except ValueError:
+            pass
+
+
+def _ligne_supprimee(sender, instance, **kwargs):
+    try:
+        cache.decr(_cle_compteur(sender))
+    except ValueError:
+        pass
+
+
+def _suivre_compteur(model):
+    """Tient le compteur en cache à jour à chaque création ou suppression unitaire"""
+    if model in _modeles_comptes:
+        return
+    _modeles_comptes.add(model)
+    uid = f'pagination:compteur:{model._meta.label}'
+    post_save.connect(_ligne_creee, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(_ligne_supprimee, sender=model, weak=False, dispatch_uid=uid)
+
+
+def estimer_nombre_lignes(model, using='default'):
+    """
+    Nombre approximatif de lignes de la table du modèle, sans COUNT(*) :
+    statistiques de la table sur MySQL et PostgreSQL ; ailleurs (SQLite), compteur
+    en cache tenu à jour par les signaux et recalculé au plus toutes les
+    DUREE_COMPTEUR secondes (les opérations en masse ne le mettent pas à jour).
+    Retourne None si aucune estimation n'est disponible.
+    """
+    connexion = connections[using]
+    table = model._meta.db_table
+    if connexion.vendor in ('mysql', 'postgresql'):
+        with connexion.cursor() as curseur:
+            if connexion.vendor == 'mysql':
+                curseur.execute(
+                    'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                    'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [table]
+                )
+            else:
+                curseur.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            ligne = curseur.fetchone()
+        return ligne[0] if ligne and ligne[0] is not None and ligne[0] >= 0 else None
+
+    _suivre_compteur(model)
+    cle = _cle_compteur(model)
+    nombre = cache.get(cle)
+    if nombre is None:
+        nombre = model._default_manager.using(using).count()
+        cache.set(cle, nombre, timeout=DUREE_COMPTEUR)
+    return nombre
+
+
+class ApproximatePage(Page):
+    """Page dont l'existence d'une page suivante est connue par la lecture d'une ligne de plus"""
+
+    def __init__(self, object_list, number, paginator, suivante):
+        super().__init__(object_list, number, paginator)
+        self._suivante = suivante
+
+    def has_next(self):
+        return self._suivante
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginateur par numéro sans COUNT(*) exact sur les grandes listes.
+
+    Le nombre total n'est compté exactement que si la liste est filtrée et compte
+    au plus `seuil_exact` lignes (vérifié par une lecture bornée) ; sinon il est
+    estimé (estimer_nombre_lignes) et `compte_exact` vaut False. Chaque page lit
+    per_page + 1 lignes pour savoir s'il existe une page suivante.
+    """
+    seuil_exact = 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compte_exact = True
+
+    @property
+    def compte_exact(self):
+        """Indique si `count` est exact (le calcule au besoin)"""
+        self.count
+        return self._compte_exact
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            nombre = queryset.order_by().values('pk')[:self.seuil_exact + 1].count()
+            if nombre <= self.seuil_exact:
+                return nombre
+        estimation = estimer_nombre_lignes(queryset.model, queryset.db)
+        if estimation is None or estimation <= self.seuil_exact:
+            return queryset.count()
+        self._compte_exact = False
+        return estimation
+
+    def validate_number(self, number):
+        if self.compte_exact:
+            return super().validate_number(number)
+        # Nombre de pages estimé : seule la borne inférieure est vérifiée
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("Ce numéro de page n'est pas un entier")
+        if number < 1:
+            raise EmptyPage('Ce numéro de page est inférieur à 1')
+        return number
+
+    def _fixer_compte(self, nombre, exact):
+        self.count = nombre
+        self._compte_exact = exact
+        self.__dict__.pop('num_pages', None)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.compte_exact:
+            return super().page(number)
+
+        debut = (number - 1) * self.per_page
+        lignes = list(self.object_list[debut:debut + self.per_page + 1])
+        if not lignes and number > 1:
+            # Estimation trop haute (lien « Dernière ») : dernière page réelle
+            self._fixer_compte(self.object_list.count(), True)
+            return super().page(self.num_pages)
+        suivante = len(lignes) > self.per_page
+        if suivante and number >= self.num_pages:
+            # Estimation trop basse : le nombre de pages suit la navigation
+            self._fixer_compte(number * self.per_page + 1, False)
+        return ApproximatePage(lignes[:self.per_page], number, self, suivante)
@@ -0,0 +1,389 @@
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.urls import reverse
+from django.core.paginator import InvalidPage
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.clients.models import Client
+from apps.core.models import Parametre, SequenceNumerotation
+from apps.core.pagination import ApproximateCountPaginator, KeysetPaginator, estimer_nombre_lignes
+from apps.core.utils.bulk import completer_cles_primaires
+from apps.core.utils.requetes import DateReferenceMixin
+from apps.finances.models import Transaction
+from apps.invoicing.models import Facture
+from apps.projects.models import Projet
+
+User = get_user_model()
+
+
+class SequenceNumerotationTest(TestCase):
+    """Tests pour les compteurs de numérotation des documents"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client_obj = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        self.annee = datetime.now().year
+    
+    def test_numeros_consecutifs(self):
+        """Test : Les numéros attribués se suivent sans doublon"""
+        projets = [
+            Projet.objects.create(nom_projet=f'Projet {i}', client=self.client_obj)
+            for i in range(3)
+        ]
+        self.assertEqual(
+            [projet.code_projet for projet in projets],
+            [f'PROJ-{self.annee}-{i:03d}' for i in range(1, 4)]
+        )
+    
+    def test_compteur_initialise_depuis_les_donnees(self):
+        """Test : Un nouveau compteur reprend après le plus grand numéro existant"""
+        Projet.objects.create(
+            code_projet=f'PROJ-{self.annee}-1005',
+            nom_projet='Projet importé',
+            client=self.client_obj
+        )
+        projet = Projet.objects.create(nom_projet='Projet suivant', client=self.client_obj)
+        self.assertEqual(projet.code_projet, f'PROJ-{self.annee}-1006')
+    
+    def test_reservation_en_bloc(self):
+        """Test : Une réservation retourne un bloc contigu et avance le compteur"""
+        codes = SequenceNumerotation.reserver('FACT', 5)
+        self.assertEqual(codes[0], f'FACT-{self.annee}-001')
+        self.assertEqual(codes[-1], f'FACT-{self.annee}-005')
+        self.assertEqual(SequenceNumerotation.prochain_code('FACT'), f'FACT-{self.annee}-006')
+        self.assertEqual(SequenceNumerotation.reserver('FACT', 0), [])
+    
+    def test_une_requete_par_numero_attribue(self):
+        """Test : Un compteur existant est incrémenté sans lire la table source"""
+        SequenceNumerotation.prochain_code('DEV')
+        with CaptureQueriesContext(connection) as requetes:
+            SequenceNumerotation.prochain_code('DEV')
+        sql = [
+            requete['sql'] for requete in requetes.captured_queries
+            if 'SAVEPOINT' not in requete['sql']
+        ]
+        self.assertEqual(len(sql), 2)
+        self.assertTrue(sql[0].startswith('UPDATE'))
+    
+    def test_commande_initialisation(self):
+        """Test : La commande cale les compteurs sur les données existantes"""
+        Projet.objects.create(
+            code_projet='PROJ-2020-042',
+            nom_projet='Ancien projet',
+            client=self.client_obj
+        )
+        call_command('seed_document_sequences', stdout=open('/dev/null', 'w'))
+        compteur = SequenceNumerotation.objects.get(prefixe='PROJ', annee=2020)
+        self.assertEqual(compteur.dernier_numero, 42)
+        self.assertEqual(SequenceNumerotation.prochain_code('PROJ', 2020), 'PROJ-2020-043')
+
+
+class SequenceNumerotationConcurrenceTest(TransactionTestCase):
+    """Test de charge : créations concurrentes de factures"""
+    NOMBRE_THREADS = 8
+    FACTURES_PAR_THREAD = 250
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client_obj = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+    
+    def creer_factures(self, erreurs):
+        try:
+            for _ in range(self.FACTURES_PAR_THREAD):
+                Facture.objects.create(
+                    client=self.client_obj,
+                    date_emission=date.today(),
+                    date_echeance=date.today(),
+                    montant_ht=Decimal('100000.00'),
+                    taux_tva=Decimal('18.00'),
+                    montant_paye=Decimal('0'),
+                    cree_par=self.user
+                )
+        except Exception as exc:
+            erreurs.append(exc)
+        finally:
+            connections.close_all()
+    
+    def test_aucun_doublon(self):
+        """Test : Des milliers de factures créées en parallèle ont des numéros uniques"""
+        
+        erreurs = []
+        threads = [
+            threading.Thread(target=self.creer_factures, args=(erreurs,))
+            for _ in range(self.NOMBRE_THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(erreurs, [])
+        total = self.NOMBRE_THREADS * self.FACTURES_PAR_THREAD
+        numeros = list(Facture.objects.values_list('numero_facture', flat=True))
+        self.assertEqual(len(numeros), total)
+        self.assertEqual(len(set(numeros)), total)
+
+
+class KeysetPaginatorTest(TestCase):
+    """Tests pour la pagination par curseur (date, id)"""
+    
+    def setUp(self):
+        """Préparation des données de test : 53 transactions sur 5 dates (nombreux ex aequo)"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        self.projet = Projet.objects.create(
+            code_projet='PROJ-TEST-001',
+            nom_projet='Projet Test',
+            client=client,
+            montant_prevu=Decimal('10000000.00'),
+            date_debut=date.today(),
+            statut='En_cours'
+        )
+        Transaction.objects.bulk_create([
+            self.transaction(date(2026, 1, 1 + numero % 5)) for numero in range(53)
+        ])
+        self.attendus = list(
+            Transaction.objects.order_by('-date_transaction', '-pk').values_list('pk', flat=True)
+        )
+    
+    def transaction(self, date_transaction):
+        return Transaction(
+            projet=self.projet, type='Dépôt', montant=Decimal('1000.00'),
+            date_transaction=date_transaction, saisi_par=self.user
+        )
+    
+    def parcourir(self, paginator):
+        """Parcourt toutes les pages vers l'avant ; retourne la liste des pages"""
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_token))
+        return pages
+    
+    def test_parcours_complet_sans_doublon(self):
+        """Test : Le parcours des pages restitue chaque ligne une fois, dans l'ordre"""
+        pages = self.parcourir(KeysetPaginator(Transaction.objects.all(), 10))
+        
+        self.assertEqual([len(page) for page in pages], [10, 10, 10, 10, 10, 3])
+        self.assertEqual([transaction.pk for page in pages for transaction in page], self.attendus)
+        self.assertFalse(pages[0].has_previous())
+        self.assertFalse(pages[-1].has_next())
+    
+    def test_retour_en_arriere(self):
+        """Test : Les jetons précédents restituent les mêmes pages"""
+        pages = self.parcourir(KeysetPaginator(Transaction.objects.all(), 10))
+        paginator = KeysetPaginator(Transaction.objects.all(), 10)
+        
+        page = pages[-1]
+        for attendue in reversed(pages[:-1]):
+            page = paginator.page(page.previous_token)
+            self.assertEqual(list(page), list(attendue))
+        self.assertFalse(page.has_previous())
+    
+    def test_insertion_entre_deux_pages(self):
+        """Test : Une ligne insérée en tête ne décale pas la page suivante"""
+        paginator = KeysetPaginator(Transaction.objects.all(), 10)
+        premiere = paginator.page()
+        Transaction.objects.bulk_create([self.transaction(date(2026, 2, 1))])
+        
+        suivante = paginator.page(premiere.next_token)
+        
+        self.assertEqual([transaction.pk for transaction in suivante], self.attendus[10:20])
+    
+    def test_ordre_croissant(self):
+        """Test : Le sens du tri est repris du queryset"""
+        queryset = Transaction.objects.order_by('date_transaction')
+        pages = self.parcourir(KeysetPaginator(queryset, 10))
+        
+        self.assertEqual(
+            [transaction.pk for page in pages for transaction in page],
+            list(Transaction.objects.order_by('date_transaction', 'pk').values_list('pk', flat=True))
+        )
+    
+    def test_jeton_invalide(self):
+        """Test : Un jeton altéré est refusé par page() et ramène get_page() à la première page"""
+        paginator = KeysetPaginator(Transaction.objects.all(), 10)
+        jeton = paginator.page().next_token
+        
+        with self.assertRaises(InvalidPage):
+            paginator.page(jeton[:-2] + 'xx')
+        self.assertEqual(list(paginator.get_page('3')), list(paginator.page()))
+    
+    def test_une_requete_par_page(self):
+        """Test : Chaque page coûte une seule requête, sans COUNT"""
+        paginator = KeysetPaginator(Transaction.objects.all(), 10)
+        jeton = paginator.page().next_token
+        
+        with self.assertNumQueries(1):
+            page = paginator.page(jeton)
+            self.assertTrue(page.has_next())
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_liste_des_transactions(self):
+        """Test : La liste des transactions se pagine par jetons"""
+        self.client.force_login(self.user)
+        
+        reponse = self.client.get(reverse('finances:transaction_list'))
+        self.assertEqual(reponse.status_code, 200)
+        page = reponse.context['page_obj']
+        self.assertTrue(reponse.context['is_paginated'])
+        
+        reponse = self.client.get(reverse('finances:transaction_list'), {'page': page.next_token})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(
+            [transaction.pk for transaction in reponse.context['transactions']], self.attendus[20:40]
+        )
+
+
+class PetitSeuilPaginator(ApproximateCountPaginator):
+    seuil_exact = 10
+
+
+class ApproximateCountPaginatorTest(TestCase):
+    """Tests pour la pagination sans COUNT(*) exact"""
+    
+    def setUp(self):
+        """Préparation des données de test : 45 transactions"""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        self.projet = Projet.objects.create(
+            code_projet='PROJ-TEST-001',
+            nom_projet='Projet Test',
+            client=client,
+            montant_prevu=Decimal('10000000.00'),
+            date_debut=date.today(),
+            statut='En_cours'
+        )
+        Transaction.objects.bulk_create([
+            Transaction(
+                projet=self.projet, type='Dépôt' if numero < 40 else 'Retrait',
+                montant=Decimal('1000.00'), date_transaction=date(2026, 1, 1),
+                saisi_par=self.user
+            )
+            for numero in range(45)
+        ])
+    
+    def test_liste_non_filtree_estimee(self):
+        """Test : Sans filtre, le total est estimé une fois puis relu sans COUNT(*)"""
+        PetitSeuilPaginator(Transaction.objects.all(), 20).count
+        
+        with CaptureQueriesContext(connection) as requetes:
+            paginator = PetitSeuilPaginator(Transaction.objects.all(), 20)
+            page = paginator.page(1)
+        
+        self.assertFalse(paginator.compte_exact)
+        self.assertEqual(paginator.count, 45)
+        self.assertTrue(page.has_next())
+        self.assertFalse(any('COUNT(' in requete['sql'] for requete in requetes.captured_queries))
+    
+    def test_compteur_suit_les_creations(self):
+        """Test : Le compteur en cache suit les créations et suppressions unitaires"""
+        self.assertEqual(estimer_nombre_lignes(Transaction), 45)
+        transaction = Transaction.objects.create(
+            projet=self.projet, type='Dépôt', montant=Decimal('1000.00'),
+            date_transaction=date(2026, 1, 2), saisi_par=self.user
+        )
+        self.assertEqual(estimer_nombre_lignes(Transaction), 46)
+        transaction.delete()
+        self.assertEqual(estimer_nombre_lignes(Transaction), 45)
+    
+    def test_petit_resultat_filtre_exact(self):
+        """Test : Un petit résultat filtré est compté exactement"""
+        paginator = PetitSeuilPaginator(Transaction.objects.filter(type='Retrait'), 2)
+        
+        self.assertTrue(paginator.compte_exact)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+    
+    def test_grand_resultat_filtre_estime(self):
+        """Test : Un résultat filtré au-delà du seuil n'est pas compté exactement"""
+        paginator = PetitSeuilPaginator(Transaction.objects.filter(type='Dépôt'), 20)
+        
+        self.assertFalse(paginator.compte_exact)
+        page = paginator.page(2)
+        self.assertEqual(len(page), 20)
+        self.assertFalse(page.has_next())
+    
+    def test_page_au_dela_de_l_estimation(self):
+        """Test : Une page au-delà de l'estimation ramène à la dernière page réelle"""
+        paginator = PetitSeuilPaginator(Transaction.objects.filter(type='Dépôt'), 20)
+        paginator.count
+        
+        page = paginator.page(3)
+        
+        self.assertTrue(paginator.compte_exact)
+        self.assertEqual(page.number, 2)
+        self.assertEqual(len(page), 20)
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_liste_des_factures(self):
+        """Test : La liste des factures se pagine avec le paginateur approximatif"""
+        self.client.force_login(self.user)
+        
+        reponse = self.client.get(reverse('invoicing:facture_list'))
+        
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIsInstance(reponse.context['paginator'], ApproximateCountPaginator)
+
+
+class CompleterClesPrimairesTest(TestCase):
+    """Tests pour la relecture des clés primaires après un bulk_create"""
+    
+    def test_cles_relues_par_champ(self):
+        """Test : Les objets sans clé primaire (INSERT groupé MySQL) la retrouvent par lots"""
+        parametres = Parametre.objects.bulk_create([
+            Parametre(cle=f'param.{numero}', valeur=str(numero)) for numero in range(5)
+        ])
+        attendu = [parametre.pk for parametre in parametres]
+        for parametre in parametres[1:]:
+            parametre.pk = None
+        
+        with self.assertNumQueries(2):
+            completer_cles_primaires(parametres, 'cle', filtres={'valeur__isnull': False}, batch_size=3)
+        
+        self.assertEqual([parametre.pk for parametre in parametres], attendu)
+        with self.assertNumQueries(0):
+            completer_cles_primaires(parametres, 'cle')
+
+
+class DateReferenceMixinTest(TestCase):
+    """Tests pour la lecture de la date de référence dans la requête"""
+    
+    class Etat(DateReferenceMixin):
+        def __init__(self, date_reference=None):
+            self.date_reference = date_reference
+    
+    def test_date_de_la_requete(self):
+        """Test : Le paramètre `date` est lu au format AAAA-MM-JJ, ignoré s'il est invalide"""
+        requetes = RequestFactory()
+        
+        self.assertEqual(self.Etat.depuis_requete(requetes.get('/', {'date': '2026-02-28'})).date_reference, date(2026, 2, 28))
+        self.assertIsNone(self.Etat.depuis_requete(requetes.get('/', {'date': '28/02/2026'})).date_reference)
+        self.assertIsNone(self.Etat.depuis_requete(requetes.get('/')).date_reference)
@@ -0,0 +1,64 @@
+"""
+Utilitaires pour la création en masse (bulk_create) : documents numérotés (devis,
+factures, achats) et clés primaires des lignes créées
+"""
+from django.db import transaction
+
+from apps.core.models import SequenceNumerotation
+
+
+def completer_cles_primaires(objets, champ, filtres=None, batch_size=1000):
+    """
+    Renseigne la clé primaire d'objets venant d'un bulk_create, quand la base ne
+    les renvoie pas (MySQL) : relecture par lots sur `champ`, unique parmi les
+    lignes retenues par `filtres`. Retourne la liste des objets.
+    """
+    sans_pk = [objet for objet in objets if objet.pk is None]
+    if not sans_pk:
+        return objets
+    modele = type(sans_pk[0])
+
+    valeurs = [getattr(objet, champ) for objet in sans_pk]
+    pks = {}
+    for debut in range(0, len(valeurs), batch_size):
+        pks.update(modele.objects.filter(
+            **(filtres or {}), **{f'{champ}__in': valeurs[debut:debut + batch_size]}
+        ).values_list(champ, 'pk'))
+    for objet in sans_pk:
+        objet.pk = pks[getattr(objet, champ)]
+    return objets
+
+
+def creer_documents_en_masse(documents, champ_numero, prefixe, champ_parent, batch_size=1000):
+    """
+    Crée des documents et leurs lignes avec bulk_create, par lots.
+
+    `documents` est une liste de couples (entête, lignes) non enregistrés, dont les
+    montants ont déjà été calculés. Les numéros manquants sont réservés en un seul
+    bloc contigu ; `champ_parent` est le nom de la clé étrangère des lignes vers l'entête.
+    Retourne la liste des entêtes créées.
+    """
+    if not documents:
+        return []
+    modele = type(documents[0][0])
+
+    with transaction.atomic():
+        sans_numero = [entete for entete, _ in documents if not getattr(entete, champ_numero)]
+        for entete, numero in zip(sans_numero, SequenceNumerotation.reserver(prefixe, len(sans_numero))):
+            setattr(entete, champ_numero, numero)
+
+        entetes = modele.objects.bulk_create(
+            [entete for entete, _ in documents], batch_size=batch_size
+        )
+
+        completer_cles_primaires(entetes, champ_numero, batch_size=batch_size)
+
+        lignes = []
+        for entete, lignes_document in documents:
+            for ligne in lignes_document:
+                setattr(ligne, champ_parent, entete)
+                lignes.append(ligne)
+        if lignes:
+            type(lignes[0]).objects.bulk_create(lignes, batch_size=batch_size)
+
+    return entetes
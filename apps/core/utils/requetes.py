@@ -0,0 +1,20 @@
+"""
+Lecture des paramètres de requête communs aux états (balance âgée, valorisation, paie)
+"""
+from datetime import date
+
+
+class DateReferenceMixin:
+    """
+    Pour les classes de calcul construites avec une `date_reference` : les crée à
+    partir de la requête HTTP
+    """
+
+    @classmethod
+    def depuis_requete(cls, request):
+        """Instance à la date passée en paramètre GET `date` (AAAA-MM-JJ), aujourd'hui sinon"""
+        try:
+            date_reference = date.fromisoformat(request.GET.get('date', ''))
+        except ValueError:
+            date_reference = None
+        return cls(date_reference=date_reference)
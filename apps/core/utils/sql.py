@@ -0,0 +1,33 @@
+"""
+Fonctions SQL communes (arithmétique de dates portable entre SQLite, MySQL et PostgreSQL)
+"""
+from django.db import models
+from django.db.models import Func
+
+
+class JoursEntre(Func):
+    """Nombre de jours entre deux dates : fin - debut"""
+    arity = 2
+    output_field = models.IntegerField()
+
+    def __init__(self, fin, debut, **extra):
+        super().__init__(fin, debut, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='DATEDIFF', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='(%(expressions)s::date)',
+            arg_joiner='::date - ',
+            **extra_context
+        )
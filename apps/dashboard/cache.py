@@ -0,0 +1,72 @@
+"""
+Cache versionné des instantanés du tableau de bord
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+CLE_VERSION = 'dashboard:version'
+DUREE_VERROU = 30  # secondes
+ATTENTE_MAX = 5  # secondes
+INTERVALLE_ATTENTE = 0.05  # secondes
+
+
+def get_version():
+    """Retourne la version courante des instantanés"""
+    version = cache.get(CLE_VERSION)
+    if version is None:
+        cache.add(CLE_VERSION, 1, timeout=None)
+        version = cache.get(CLE_VERSION, 1)
+    return version
+
+
+def invalider():
+    """Invalide tous les instantanés en incrémentant la version"""
+    try:
+        cache.incr(CLE_VERSION)
+    except ValueError:
+        cache.add(CLE_VERSION, 1, timeout=None)
+
+
+def get_instantane(nom, calculer):
+    """
+    Retourne l'instantané `nom` depuis le cache, ou le calcule avec `calculer()`.
+
+    Un seul processus recalcule un instantané expiré (verrou posé avec cache.add) ;
+    les autres attendent le résultat au lieu de recalculer en parallèle.
+    Retourne un dictionnaire {'donnees', 'date_calcul'}.
+    """
+    cle = f'dashboard:{nom}:v{get_version()}'
+    instantane = cache.get(cle)
+    if instantane is not None:
+        return instantane
+
+    cle_verrou = f'{cle}:verrou'
+    if cache.add(cle_verrou, 1, timeout=DUREE_VERROU):
+        try:
+            instantane = {'donnees': calculer(), 'date_calcul': timezone.now()}
+            cache.set(cle, instantane, timeout=settings.DASHBOARD_CACHE_TTL)
+        finally:
+            cache.delete(cle_verrou)
+        return instantane
+
+    # Un autre processus recalcule : attendre son résultat
+    limite = time.monotonic() + ATTENTE_MAX
+    while time.monotonic() < limite:
+        time.sleep(INTERVALLE_ATTENTE)
+        instantane = cache.get(cle)
+        if instantane is not None:
+            return instantane
+
+    return {'donnees': calculer(), 'date_calcul': timezone.now()}
+
+
+def get_context_instantane(nom, calculer):
+    """Contexte de template de l'instantané, avec sa date de calcul et son âge en secondes"""
+    instantane = get_instantane(nom, calculer)
+    context = dict(instantane['donnees'])
+    context['instantane_date'] = instantane['date_calcul']
+    context['instantane_age'] = int((timezone.now() - instantane['date_calcul']).total_seconds())
+    return context
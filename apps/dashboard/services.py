@@ -0,0 +1,134 @@
+"""
+Calcul des statistiques du tableau de bord
+"""
+from datetime import date
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from apps.clients.models import Client
+from apps.finances.models import Transaction, Depense, CategorieDepense, AgregatJournalier
+from apps.projects.models import Projet
+
+
+class DashboardStats:
+    """
+    Statistiques du tableau de bord calculées en un nombre fixe de requêtes,
+    quel que soit le volume des tables
+    """
+    CATEGORIES_DETAILLEES = ['Achat Matériaux', 'Paiement Personnel']
+
+    def get_totaux_transactions(self):
+        """Totaux des transactions validées en une seule agrégation"""
+        depense = Q(type='Dépense')
+        totaux = Transaction.objects.filter(statut='Validée').aggregate(
+            total_depots=Sum('montant', filter=Q(type='Dépôt')),
+            total_retraits=Sum('montant', filter=Q(type='Retrait')),
+            total_depenses_transactions=Sum('montant', filter=depense),
+            total_achats_materiaux=Sum(
+                'montant', filter=depense & Q(categorie='Achat Matériaux')
+            ),
+            total_paiements_personnel=Sum(
+                'montant', filter=depense & Q(categorie='Paiement Personnel')
+            ),
+            total_autres_depenses=Sum(
+                'montant',
+                filter=depense & (
+                    ~Q(categorie__in=self.CATEGORIES_DETAILLEES) | Q(categorie__isnull=True)
+                )
+            ),
+        )
+        return {cle: valeur or 0 for cle, valeur in totaux.items()}
+
+    def get_compteurs_projets(self):
+        """Nombre de projets par statut et budget prévu total en une requête groupée"""
+        par_statut = {}
+        budget_prevu_total = 0
+        for ligne in Projet.objects.values('statut').annotate(
+            nombre=Count('id'),
+            budget=Sum('montant_prevu'),
+        ).order_by():
+            par_statut[ligne['statut']] = ligne['nombre']
+            budget_prevu_total += ligne['budget'] or 0
+
+        return {
+            'total_projets': sum(par_statut.values()),
+            'projets_actifs': par_statut.get('En_cours', 0),
+            'projets_termines': par_statut.get('Terminé', 0),
+            'projets_par_statut': par_statut,
+            'budget_prevu_total': budget_prevu_total,
+        }
+
+    def get_statistiques(self):
+        """Statistiques chiffrées du tableau de bord"""
+        stats = {}
+        stats.update(self.get_compteurs_projets())
+        stats.update(self.get_totaux_transactions())
+        stats['total_clients'] = Client.objects.filter(actif=True).count()
+        stats['depenses_en_attente'] = Depense.objects.filter(statut='En_attente').count()
+
+        # Montant Global = Budget Prévu + Dépôts - Retraits - Dépenses
+        stats['montant_global'] = stats['budget_prevu_total'] + stats['total_depots']
+        stats['solde_disponible'] = (
+            stats['montant_global']
+            - stats['total_retraits']
+            - stats['total_depenses_transactions']
+        )
+        return stats
+
+    def get_listes(self):
+        """Listes affichées sur le tableau de bord (requêtes limitées, évaluées)"""
+        return {
+            'projets_recents': list(Projet.objects.all()[:5]),
+            'projets_en_retard': list(Projet.objects.filter(
+                date_fin_prevue__lt=date.today(),
+                statut__in=['Planifié', 'En_cours']
+            )[:5]),
+            'projets_budget_depasse': list(Projet.objects.filter(
+                budget_depasse=True,
+                statut__in=['Planifié', 'En_cours']
+            ).with_financials()[:5]),
+            'depenses_par_categorie': list(CategorieDepense.objects.annotate(
+                total=Sum('depenses__montant', filter=Q(depenses__statut='Validée'))
+            ).order_by('-total')[:10]),
+            'transactions_recentes': list(Transaction.objects.all()[:10]),
+            'depenses_attente': list(Depense.objects.filter(
+                statut='En_attente'
+            ).select_related('projet', 'categorie')[:10]),
+        }
+
+    def get_context(self):
+        """Contexte complet de la page d'accueil du tableau de bord"""
+        context = self.get_statistiques()
+        context.pop('projets_par_statut')
+        context.update(self.get_listes())
+        return context
+
+    def get_context_statistiques(self):
+        """Contexte de la page des statistiques détaillées"""
+        today = timezone.now().date()
+        start_of_month = today.replace(day=1)
+        start_of_year = today.replace(month=1, day=1)
+
+        # Totaux du mois et de l'année lus dans les agrégats journaliers
+        mois = AgregatJournalier.totaux(date_debut=start_of_month)
+        annee = AgregatJournalier.totaux(date_debut=start_of_year)
+
+        context = {
+            'depots_mois': mois['depots'],
+            'retraits_mois': mois['retraits'],
+            'depenses_mois': mois['depenses'],
+            'depots_annee': annee['depots'],
+            'retraits_annee': annee['retraits'],
+            'depenses_annee': annee['depenses'],
+        }
+        context.update({
+            'projets_par_statut': list(Projet.objects.values('statut').annotate(
+                count=Count('id')
+            ).order_by('-count')),
+            'top_projets_budget': list(Projet.objects.order_by('-montant_prevu')[:5]),
+            'top_projets_depenses': list(
+                Projet.objects.with_financials().order_by('-total_depenses')[:5]
+            ),
+        })
+        return context
@@ -0,0 +1,26 @@
+"""
+Invalidation du cache du tableau de bord lors des écritures
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.clients.models import Client
+from apps.finances.models import Transaction, Depense
+from apps.finances.signals import transactions_creees_en_masse
+from apps.projects.models import Projet
+from . import cache
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(transactions_creees_en_masse, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=Depense)
+@receiver(post_delete, sender=Depense)
+@receiver(post_save, sender=Projet)
+@receiver(post_delete, sender=Projet)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalider_cache_dashboard(sender, **kwargs):
+    """Invalide les instantanés une fois la transaction de base de données validée"""
+    transaction.on_commit(cache.invalider)
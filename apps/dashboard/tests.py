@@ -0,0 +1,170 @@
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
+import threading
+from apps.dashboard import cache as dashboard_cache
+from apps.dashboard.services import DashboardStats
+from apps.projects.models import Projet
+from apps.clients.models import Client
+from apps.finances.models import Transaction
+
+User = get_user_model()
+
+
+class DashboardStatsTest(TestCase):
+    """Tests pour les statistiques du tableau de bord"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        
+        self.client_test = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        self.creer_projets(3)
+    
+    def creer_projets(self, nombre):
+        """Crée des projets avec un jeu de transactions de chaque type"""
+        debut = Projet.objects.count()
+        for i in range(debut, debut + nombre):
+            projet = Projet.objects.create(
+                code_projet=f'PROJ-TEST-{i:03d}',
+                nom_projet=f'Projet {i}',
+                client=self.client_test,
+                montant_prevu=Decimal('1000000.00'),
+                statut='En_cours' if i % 2 else 'Terminé'
+            )
+            for type_transaction, categorie, montant in [
+                ('Dépôt', None, '500000.00'),
+                ('Retrait', None, '100000.00'),
+                ('Dépense', 'Achat Matériaux', '200000.00'),
+                ('Dépense', 'Paiement Personnel', '150000.00'),
+                ('Dépense', None, '50000.00'),
+                ('Dépense', 'Transport', '25000.00'),
+            ]:
+                Transaction.objects.create(
+                    projet=projet,
+                    type=type_transaction,
+                    categorie=categorie,
+                    montant=Decimal(montant),
+                    date_transaction=date.today(),
+                    saisi_par=self.user
+                )
+    
+    def test_totaux(self):
+        """Test : Les totaux agrégés en une requête sont corrects"""
+        stats = DashboardStats().get_statistiques()
+        
+        self.assertEqual(stats['total_projets'], 3)
+        self.assertEqual(stats['projets_actifs'], 1)
+        self.assertEqual(stats['projets_termines'], 2)
+        self.assertEqual(stats['budget_prevu_total'], Decimal('3000000.00'))
+        self.assertEqual(stats['total_depots'], Decimal('1500000.00'))
+        self.assertEqual(stats['total_retraits'], Decimal('300000.00'))
+        self.assertEqual(stats['total_depenses_transactions'], Decimal('1275000.00'))
+        self.assertEqual(stats['total_achats_materiaux'], Decimal('600000.00'))
+        self.assertEqual(stats['total_paiements_personnel'], Decimal('450000.00'))
+        self.assertEqual(stats['total_autres_depenses'], Decimal('225000.00'))
+        self.assertEqual(stats['solde_disponible'], Decimal('2925000.00'))
+    
+    def test_statistiques_par_periode(self):
+        """Test : Les statistiques du mois et de l'année sont lues dans les agrégats"""
+        context = DashboardStats().get_context_statistiques()
+        
+        self.assertEqual(context['depots_mois'], Decimal('1500000.00'))
+        self.assertEqual(context['retraits_annee'], Decimal('300000.00'))
+        self.assertEqual(context['depenses_annee'], Decimal('1275000.00'))
+        self.assertEqual(context['top_projets_depenses'][0].total_depenses, Decimal('425000.00'))
+    
+    def test_statistiques_en_quatre_requetes(self):
+        """Test : Les statistiques chiffrées tiennent en 4 requêtes"""
+        with self.assertNumQueries(4):
+            DashboardStats().get_statistiques()
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_nombre_de_requetes_constant(self):
+        """Test : La page d'accueil ne fait pas plus de requêtes quand les tables grossissent"""
+        self.client.force_login(self.user)
+        url = reverse('dashboard:home')
+        
+        cache.clear()
+        with CaptureQueriesContext(connection) as avant:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(avant), 15)
+        
+        self.creer_projets(10)
+        cache.clear()
+        with CaptureQueriesContext(connection) as apres:
+            self.client.get(url)
+        self.assertEqual(len(apres), len(avant))
+
+
+class DashboardCacheTest(TestCase):
+    """Tests pour le cache des instantanés du tableau de bord"""
+    
+    def setUp(self):
+        cache.clear()
+        self.appels = 0
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client_test = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+    
+    def calculer(self):
+        self.appels += 1
+        return {'valeur': self.appels}
+    
+    def test_instantane_mis_en_cache(self):
+        """Test : Un instantané n'est calculé qu'une fois tant qu'il est valide"""
+        premier = dashboard_cache.get_context_instantane('test', self.calculer)
+        second = dashboard_cache.get_context_instantane('test', self.calculer)
+        
+        self.assertEqual(self.appels, 1)
+        self.assertEqual(second['valeur'], premier['valeur'])
+        self.assertEqual(second['instantane_date'], premier['instantane_date'])
+        self.assertGreaterEqual(second['instantane_age'], 0)
+    
+    def test_invalidation_par_signal(self):
+        """Test : Une écriture sur les tables suivies invalide l'instantané"""
+        dashboard_cache.get_instantane('test', self.calculer)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Projet.objects.create(
+                code_projet='PROJ-TEST-001',
+                nom_projet='Projet Test',
+                client=self.client_test
+            )
+        
+        instantane = dashboard_cache.get_instantane('test', self.calculer)
+        self.assertEqual(self.appels, 2)
+        self.assertEqual(instantane['donnees']['valeur'], 2)
+    
+    def test_verrou_recalcul_unique(self):
+        """Test : Pendant un recalcul, les autres requêtes attendent au lieu de recalculer"""
+        cle = f'dashboard:test:v{dashboard_cache.get_version()}'
+        cache.add(f'{cle}:verrou', 1)
+        
+        # Un autre processus termine le calcul pendant l'attente
+        autre_calcul = threading.Timer(0.2, cache.set, args=(
+            cle, {'donnees': {'valeur': 'calculé ailleurs'}, 'date_calcul': None}
+        ))
+        autre_calcul.start()
+        instantane = dashboard_cache.get_instantane('test', self.calculer)
+        autre_calcul.join()
+        
+        self.assertEqual(self.appels, 0)
+        self.assertEqual(instantane['donnees']['valeur'], 'calculé ailleurs')
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Transaction, CategorieDepense, Fournisseur, Depense
+from .models import Transaction, SoldeProjet, CategorieDepense, Fournisseur, Depense
 
 
 @admin.register(Transaction)
@@ -25,6 +25,21 @@ class TransactionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def delete_queryset(self, request, queryset):
+        # L'action « supprimer la sélection » passe par queryset.delete() : les
+        # soldes et agrégats sont mis à jour en une passe
+        Transaction.supprimer_en_masse(queryset)
+
+
+@admin.register(SoldeProjet)
+class SoldeProjetAdmin(admin.ModelAdmin):
+    list_display = ['projet', 'total_depots', 'total_retraits', 'total_depenses', 'date_derniere_transaction', 'date_modification']
+    search_fields = ['projet__code_projet', 'projet__nom_projet']
+    readonly_fields = ['projet', 'total_depots', 'total_retraits', 'total_depenses', 'date_derniere_transaction', 'date_modification']
+    
+    def has_add_permission(self, request):
+        return False
 
 
 @admin.register(CategorieDepense)
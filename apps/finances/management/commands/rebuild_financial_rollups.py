@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.finances.models import AgregatJournalier
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les agrégats journaliers des transactions validées'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--depuis',
+            help='Reconstruit uniquement à partir de cette date (AAAA-MM-JJ)'
+        )
+
+    def handle(self, *args, **options):
+        date_debut = None
+        if options['depuis']:
+            try:
+                date_debut = datetime.strptime(options['depuis'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Date invalide, format attendu : AAAA-MM-JJ')
+
+        nombre = AgregatJournalier.reconstruire(date_debut)
+        self.stdout.write(self.style.SUCCESS(f'✓ {nombre} agrégat(s) journalier(s) reconstruit(s)'))
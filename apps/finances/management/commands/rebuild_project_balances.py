@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from apps.finances.models import SoldeProjet
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les soldes matérialisés des projets à partir des transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--projet',
+            type=int,
+            action='append',
+            dest='projets',
+            help='ID du projet à reconstruire (option répétable, tous les projets par défaut)'
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Vérifie la cohérence des soldes sans les modifier'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            ecarts = SoldeProjet.verifier_coherence()
+            if not ecarts:
+                self.stdout.write(self.style.SUCCESS('✓ Tous les soldes de projets sont cohérents'))
+                return
+
+            for ecart in ecarts:
+                self.stdout.write(self.style.WARNING(
+                    f"✗ Projet #{ecart['projet_id']} - {ecart['champ']} : "
+                    f"stocké {ecart['stocke']} / réel {ecart['reel']}"
+                ))
+            self.stdout.write(self.style.ERROR(f'{len(ecarts)} écart(s) détecté(s)'))
+            return
+
+        nombre = SoldeProjet.reconstruire(options['projets'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {nombre} solde(s) de projet reconstruit(s)'))
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Max, Q, Sum
+
+
+def initialiser_soldes(apps, schema_editor):
+    """Calcule les soldes des projets existants à partir des transactions validées"""
+    Projet = apps.get_model('projects', 'Projet')
+    Transaction = apps.get_model('finances', 'Transaction')
+    SoldeProjet = apps.get_model('finances', 'SoldeProjet')
+    
+    totaux = {
+        ligne['projet_id']: ligne
+        for ligne in Transaction.objects.filter(statut='Validée').values('projet_id').annotate(
+            depots=Sum('montant', filter=Q(type='Dépôt')),
+            retraits=Sum('montant', filter=Q(type='Retrait')),
+            depenses=Sum('montant', filter=Q(type='Dépense')),
+            derniere=Max('date_transaction'),
+        ).order_by()
+    }
+    
+    soldes = []
+    for projet_id in Projet.objects.values_list('pk', flat=True):
+        ligne = totaux.get(projet_id, {})
+        soldes.append(SoldeProjet(
+            projet_id=projet_id,
+            total_depots=ligne.get('depots') or 0,
+            total_retraits=ligne.get('retraits') or 0,
+            total_depenses=ligne.get('depenses') or 0,
+            date_derniere_transaction=ligne.get('derniere'),
+        ))
+    SoldeProjet.objects.bulk_create(soldes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        ('finances', '0002_transaction_categorie_transaction_statut_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoldeProjet',
+            fields=[
+                ('projet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='solde', serialize=False, to='projects.projet', verbose_name='Projet')),
+                ('total_depots', models.DecimalField(decimal_places=2, default=0.0, max_digits=15, verbose_name='Total des dépôts')),
+                ('total_retraits', models.DecimalField(decimal_places=2, default=0.0, max_digits=15, verbose_name='Total des retraits')),
+                ('total_depenses', models.DecimalField(decimal_places=2, default=0.0, max_digits=15, verbose_name='Total des dépenses')),
+                ('date_derniere_transaction', models.DateField(blank=True, null=True, verbose_name='Dernière transaction')),
+                ('date_modification', models.DateTimeField(auto_now=True, verbose_name='Date de modification')),
+            ],
+            options={
+                'verbose_name': 'Solde de projet',
+                'verbose_name_plural': 'Soldes de projets',
+            },
+        ),
+        migrations.RunPython(initialiser_soldes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+
+
+def initialiser_agregats(apps, schema_editor):
+    """Calcule les agrégats journaliers à partir des transactions validées existantes"""
+    Transaction = apps.get_model('finances', 'Transaction')
+    AgregatJournalier = apps.get_model('finances', 'AgregatJournalier')
+    
+    regroupees = {}
+    for ligne in Transaction.objects.filter(statut='Validée').values(
+        'date_transaction', 'projet_id', 'type', 'categorie'
+    ).annotate(total=Sum('montant'), nombre=Count('id')).order_by():
+        cle = (ligne['date_transaction'], ligne['projet_id'], ligne['type'], ligne['categorie'] or '')
+        total, nombre = regroupees.get(cle, (0, 0))
+        regroupees[cle] = (total + ligne['total'], nombre + ligne['nombre'])
+    
+    AgregatJournalier.objects.bulk_create([
+        AgregatJournalier(date=date, projet_id=projet_id, type=type_transaction, categorie=categorie,
+                          montant_total=total, nombre=nombre)
+        for (date, projet_id, type_transaction, categorie), (total, nombre) in regroupees.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        ('finances', '0003_soldeprojet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregatJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('type', models.CharField(choices=[('Dépôt', 'Dépôt'), ('Retrait', 'Retrait'), ('Dépense', 'Dépense')], max_length=10, verbose_name='Type')),
+                ('categorie', models.CharField(blank=True, default='', max_length=100, verbose_name='Catégorie')),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=15, verbose_name='Montant total')),
+                ('nombre', models.IntegerField(default=0, verbose_name='Nombre de transactions')),
+                ('projet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agregats_journaliers', to='projects.projet', verbose_name='Projet')),
+            ],
+            options={
+                'verbose_name': 'Agrégat journalier',
+                'verbose_name_plural': 'Agrégats journaliers',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'type'], name='finances_ag_date_6194be_idx')],
+                'unique_together': {('date', 'projet', 'type', 'categorie')},
+            },
+        ),
+        migrations.RunPython(initialiser_agregats, migrations.RunPython.noop),
+    ]
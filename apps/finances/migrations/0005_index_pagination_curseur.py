@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0004_agregatjournalier'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(fields=['date_depense', 'id'], name='finances_de_date_de_92b333_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date_transaction', 'id'], name='finances_tr_date_tr_4f14f3_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='depense',
+            name='finances_de_date_de_40a12f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='finances_tr_date_tr_5f52e5_idx',
+        ),
+    ]
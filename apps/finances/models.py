@@ -1,4 +1,7 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Case, F, Max, Q, Sum, Value, When
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.conf import settings
@@ -97,20 +100,423 @@ class Transaction(models.Model):
         indexes = [
             models.Index(fields=['projet']),
             models.Index(fields=['type']),
-            models.Index(fields=['date_transaction']),
+            models.Index(fields=['date_transaction', 'id']),
         ]
     
     def __str__(self):
         return f"{self.type} - {self.montant} GNF - {self.projet.code_projet}"
     
+    CHAMPS_AGREGATS = ['projet_id', 'type', 'montant', 'statut', 'categorie', 'date_transaction']
+    
     def save(self, *args, **kwargs):
-        # Sauvegarder la transaction
-        super().save(*args, **kwargs)
+        # Sauvegarder la transaction et mettre à jour le solde du projet
+        # et les agrégats journaliers dans la même transaction de base de données
+        with transaction.atomic():
+            ancienne = None
+            if self.pk:
+                ancienne = Transaction.objects.filter(pk=self.pk).values(
+                    *self.CHAMPS_AGREGATS
+                ).first()
+            super().save(*args, **kwargs)
+            nouvelle = {champ: getattr(self, champ) for champ in self.CHAMPS_AGREGATS}
+            if ancienne:
+                Transaction.appliquer_aux_agregats(ancienne, retrait=True)
+            Transaction.appliquer_aux_agregats(nouvelle)
+            Transaction.actualiser_depassements(ancienne, nouvelle)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            valeurs = {champ: getattr(self, champ) for champ in self.CHAMPS_AGREGATS}
+            resultat = super().delete(*args, **kwargs)
+            Transaction.appliquer_aux_agregats(valeurs, retrait=True)
+            Transaction.actualiser_depassements(valeurs)
+        return resultat
+    
+    @classmethod
+    def creer_en_masse(cls, transactions, batch_size=1000):
+        """
+        Insère des transactions par lots (bulk_create) puis répercute leurs montants
+        sur les soldes, les agrégats journaliers et les dépassements de budget,
+        groupés par projet, type, catégorie et date
+        """
+        from .signals import transactions_creees_en_masse
+        
+        with transaction.atomic():
+            creees = cls.objects.bulk_create(transactions, batch_size=batch_size)
+            
+            agregats = defaultdict(lambda: [0, 0])
+            soldes = {}
+            for t in creees:
+                if t.statut != 'Validée' or not t.projet_id:
+                    continue
+                agregat = agregats[(t.projet_id, t.type, t.categorie or '', t.date_transaction)]
+                agregat[0] += t.montant
+                agregat[1] += 1
+                montant, date_max = soldes.get((t.projet_id, t.type), (0, t.date_transaction))
+                soldes[(t.projet_id, t.type)] = (montant + t.montant, max(date_max, t.date_transaction))
+            
+            for (projet_id, type_transaction, categorie, date_transaction), (montant, nombre) in agregats.items():
+                AgregatJournalier.appliquer({
+                    'projet_id': projet_id,
+                    'type': type_transaction,
+                    'statut': 'Validée',
+                    'categorie': categorie,
+                    'date_transaction': date_transaction,
+                }, montant, nombre)
+            for (projet_id, type_transaction), (montant, date_max) in soldes.items():
+                SoldeProjet.appliquer(
+                    projet_id, type_transaction, 'Validée', montant, date_transaction=date_max
+                )
+            cls.actualiser_depassements(*[
+                {'projet_id': projet_id, 'type': type_transaction, 'statut': 'Validée'}
+                for projet_id, type_transaction in soldes
+            ])
+        
+        transactions_creees_en_masse.send(sender=cls, transactions=creees)
+        return creees
+    
+    @classmethod
+    def supprimer_en_masse(cls, transactions):
+        """
+        Supprime un queryset de transactions (queryset.delete() ne passe pas par
+        delete()) puis retire leurs montants des soldes, des agrégats journaliers et
+        des dépassements de budget, groupés par projet, type, catégorie et date
+        """
+        with transaction.atomic():
+            valeurs = list(transactions.values(*cls.CHAMPS_AGREGATS).order_by())
+            resultat = transactions.delete()
+            
+            agregats = defaultdict(lambda: [0, 0])
+            soldes = defaultdict(int)
+            for t in valeurs:
+                if t['statut'] != 'Validée' or not t['projet_id']:
+                    continue
+                agregat = agregats[(t['projet_id'], t['type'], t['categorie'] or '', t['date_transaction'])]
+                agregat[0] += t['montant']
+                agregat[1] += 1
+                soldes[(t['projet_id'], t['type'])] += t['montant']
+            
+            for (projet_id, type_transaction, categorie, date_transaction), (montant, nombre) in agregats.items():
+                AgregatJournalier.appliquer({
+                    'projet_id': projet_id,
+                    'type': type_transaction,
+                    'statut': 'Validée',
+                    'categorie': categorie,
+                    'date_transaction': date_transaction,
+                }, -montant, -nombre)
+            for (projet_id, type_transaction), montant in soldes.items():
+                SoldeProjet.appliquer(projet_id, type_transaction, 'Validée', -montant, recalculer_date=True)
+            cls.actualiser_depassements(*[
+                {'projet_id': projet_id, 'type': type_transaction, 'statut': 'Validée'}
+                for projet_id, type_transaction in soldes
+            ])
+        return resultat
+    
+    @staticmethod
+    def actualiser_depassements(*etats):
+        """Recalcule le dépassement de budget des projets touchés par des dépôts ou dépenses validés"""
+        from apps.projects.models import Projet
+        
+        projet_ids = {
+            valeurs['projet_id'] for valeurs in etats
+            if valeurs and valeurs['statut'] == 'Validée' and valeurs['type'] in ('Dépôt', 'Dépense')
+        }
+        for projet_id in projet_ids:
+            Projet.actualiser_depassement(projet_id)
+    
+    @staticmethod
+    def appliquer_aux_agregats(valeurs, retrait=False):
+        """Ajoute (ou retire) la contribution d'une transaction au solde et aux agrégats"""
+        montant = -valeurs['montant'] if retrait else valeurs['montant']
+        SoldeProjet.appliquer(
+            valeurs['projet_id'], valeurs['type'], valeurs['statut'], montant,
+            date_transaction=None if retrait else valeurs['date_transaction'],
+            recalculer_date=retrait
+        )
+        AgregatJournalier.appliquer(valeurs, montant, -1 if retrait else 1)
     
     def get_absolute_url(self):
         return reverse('finances:transaction_detail', kwargs={'pk': self.pk})
 
 
+class SoldeProjet(models.Model):
+    """
+    Soldes matérialisés d'un projet (dépôts, retraits, dépenses validés),
+    tenus à jour à chaque écriture de Transaction
+    """
+    CHAMPS_PAR_TYPE = {
+        'Dépôt': 'total_depots',
+        'Retrait': 'total_retraits',
+        'Dépense': 'total_depenses',
+    }
+    
+    projet = models.OneToOneField(
+        'projects.Projet',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='solde',
+        verbose_name='Projet'
+    )
+    total_depots = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Total des dépôts'
+    )
+    total_retraits = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Total des retraits'
+    )
+    total_depenses = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Total des dépenses'
+    )
+    date_derniere_transaction = models.DateField(
+        blank=True,
+        null=True,
+        verbose_name='Dernière transaction'
+    )
+    date_modification = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Date de modification'
+    )
+    
+    class Meta:
+        verbose_name = 'Solde de projet'
+        verbose_name_plural = 'Soldes de projets'
+    
+    def __str__(self):
+        return f"Solde {self.projet_id}"
+    
+    @classmethod
+    def appliquer(cls, projet_id, type_transaction, statut, montant,
+                  date_transaction=None, recalculer_date=False):
+        """Applique la contribution (positive ou négative) d'une transaction au solde"""
+        champ = cls.CHAMPS_PAR_TYPE.get(type_transaction)
+        if champ is None or statut != 'Validée' or not projet_id:
+            return
+        
+        valeurs = {champ: F(champ) + montant}
+        if recalculer_date:
+            valeurs['date_derniere_transaction'] = Transaction.objects.filter(
+                projet_id=projet_id, statut='Validée'
+            ).aggregate(date=Max('date_transaction'))['date']
+        elif date_transaction:
+            valeurs['date_derniere_transaction'] = Case(
+                When(
+                    Q(date_derniere_transaction__isnull=True) |
+                    Q(date_derniere_transaction__lt=date_transaction),
+                    then=Value(date_transaction, output_field=models.DateField())
+                ),
+                default=F('date_derniere_transaction'),
+            )
+        
+        # Un seul UPDATE dans le cas courant, création du solde au premier mouvement
+        if not cls.objects.filter(projet_id=projet_id).update(**valeurs):
+            cls.objects.get_or_create(projet_id=projet_id)
+            cls.objects.filter(projet_id=projet_id).update(**valeurs)
+    
+    @classmethod
+    def calculer_depuis_transactions(cls, projet_ids=None):
+        """Calcule les soldes réels par une agrégation groupée sur les transactions"""
+        transactions = Transaction.objects.filter(statut='Validée')
+        if projet_ids is not None:
+            transactions = transactions.filter(projet_id__in=projet_ids)
+        
+        resultats = {}
+        for ligne in transactions.values('projet_id').annotate(
+            total_depots=Sum('montant', filter=Q(type='Dépôt')),
+            total_retraits=Sum('montant', filter=Q(type='Retrait')),
+            total_depenses=Sum('montant', filter=Q(type='Dépense')),
+            date_derniere_transaction=Max('date_transaction'),
+        ).order_by():
+            resultats[ligne['projet_id']] = {
+                'total_depots': ligne['total_depots'] or 0,
+                'total_retraits': ligne['total_retraits'] or 0,
+                'total_depenses': ligne['total_depenses'] or 0,
+                'date_derniere_transaction': ligne['date_derniere_transaction'],
+            }
+        return resultats
+    
+    @classmethod
+    def reconstruire(cls, projet_ids=None):
+        """Reconstruit les soldes à partir des transactions, retourne le nombre de projets traités"""
+        from apps.projects.models import Projet
+        
+        projets = Projet.objects.all()
+        if projet_ids is not None:
+            projets = projets.filter(pk__in=projet_ids)
+        projet_ids = list(projets.values_list('pk', flat=True))
+        
+        reels = cls.calculer_depuis_transactions(projet_ids)
+        vide = {
+            'total_depots': 0,
+            'total_retraits': 0,
+            'total_depenses': 0,
+            'date_derniere_transaction': None,
+        }
+        
+        with transaction.atomic():
+            cls.objects.filter(projet_id__in=projet_ids).delete()
+            cls.objects.bulk_create(
+                [cls(projet_id=pk, **reels.get(pk, vide)) for pk in projet_ids],
+                batch_size=500
+            )
+        return len(projet_ids)
+    
+    @classmethod
+    def verifier_coherence(cls):
+        """Compare les soldes matérialisés avec un SUM direct sur les transactions"""
+        from apps.projects.models import Projet
+        
+        reels = cls.calculer_depuis_transactions()
+        stockes = {
+            solde['projet_id']: solde for solde in cls.objects.values(
+                'projet_id', 'total_depots', 'total_retraits',
+                'total_depenses', 'date_derniere_transaction'
+            )
+        }
+        
+        ecarts = []
+        for projet_id in Projet.objects.values_list('pk', flat=True):
+            reel = reels.get(projet_id, {})
+            stocke = stockes.get(projet_id, {})
+            for champ in ('total_depots', 'total_retraits', 'total_depenses', 'date_derniere_transaction'):
+                valeur_reelle = reel.get(champ) or 0
+                valeur_stockee = stocke.get(champ) or 0
+                if valeur_reelle != valeur_stockee:
+                    ecarts.append({
+                        'projet_id': projet_id,
+                        'champ': champ,
+                        'stocke': valeur_stockee,
+                        'reel': valeur_reelle,
+                    })
+        return ecarts
+
+
+class AgregatJournalier(models.Model):
+    """
+    Totaux journaliers des transactions validées par projet, type et catégorie,
+    tenus à jour à chaque écriture de Transaction
+    """
+    date = models.DateField(
+        verbose_name='Date'
+    )
+    projet = models.ForeignKey(
+        'projects.Projet',
+        on_delete=models.CASCADE,
+        related_name='agregats_journaliers',
+        verbose_name='Projet'
+    )
+    type = models.CharField(
+        max_length=10,
+        choices=Transaction.TYPE_CHOICES,
+        verbose_name='Type'
+    )
+    categorie = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='Catégorie'
+    )
+    montant_total = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Montant total'
+    )
+    nombre = models.IntegerField(
+        default=0,
+        verbose_name='Nombre de transactions'
+    )
+    
+    class Meta:
+        verbose_name = 'Agrégat journalier'
+        verbose_name_plural = 'Agrégats journaliers'
+        ordering = ['-date']
+        unique_together = ['date', 'projet', 'type', 'categorie']
+        indexes = [
+            models.Index(fields=['date', 'type']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.type} - {self.montant_total} GNF"
+    
+    @classmethod
+    def appliquer(cls, valeurs, montant, nombre):
+        """Ajoute un montant et un nombre de transactions à l'agrégat du jour"""
+        if valeurs['statut'] != 'Validée' or not valeurs['projet_id']:
+            return
+        
+        cle = {
+            'date': valeurs['date_transaction'],
+            'projet_id': valeurs['projet_id'],
+            'type': valeurs['type'],
+            'categorie': valeurs['categorie'] or '',
+        }
+        mise_a_jour = {
+            'montant_total': F('montant_total') + montant,
+            'nombre': F('nombre') + nombre,
+        }
+        if not cls.objects.filter(**cle).update(**mise_a_jour):
+            cls.objects.get_or_create(**cle)
+            cls.objects.filter(**cle).update(**mise_a_jour)
+        
+        if nombre < 0:
+            cls.objects.filter(nombre__lte=0, **cle).delete()
+    
+    @classmethod
+    def reconstruire(cls, date_debut=None):
+        """Reconstruit les agrégats à partir des transactions validées, retourne le nombre de lignes"""
+        transactions = Transaction.objects.filter(statut='Validée')
+        agregats = cls.objects.all()
+        if date_debut:
+            transactions = transactions.filter(date_transaction__gte=date_debut)
+            agregats = agregats.filter(date__gte=date_debut)
+        
+        lignes = transactions.values(
+            'date_transaction', 'projet_id', 'type', 'categorie'
+        ).annotate(
+            total=Sum('montant'),
+            nombre_transactions=models.Count('id'),
+        ).order_by()
+        
+        # Les catégories vides et nulles sont regroupées sous ''
+        regroupees = {}
+        for ligne in lignes:
+            cle = (ligne['date_transaction'], ligne['projet_id'], ligne['type'], ligne['categorie'] or '')
+            total, nombre = regroupees.get(cle, (0, 0))
+            regroupees[cle] = (total + ligne['total'], nombre + ligne['nombre_transactions'])
+        
+        with transaction.atomic():
+            agregats.delete()
+            cls.objects.bulk_create([
+                cls(date=date, projet_id=projet_id, type=type_transaction, categorie=categorie,
+                    montant_total=total, nombre=nombre)
+                for (date, projet_id, type_transaction, categorie), (total, nombre) in regroupees.items()
+            ], batch_size=1000)
+        return len(regroupees)
+    
+    @classmethod
+    def totaux(cls, date_debut=None, date_fin=None, **filtres):
+        """Totaux par type de transaction sur une période"""
+        agregats = cls.objects.filter(**filtres)
+        if date_debut:
+            agregats = agregats.filter(date__gte=date_debut)
+        if date_fin:
+            agregats = agregats.filter(date__lte=date_fin)
+        totaux = agregats.aggregate(
+            depots=Sum('montant_total', filter=Q(type='Dépôt')),
+            retraits=Sum('montant_total', filter=Q(type='Retrait')),
+            depenses=Sum('montant_total', filter=Q(type='Dépense')),
+        )
+        return {cle: valeur or 0 for cle, valeur in totaux.items()}
+
+
 class CategorieDepense(models.Model):
     """
     Modèle pour les catégories de dépenses
@@ -378,7 +784,7 @@ class Depense(models.Model):
         indexes = [
             models.Index(fields=['projet']),
             models.Index(fields=['categorie']),
-            models.Index(fields=['date_depense']),
+            models.Index(fields=['date_depense', 'id']),
             models.Index(fields=['statut']),
         ]
     
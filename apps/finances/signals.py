@@ -0,0 +1,7 @@
+"""
+Signaux émis par l'application finances
+"""
+from django.dispatch import Signal
+
+# Émis après Transaction.creer_en_masse (bulk_create n'envoie pas post_save)
+transactions_creees_en_masse = Signal()
@@ -1,8 +1,13 @@
-from django.test import TestCase
+from django.test import TestCase, Client as TestClient
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from datetime import date, timedelta
-from apps.finances.models import Transaction, Depense, CategorieDepense, Fournisseur
+import time
+from django.urls import reverse
+from apps.finances.models import (
+    Transaction, Depense, CategorieDepense, Fournisseur, SoldeProjet, AgregatJournalier
+)
+from apps.core.pagination import KeysetPaginator
 from apps.projects.models import Projet
 from apps.clients.models import Client
 
@@ -210,3 +215,298 @@ class DepenseModelTest(TestCase):
         self.assertEqual(transaction.type, 'Dépense')
         self.assertEqual(transaction.montant, Decimal('500000.00'))
         self.assertEqual(transaction.statut, 'Validée')
+
+
+class SoldeProjetTest(TestCase):
+    """Tests pour les soldes matérialisés des projets"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        
+        self.client = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        
+        self.projet = Projet.objects.create(
+            code_projet='PROJ-TEST-003',
+            nom_projet='Projet Test 3',
+            client=self.client,
+            montant_prevu=Decimal('1000000.00'),
+            date_debut=date.today(),
+            statut='En_cours'
+        )
+    
+    def creer_transaction(self, type_transaction, montant, **kwargs):
+        kwargs.setdefault('date_transaction', date.today())
+        return Transaction.objects.create(
+            projet=self.projet,
+            type=type_transaction,
+            montant=Decimal(montant),
+            saisi_par=self.user,
+            **kwargs
+        )
+    
+    def test_solde_mis_a_jour_a_la_creation(self):
+        """Test : Le solde est incrémenté à chaque transaction validée"""
+        hier = date.today() - timedelta(days=1)
+        self.creer_transaction('Dépôt', '500000.00', date_transaction=hier)
+        self.creer_transaction('Retrait', '100000.00')
+        self.creer_transaction('Dépense', '200000.00', date_transaction=hier)
+        self.creer_transaction('Dépense', '50000.00', statut='En_attente')
+        
+        solde = SoldeProjet.objects.get(projet=self.projet)
+        self.assertEqual(solde.total_depots, Decimal('500000.00'))
+        self.assertEqual(solde.total_retraits, Decimal('100000.00'))
+        self.assertEqual(solde.total_depenses, Decimal('200000.00'))
+        self.assertEqual(solde.date_derniere_transaction, date.today())
+    
+    def test_solde_mis_a_jour_a_la_modification(self):
+        """Test : Modifier le montant, le type ou le statut corrige le solde"""
+        transaction = self.creer_transaction('Dépôt', '500000.00')
+        
+        transaction.montant = Decimal('300000.00')
+        transaction.save()
+        self.assertEqual(self.projet.get_total_depots(), Decimal('300000.00'))
+        
+        transaction.type = 'Dépense'
+        transaction.save()
+        self.assertEqual(self.projet.get_total_depots(), Decimal('0'))
+        self.assertEqual(self.projet.get_total_depenses(), Decimal('300000.00'))
+        
+        transaction.statut = 'Annulée'
+        transaction.save()
+        self.assertEqual(self.projet.get_total_depenses(), Decimal('0'))
+    
+    def test_solde_mis_a_jour_a_la_suppression(self):
+        """Test : La suppression d'une transaction retire sa contribution"""
+        self.creer_transaction('Dépôt', '500000.00')
+        transaction = self.creer_transaction('Dépôt', '200000.00', date_transaction=date.today() + timedelta(days=1))
+        transaction.delete()
+        
+        solde = SoldeProjet.objects.get(projet=self.projet)
+        self.assertEqual(solde.total_depots, Decimal('500000.00'))
+        self.assertEqual(solde.date_derniere_transaction, date.today())
+    
+    def test_suppression_en_masse_admin(self):
+        """Test : L'action de suppression de l'admin retire les montants des soldes, agrégats et dépassements"""
+        hier = date.today() - timedelta(days=1)
+        depot = self.creer_transaction('Dépôt', '500000.00', date_transaction=hier)
+        depense = self.creer_transaction('Dépense', '2000000.00')
+        self.creer_transaction('Dépense', '100000.00', date_transaction=hier)
+        self.projet.refresh_from_db()
+        self.assertTrue(self.projet.budget_depasse)
+        
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        client = TestClient()
+        client.force_login(admin)
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            client.post(reverse('admin:finances_transaction_changelist'), {
+                'action': 'delete_selected', '_selected_action': [depot.pk, depense.pk], 'post': 'yes'
+            })
+        
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(SoldeProjet.verifier_coherence(), [])
+        solde = SoldeProjet.objects.get(projet=self.projet)
+        self.assertEqual(solde.total_depenses, Decimal('100000.00'))
+        self.assertEqual(solde.date_derniere_transaction, hier)
+        agregats = list(AgregatJournalier.objects.values_list('date', 'type', 'montant_total', 'nombre'))
+        AgregatJournalier.reconstruire()
+        self.assertEqual(
+            agregats, list(AgregatJournalier.objects.values_list('date', 'type', 'montant_total', 'nombre'))
+        )
+        self.projet.refresh_from_db()
+        self.assertFalse(self.projet.budget_depasse)
+        self.assertEqual(self.projet.montant_depassement, Decimal('0'))
+    
+    def test_lecture_budget_sans_agregation(self):
+        """Test : Le budget disponible se lit en une seule requête"""
+        self.creer_transaction('Dépôt', '500000.00')
+        self.creer_transaction('Dépense', '200000.00')
+        
+        with self.assertNumQueries(1):
+            budget = self.projet.get_budget_disponible()
+        self.assertEqual(budget, Decimal('1300000.00'))
+    
+    def test_verification_et_reconstruction(self):
+        """Test : Un écart est détecté puis corrigé par la reconstruction"""
+        self.creer_transaction('Dépôt', '500000.00')
+        self.assertEqual(SoldeProjet.verifier_coherence(), [])
+        
+        # Écriture directe qui contourne Transaction.save()
+        Transaction.objects.filter(projet=self.projet).update(montant=Decimal('700000.00'))
+        ecarts = SoldeProjet.verifier_coherence()
+        self.assertEqual(len(ecarts), 1)
+        self.assertEqual(ecarts[0]['champ'], 'total_depots')
+        
+        SoldeProjet.reconstruire()
+        self.assertEqual(SoldeProjet.verifier_coherence(), [])
+        self.assertEqual(self.projet.get_total_depots(), Decimal('700000.00'))
+
+
+class AgregatJournalierTest(TestCase):
+    """Tests pour les agrégats journaliers des transactions"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        
+        self.client = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        
+        self.projet = Projet.objects.create(
+            code_projet='PROJ-TEST-004',
+            nom_projet='Projet Test 4',
+            client=self.client,
+            montant_prevu=Decimal('1000000.00'),
+            date_debut=date.today(),
+            statut='En_cours'
+        )
+        self.jour = date(2024, 3, 15)
+    
+    def creer_transaction(self, type_transaction, montant, **kwargs):
+        kwargs.setdefault('date_transaction', self.jour)
+        return Transaction.objects.create(
+            projet=self.projet,
+            type=type_transaction,
+            montant=Decimal(montant),
+            saisi_par=self.user,
+            **kwargs
+        )
+    
+    def test_agregat_incremental(self):
+        """Test : Les transactions du même jour sont cumulées dans un seul agrégat"""
+        self.creer_transaction('Dépense', '100000.00', categorie='Transport')
+        self.creer_transaction('Dépense', '50000.00', categorie='Transport')
+        self.creer_transaction('Dépense', '70000.00')
+        self.creer_transaction('Dépense', '90000.00', categorie='Transport', statut='En_attente')
+        
+        agregat = AgregatJournalier.objects.get(date=self.jour, type='Dépense', categorie='Transport')
+        self.assertEqual(agregat.montant_total, Decimal('150000.00'))
+        self.assertEqual(agregat.nombre, 2)
+        self.assertEqual(AgregatJournalier.objects.count(), 2)
+    
+    def test_modification_et_suppression(self):
+        """Test : Changer la date ou supprimer une transaction déplace ou retire sa contribution"""
+        transaction = self.creer_transaction('Dépôt', '100000.00')
+        autre_jour = self.jour + timedelta(days=1)
+        
+        transaction.date_transaction = autre_jour
+        transaction.save()
+        self.assertFalse(AgregatJournalier.objects.filter(date=self.jour).exists())
+        self.assertEqual(AgregatJournalier.objects.get(date=autre_jour).montant_total, Decimal('100000.00'))
+        
+        transaction.delete()
+        self.assertFalse(AgregatJournalier.objects.exists())
+    
+    def test_totaux_par_periode(self):
+        """Test : Totaux sur une période"""
+        self.creer_transaction('Dépôt', '500000.00', date_transaction=date(2024, 2, 10))
+        self.creer_transaction('Dépôt', '200000.00')
+        self.creer_transaction('Retrait', '100000.00')
+        self.creer_transaction('Dépense', '80000.00', date_transaction=date(2024, 3, 31))
+        
+        totaux = AgregatJournalier.totaux(date_debut=date(2024, 3, 1), date_fin=date(2024, 3, 31))
+        self.assertEqual(totaux['depots'], Decimal('200000.00'))
+        self.assertEqual(totaux['retraits'], Decimal('100000.00'))
+        self.assertEqual(totaux['depenses'], Decimal('80000.00'))
+    
+    def test_reconstruction(self):
+        """Test : La reconstruction redonne les mêmes agrégats que la mise à jour incrémentale"""
+        self.creer_transaction('Dépense', '100000.00', categorie='Transport')
+        self.creer_transaction('Dépense', '50000.00')
+        self.creer_transaction('Dépôt', '300000.00', date_transaction=date(2024, 1, 5))
+        attendus = set(AgregatJournalier.objects.values_list('date', 'type', 'categorie', 'montant_total', 'nombre'))
+        
+        AgregatJournalier.objects.all().delete()
+        self.assertEqual(AgregatJournalier.reconstruire(), 3)
+        reconstruits = set(AgregatJournalier.objects.values_list('date', 'type', 'categorie', 'montant_total', 'nombre'))
+        self.assertEqual(reconstruits, attendus)
+    
+    def test_creation_en_masse(self):
+        """Test : L'insertion groupée tient soldes et agrégats à jour comme save()"""
+        Transaction.creer_en_masse([
+            Transaction(
+                projet=self.projet, type='Dépense', montant=Decimal('100000.00'),
+                categorie='Transport', date_transaction=self.jour, saisi_par=self.user
+            ),
+            Transaction(
+                projet=self.projet, type='Dépense', montant=Decimal('50000.00'),
+                categorie='Transport', date_transaction=self.jour, saisi_par=self.user
+            ),
+            Transaction(
+                projet=self.projet, type='Dépôt', montant=Decimal('300000.00'),
+                date_transaction=date(2024, 1, 5), saisi_par=self.user
+            ),
+            Transaction(
+                projet=self.projet, type='Dépense', montant=Decimal('90000.00'),
+                date_transaction=self.jour, statut='En_attente', saisi_par=self.user
+            ),
+        ])
+        
+        self.assertEqual(SoldeProjet.verifier_coherence(), [])
+        attendus = set(AgregatJournalier.objects.values_list('date', 'type', 'categorie', 'montant_total', 'nombre'))
+        AgregatJournalier.reconstruire()
+        reconstruits = set(AgregatJournalier.objects.values_list('date', 'type', 'categorie', 'montant_total', 'nombre'))
+        self.assertEqual(reconstruits, attendus)
+        self.assertEqual(self.projet.solde.date_derniere_transaction, self.jour)
+
+
+class PaginationCurseurDebitTest(TestCase):
+    """Test de performance : pagination par curseur de la page 1 à la page 10 000"""
+    PAR_PAGE = 20
+    NOMBRE_PAGES = 10000
+    
+    def mesurer(self, fonction, repetitions=5):
+        """Durée médiane d'exécution de `fonction`"""
+        durees = []
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            fonction()
+            durees.append(time.perf_counter() - debut)
+        return sorted(durees)[repetitions // 2]
+    
+    def test_latence_constante(self):
+        """Test : La page 10 000 se lit aussi vite que la première"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        projet = Projet.objects.create(
+            code_projet='PROJ-TEST-001',
+            nom_projet='Projet Test',
+            client=client,
+            montant_prevu=Decimal('10000000.00'),
+            date_debut=date.today(),
+            statut='En_cours'
+        )
+        nombre = self.PAR_PAGE * self.NOMBRE_PAGES
+        Transaction.objects.bulk_create([
+            Transaction(
+                projet=projet, type='Dépôt', montant=Decimal('1000.00'),
+                date_transaction=date(2020, 1, 1) + timedelta(days=numero % 2000),
+                saisi_par=user
+            )
+            for numero in range(nombre)
+        ], batch_size=5000)
+        
+        queryset = Transaction.objects.select_related('projet', 'saisi_par')
+        paginator = KeysetPaginator(queryset, self.PAR_PAGE)
+        # Curseur de la page 10 000 : dernière ligne de la page 9 999
+        derniere = Transaction.objects.order_by('-date_transaction', '-pk')[nombre - self.PAR_PAGE - 1]
+        jeton = paginator.encoder_jeton('suivant', derniere)
+        
+        premiere_page = self.mesurer(lambda: list(paginator.page()))
+        page_profonde = self.mesurer(lambda: list(paginator.page(jeton)))
+        
+        page = paginator.page(jeton)
+        self.assertEqual(len(page), self.PAR_PAGE)
+        self.assertFalse(page.has_next())
+        self.assertLess(page_profonde, premiere_page * 5 + 0.005)
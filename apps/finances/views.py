@@ -6,12 +6,13 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, D
 from django.urls import reverse_lazy
 from django.db.models import Q
 from django.utils import timezone
+from apps.core.pagination import KeysetPaginationMixin
 from .models import Transaction, Depense, CategorieDepense, Fournisseur
 from .forms import TransactionForm, DepenseForm, CategorieDepenseForm, FournisseurForm
 
 
 # Transaction Views
-class TransactionListView(LoginRequiredMixin, ListView):
+class TransactionListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Transaction
     template_name = 'finances/transaction_list.html'
     context_object_name = 'transactions'
@@ -63,7 +64,7 @@ class TransactionDeleteView(LoginRequiredMixin, DeleteView):
 
 
 # Depense Views
-class DepenseListView(LoginRequiredMixin, ListView):
+class DepenseListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Depense
     template_name = 'finances/depense_list.html'
     context_object_name = 'depenses'
@@ -16,8 +16,8 @@ class UniteMessureAdmin(admin.ModelAdmin):
 
 @admin.register(CategorieProduit)
 class CategorieProduitAdmin(admin.ModelAdmin):
-    list_display = ['nom', 'code', 'actif', 'ordre_affichage', 'date_creation']
-    list_filter = ['actif']
+    list_display = ['nom', 'code', 'methode_valorisation', 'actif', 'ordre_affichage', 'date_creation']
+    list_filter = ['actif', 'methode_valorisation']
     search_fields = ['nom', 'code']
     ordering = ['ordre_affichage', 'nom']
 
@@ -47,13 +47,13 @@ class ProduitAdmin(admin.ModelAdmin):
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
     list_display = ['produit', 'projet', 'quantite_actuelle', 'valeur_stock', 'emplacement', 'stock_status']
-    list_filter = ['projet', 'produit__categorie']
+    list_filter = ['is_low', 'projet', 'produit__categorie']
     search_fields = ['produit__nom', 'projet__nom_projet', 'emplacement']
-    readonly_fields = ['valeur_stock', 'date_creation', 'date_modification']
+    readonly_fields = ['valeur_stock', 'is_low', 'manque', 'date_creation', 'date_modification']
     ordering = ['projet', 'produit']
     
     def stock_status(self, obj):
-        if obj.is_stock_faible():
+        if obj.is_low:
             return format_html('<span style="color: red;">⚠️ Stock faible</span>')
         return format_html('<span style="color: green;">✓ Stock OK</span>')
     stock_status.short_description = 'Statut'
@@ -119,16 +119,16 @@ class LigneAchatAdmin(admin.ModelAdmin):
 class MouvementStockAdmin(admin.ModelAdmin):
     list_display = ['stock', 'type_mouvement', 'quantite', 'quantite_avant', 'quantite_apres', 'date_mouvement', 'effectue_par']
     list_filter = ['type_mouvement', 'stock__projet', 'date_mouvement']
-    search_fields = ['stock__produit__nom', 'stock__projet__nom_projet', 'motif']
-    readonly_fields = ['quantite_avant', 'quantite_apres', 'date_mouvement', 'date_creation']
+    search_fields = ['stock__produit__nom', 'stock__projet__nom_projet', 'motif', 'numero_transfert']
+    readonly_fields = ['quantite_avant', 'quantite_apres', 'cout_unitaire', 'cout_total', 'date_mouvement', 'date_creation']
     ordering = ['-date_mouvement']
     
     fieldsets = (
         ('Informations du mouvement', {
-            'fields': ('stock', 'type_mouvement', 'quantite', 'quantite_avant', 'quantite_apres')
+            'fields': ('stock', 'type_mouvement', 'quantite', 'quantite_avant', 'quantite_apres', 'cout_unitaire', 'cout_total')
         }),
         ('Détails', {
-            'fields': ('date_mouvement', 'achat', 'projet_destination', 'motif')
+            'fields': ('date_mouvement', 'achat', 'projet_destination', 'numero_transfert', 'motif')
         }),
         ('Informations système', {
             'fields': ('effectue_par', 'date_creation'),
@@ -21,11 +21,12 @@ class UniteMessureForm(forms.ModelForm):
 class CategorieProduitForm(forms.ModelForm):
     class Meta:
         model = CategorieProduit
-        fields = ['nom', 'code', 'description', 'ordre_affichage', 'actif']
+        fields = ['nom', 'code', 'description', 'methode_valorisation', 'ordre_affichage', 'actif']
         widgets = {
             'nom': forms.TextInput(attrs={'class': 'form-control'}),
             'code': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
+            'methode_valorisation': forms.Select(attrs={'class': 'form-select'}),
             'ordre_affichage': forms.NumberInput(attrs={'class': 'form-control'}),
             'actif': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
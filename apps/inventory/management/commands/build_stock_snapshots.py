@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.inventory.models import InstantaneStock
+
+
+class Command(BaseCommand):
+    help = 'Construit les instantanés de stock manquants depuis le dernier instantané'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--periodicite',
+            choices=[cle for cle, _ in InstantaneStock.PERIODICITE_CHOICES],
+            default='mois',
+            help='Un instantané par fin de jour ou par fin de mois (par défaut)'
+        )
+        parser.add_argument(
+            '--jusqu-au',
+            dest='date_fin',
+            help='Dernière date à construire au format AAAA-MM-JJ (hier par défaut)'
+        )
+
+    def handle(self, *args, **options):
+        date_fin = None
+        if options['date_fin']:
+            try:
+                date_fin = date.fromisoformat(options['date_fin'])
+            except ValueError:
+                raise CommandError(f"Date invalide : {options['date_fin']} (format attendu AAAA-MM-JJ)")
+
+        dates = InstantaneStock.construire(date_fin, options['periodicite'])
+        if dates:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {len(dates)} instantané(s) construit(s), du {dates[0]:%d/%m/%Y} au {dates[-1]:%d/%m/%Y}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Instantanés déjà à jour'))
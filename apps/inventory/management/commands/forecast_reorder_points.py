@@ -0,0 +1,60 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.inventory.services import PrevisionReapprovisionnement
+
+
+class Command(BaseCommand):
+    help = 'Calcule les points de commande et quantités à commander suggérés à partir des sorties de stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Fin (exclue) de la période de consommation au format AAAA-MM-JJ (aujourd'hui par défaut)"
+        )
+        parser.add_argument(
+            '--fenetre', type=int, default=90,
+            help='Nombre de jours de sorties pris en compte (90 par défaut)'
+        )
+        parser.add_argument(
+            '--portee', type=int, default=14,
+            help='Portée en jours du lissage exponentiel de la consommation (14 par défaut)'
+        )
+        parser.add_argument(
+            '--fenetre-delais', type=int, default=365,
+            help='Nombre de jours d\'achats reçus pris en compte pour les délais de livraison (365 par défaut)'
+        )
+        parser.add_argument(
+            '--couverture', type=int, default=30,
+            help='Nombre de jours de consommation couverts par une commande (30 par défaut)'
+        )
+        parser.add_argument(
+            '--securite', type=float, default=1.65,
+            help='Facteur de sécurité appliqué à l\'écart type de la consommation (1.65 par défaut)'
+        )
+        parser.add_argument(
+            '--delai-defaut', type=float, default=7,
+            help='Délai de livraison en jours sans historique d\'achat (7 par défaut)'
+        )
+
+    def handle(self, *args, **options):
+        date_fin = None
+        if options['date']:
+            try:
+                date_fin = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Date invalide : {options['date']} (format attendu AAAA-MM-JJ)")
+        if options['fenetre'] < 1 or options['portee'] < 1:
+            raise CommandError('La fenêtre et la portée doivent être d\'au moins un jour')
+
+        nombre = PrevisionReapprovisionnement(
+            date_fin=date_fin,
+            fenetre=options['fenetre'],
+            portee=options['portee'],
+            fenetre_delais=options['fenetre_delais'],
+            couverture=options['couverture'],
+            facteur_securite=options['securite'],
+            delai_defaut=options['delai_defaut'],
+        ).enregistrer()
+        self.stdout.write(self.style.SUCCESS(f'✓ {nombre} suggestion(s) de réapprovisionnement calculée(s)'))
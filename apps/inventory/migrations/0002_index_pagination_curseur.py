@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['date_mouvement', 'id'], name='inventory_m_date_mo_5b48a6_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='mouvementstock',
+            name='inventory_m_date_mo_9620eb_idx',
+        ),
+    ]
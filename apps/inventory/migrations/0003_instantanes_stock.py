@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_budget_depasse'),
+        ('inventory', '0002_index_pagination_curseur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('quantite', models.DecimalField(decimal_places=2, default=0.0, max_digits=10, verbose_name='Quantité')),
+                ('prix_unitaire', models.DecimalField(decimal_places=2, default=0.0, help_text='Prix unitaire moyen du produit lors de la construction', max_digits=15, verbose_name='Prix unitaire')),
+                ('valeur', models.DecimalField(decimal_places=2, default=0.0, max_digits=15, verbose_name='Valeur')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantanes_stock', to='inventory.produit', verbose_name='Produit')),
+                ('projet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantanes_stock', to='projects.projet', verbose_name='Projet')),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'verbose_name_plural': 'Instantanés de stock',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'projet', 'produit')},
+            },
+        ),
+    ]
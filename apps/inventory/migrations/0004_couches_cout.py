@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_instantanes_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorieproduit',
+            name='methode_valorisation',
+            field=models.CharField(choices=[('CMP', 'Coût moyen pondéré'), ('FIFO', 'Premier entré, premier sorti (FIFO)')], default='CMP', help_text='Coût des sorties de stock des produits de la catégorie', max_length=10, verbose_name='Méthode de valorisation'),
+        ),
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='cout_total',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Calculé automatiquement', max_digits=15, verbose_name='Coût total'),
+        ),
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='cout_unitaire',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text="Coût d'achat pour une entrée, coût des couches consommées pour une sortie", max_digits=19, null=True, verbose_name='Coût unitaire'),
+        ),
+        migrations.CreateModel(
+            name='CoucheCout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_entree', models.DateTimeField(default=django.utils.timezone.now, verbose_name="Date d'entrée")),
+                ('quantite_initiale', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Quantité initiale')),
+                ('quantite_restante', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Quantité restante')),
+                ('cout_unitaire', models.DecimalField(decimal_places=4, max_digits=19, verbose_name='Coût unitaire')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='couches_cout', to='inventory.stock', verbose_name='Stock')),
+            ],
+            options={
+                'verbose_name': 'Couche de coût',
+                'verbose_name_plural': 'Couches de coût',
+                'ordering': ['date_entree', 'id'],
+                'indexes': [models.Index(fields=['stock', 'quantite_restante'], name='inventory_c_stock_i_5ac1ff_idx')],
+            },
+        ),
+    ]
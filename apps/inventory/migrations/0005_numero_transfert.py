@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_couches_cout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='numero_transfert',
+            field=models.CharField(blank=True, help_text="Commun à la sortie et à l'entrée d'un même transfert", max_length=50, null=True, verbose_name='N° de transfert'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['numero_transfert'], name='inventory_m_numero__e74a48_idx'),
+        ),
+    ]
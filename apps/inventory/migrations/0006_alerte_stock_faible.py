@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:41
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def initialiser_alertes(apps, schema_editor):
+    """Calcule l'indicateur de stock faible et le manque des stocks existants"""
+    Stock = apps.get_model('inventory', 'Stock')
+    Produit = apps.get_model('inventory', 'Produit')
+    champ = models.DecimalField(max_digits=10, decimal_places=2)
+    minimum = Subquery(
+        Produit.objects.filter(pk=OuterRef('produit_id')).values('stock_minimum')[:1],
+        output_field=champ
+    )
+    Stock.objects.filter(quantite_actuelle__lt=minimum).update(
+        is_low=True, manque=minimum - F('quantite_actuelle')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_numero_transfert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='is_low',
+            field=models.BooleanField(default=False, help_text='Quantité inférieure au stock minimum du produit (calculé automatiquement)', verbose_name='Stock faible'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='manque',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Quantité manquante pour atteindre le stock minimum', max_digits=10, verbose_name='Manque'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['is_low', 'projet'], name='inventory_s_is_low_a610b9_idx'),
+        ),
+        migrations.RunPython(initialiser_alertes, migrations.RunPython.noop),
+    ]
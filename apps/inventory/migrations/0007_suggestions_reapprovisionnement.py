@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_alerte_stock_faible'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestionReapprovisionnement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consommation_journaliere', models.DecimalField(decimal_places=4, help_text='Moyenne lissée exponentiellement des sorties par jour', max_digits=12, verbose_name='Consommation journalière')),
+                ('delai_livraison', models.DecimalField(decimal_places=1, max_digits=6, verbose_name='Délai de livraison (jours)')),
+                ('stock_securite', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Stock de sécurité')),
+                ('point_commande', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Point de commande')),
+                ('quantite_suggeree', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Quantité suggérée')),
+                ('date_calcul', models.DateTimeField(verbose_name='Date du calcul')),
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='suggestion_reapprovisionnement', to='inventory.stock', verbose_name='Stock')),
+            ],
+            options={
+                'verbose_name': 'Suggestion de réapprovisionnement',
+                'verbose_name_plural': 'Suggestions de réapprovisionnement',
+                'ordering': ['stock'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_suggestions_reapprovisionnement'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='instantanestock',
+            name='prix_unitaire',
+            field=models.DecimalField(decimal_places=4, default=0.0, help_text='Coût unitaire moyen des couches de coût du stock (valeur / quantité)', max_digits=19, verbose_name='Prix unitaire'),
+        ),
+    ]
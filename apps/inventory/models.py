@@ -1,10 +1,23 @@
-from django.db import models
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+
+from django.db import connection, models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db.models import Sum, Q
-from datetime import datetime
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from decimal import Decimal
+
+from apps.core.models import SequenceNumerotation
+from apps.core.utils.bulk import completer_cles_primaires, creer_documents_en_masse
+
+
+class StockInsuffisant(ValidationError):
+    """Mouvement refusé : il rendrait le stock négatif"""
 
 
 class UniteMessure(models.Model):
@@ -48,6 +61,11 @@ class CategorieProduit(models.Model):
     """
     Modèle pour les catégories de produits
     """
+    METHODE_VALORISATION_CHOICES = [
+        ('CMP', 'Coût moyen pondéré'),
+        ('FIFO', 'Premier entré, premier sorti (FIFO)'),
+    ]
+    
     nom = models.CharField(
         max_length=100,
         unique=True,
@@ -73,6 +91,13 @@ class CategorieProduit(models.Model):
         default=0,
         verbose_name='Ordre d\'affichage'
     )
+    methode_valorisation = models.CharField(
+        max_length=10,
+        choices=METHODE_VALORISATION_CHOICES,
+        default='CMP',
+        verbose_name='Méthode de valorisation',
+        help_text='Coût des sorties de stock des produits de la catégorie'
+    )
     date_creation = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Date de création'
@@ -163,20 +188,15 @@ class Produit(models.Model):
     def save(self, *args, **kwargs):
         if not self.code_produit:
             # Génération automatique du code produit
-            year = datetime.now().year
-            last_produit = Produit.objects.filter(
-                code_produit__startswith=f'PROD-{year}-'
-            ).order_by('code_produit').last()
-            
-            if last_produit:
-                last_number = int(last_produit.code_produit.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.code_produit = f'PROD-{year}-{new_number:04d}'
+            self.code_produit = SequenceNumerotation.prochain_code('PROD')
         
+        creation = self._state.adding
         super().save(*args, **kwargs)
+        
+        update_fields = kwargs.get('update_fields')
+        if not creation and (update_fields is None or 'stock_minimum' in update_fields):
+            # Le seuil a pu changer : alertes des stocks du produit recalculées en une requête
+            Stock.actualiser_alertes(self.stocks.all(), stock_minimum=self.stock_minimum)
     
     def get_absolute_url(self):
         return reverse('inventory:produit_detail', kwargs={'pk': self.pk})
@@ -204,11 +224,7 @@ class Produit(models.Model):
     
     def get_projets_avec_stock_faible(self):
         """Retourne la liste des projets avec stock faible"""
-        projets = []
-        for stock in self.stocks.all():
-            if stock.quantite_actuelle < self.stock_minimum:
-                projets.append(stock.projet)
-        return projets
+        return [stock.projet for stock in self.stocks.filter(is_low=True).select_related('projet')]
 
 
 class Stock(models.Model):
@@ -248,6 +264,18 @@ class Stock(models.Model):
         null=True,
         verbose_name='Emplacement'
     )
+    is_low = models.BooleanField(
+        default=False,
+        verbose_name='Stock faible',
+        help_text='Quantité inférieure au stock minimum du produit (calculé automatiquement)'
+    )
+    manque = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Manque',
+        help_text='Quantité manquante pour atteindre le stock minimum'
+    )
     date_derniere_entree = models.DateTimeField(
         blank=True,
         null=True,
@@ -275,11 +303,16 @@ class Stock(models.Model):
         indexes = [
             models.Index(fields=['projet']),
             models.Index(fields=['produit']),
+            models.Index(fields=['is_low', 'projet']),
         ]
     
     def __str__(self):
         return f"{self.produit.nom} - {self.projet.code_projet} ({self.quantite_actuelle} {self.produit.unite_mesure.symbole})"
     
+    def save(self, *args, **kwargs):
+        self.actualiser_alerte()
+        super().save(*args, **kwargs)
+    
     def get_absolute_url(self):
         return reverse('inventory:stock_detail', kwargs={'pk': self.pk})
     
@@ -287,10 +320,195 @@ class Stock(models.Model):
         """Vérifie si le stock est en dessous du minimum"""
         return self.quantite_actuelle < self.produit.stock_minimum
     
+    def actualiser_alerte(self):
+        """Met à jour l'indicateur de stock faible et le manque de l'instance"""
+        minimum = Decimal(str(self.produit.stock_minimum))
+        quantite = Decimal(str(self.quantite_actuelle))
+        self.is_low = quantite < minimum
+        self.manque = minimum - quantite if self.is_low else Decimal('0')
+    
+    @staticmethod
+    def expressions_alerte(stock_minimum=None):
+        """
+        Expressions SQL de is_low et manque, pour un UPDATE ensembliste. Sans
+        `stock_minimum`, le seuil est lu sur le produit de chaque stock.
+        """
+        champ = DecimalField(max_digits=10, decimal_places=2)
+        if stock_minimum is None:
+            minimum = Subquery(
+                Produit.objects.filter(pk=OuterRef('produit_id')).values('stock_minimum')[:1],
+                output_field=champ
+            )
+        else:
+            minimum = Value(Decimal(str(stock_minimum)), output_field=champ)
+        return {
+            'is_low': Case(When(quantite_actuelle__lt=minimum, then=Value(True)), default=Value(False)),
+            'manque': Case(
+                When(quantite_actuelle__lt=minimum, then=minimum - F('quantite_actuelle')),
+                default=Value(Decimal('0')),
+                output_field=champ
+            ),
+        }
+    
+    @classmethod
+    def actualiser_alertes(cls, stocks, stock_minimum=None):
+        """Recalcule is_low et manque d'un queryset de stocks en une seule requête"""
+        return stocks.update(**cls.expressions_alerte(stock_minimum))
+    
     def calculer_valeur_stock(self):
         """Calcule la valeur du stock"""
         self.valeur_stock = self.quantite_actuelle * self.produit.prix_unitaire_moyen
         return self.valeur_stock
+    
+    @classmethod
+    def verrouiller(cls, stocks):
+        """
+        Verrouille des lignes de stock (SELECT ... FOR UPDATE) par ordre de clé primaire,
+        ordre commun à tous les appelants pour éviter les interblocages. `stocks` est une
+        liste de clés primaires ou un queryset de stocks (verrouillé sans être lu au
+        préalable). Sans verrou de ligne (SQLite), une écriture neutre prend le verrou
+        d'écriture avant toute lecture : une lecture préalable empêcherait la transaction
+        de devenir écrivain.
+        """
+        lignes = cls.objects.filter(pk__in=stocks)
+        if connection.features.has_select_for_update:
+            list(lignes.select_for_update().order_by('pk').values_list('pk', flat=True))
+        else:
+            lignes.update(quantite_actuelle=F('quantite_actuelle'))
+    
+    @classmethod
+    def appliquer_mouvements(cls, mouvements):
+        """
+        Reporte des mouvements non enregistrés sur leurs stocks, dans l'ordre de la
+        liste : verrouille les lignes, relit les quantités verrouillées, refuse tout
+        stock négatif (StockInsuffisant) et applique les écarts avec des expressions F().
+        Chaque mouvement est valorisé sur les couches de coût du stock, selon la méthode
+        de la catégorie du produit (voir CoucheCout). Renseigne quantite_avant,
+        quantite_apres, cout_unitaire et cout_total des mouvements.
+        Le nombre de requêtes ne dépend pas du nombre de mouvements. À appeler dans une
+        transaction.
+        """
+        stock_ids = {mouvement.stock_id for mouvement in mouvements}
+        cls.verrouiller(stock_ids)
+        stocks = {
+            stock.pk: stock
+            for stock in cls.objects.select_related('produit__categorie').filter(pk__in=stock_ids)
+        }
+        couches = {pk: [] for pk in stock_ids}
+        for couche in CoucheCout.objects.filter(stock_id__in=stock_ids, quantite_restante__gt=0):
+            couches[couche.stock_id].append(couche)
+        initiales = {
+            couche.pk: (couche.quantite_initiale, couche.quantite_restante, couche.cout_unitaire)
+            for couches_stock in couches.values() for couche in couches_stock
+        }
+        quantites = {pk: stock.quantite_actuelle for pk, stock in stocks.items()}
+        # Quantité antérieure aux couches de coût (stock saisi directement), valorisée au prix moyen
+        hors_couches = {
+            pk: max(stock.quantite_actuelle - sum(couche.quantite_restante for couche in couches[pk]), Decimal('0'))
+            for pk, stock in stocks.items()
+        }
+        
+        maintenant = timezone.now()
+        entres, sortis = set(), set()
+        for mouvement in mouvements:
+            stock = stocks[mouvement.stock_id]
+            produit = stock.produit
+            quantite_avant = quantites[stock.pk]
+            quantite = Decimal(str(mouvement.quantite))
+            if mouvement.type_mouvement == 'Ajustement':
+                # L'ajustement fixe la quantité inventoriée
+                ecart = quantite - quantite_avant
+            elif mouvement.type_mouvement == 'Entrée':
+                ecart = quantite
+            else:
+                ecart = -quantite
+            quantite_apres = quantite_avant + ecart
+            if quantite_apres < 0:
+                raise StockInsuffisant(
+                    f'Quantité insuffisante en stock pour {produit.nom} : '
+                    f'{quantite_avant} disponible(s), {quantite} demandée(s).'
+                )
+            
+            couches_stock = couches[stock.pk]
+            if ecart > 0:
+                cout_unitaire = mouvement.cout_unitaire
+                if mouvement.type_mouvement != 'Entrée' or cout_unitaire is None:
+                    cout_unitaire = CoucheCout.cout_moyen(couches_stock, hors_couches[stock.pk], produit.prix_unitaire_moyen)
+                cout_total = CoucheCout.entrer(
+                    produit.categorie.methode_valorisation, couches_stock, stock.pk, ecart, cout_unitaire, maintenant
+                )
+                entres.add(stock.pk)
+            elif ecart < 0:
+                # La quantité hors couches, la plus ancienne, sort en premier
+                sortie_hors_couches = min(hors_couches[stock.pk], -ecart)
+                hors_couches[stock.pk] -= sortie_hors_couches
+                cout_total = sortie_hors_couches * produit.prix_unitaire_moyen + CoucheCout.sortir(
+                    couches_stock, -ecart - sortie_hors_couches
+                )
+                cout_unitaire = cout_total / -ecart
+                if mouvement.type_mouvement in ('Sortie', 'Transfert'):
+                    sortis.add(stock.pk)
+            else:
+                cout_unitaire = CoucheCout.cout_moyen(couches_stock, hors_couches[stock.pk], produit.prix_unitaire_moyen)
+                cout_total = Decimal('0')
+            
+            mouvement.quantite_avant = quantite_avant
+            mouvement.quantite_apres = quantite_apres
+            mouvement.cout_unitaire = Decimal(cout_unitaire).quantize(Decimal('0.0001'))
+            mouvement.cout_total = Decimal(cout_total).quantize(Decimal('0.01'))
+            quantites[stock.pk] = quantite_apres
+        
+        for stock in stocks.values():
+            stock.valeur_stock = (
+                sum((couche.quantite_restante * couche.cout_unitaire for couche in couches[stock.pk]), Decimal('0'))
+                + hors_couches[stock.pk] * stock.produit.prix_unitaire_moyen
+            ).quantize(Decimal('0.01'))
+            stock.quantite_actuelle = F('quantite_actuelle') + (quantites[stock.pk] - stock.quantite_actuelle)
+        # bulk_update compile une expression CASE par ligne et par champ : seuls les
+        # champs propres à chaque stock y passent, les dates sont communes
+        cls.objects.bulk_update(stocks.values(), ['quantite_actuelle', 'valeur_stock'])
+        cls.objects.filter(pk__in=stock_ids).update(date_modification=maintenant, **cls.expressions_alerte())
+        if entres:
+            cls.objects.filter(pk__in=entres).update(date_derniere_entree=maintenant)
+        if sortis:
+            cls.objects.filter(pk__in=sortis).update(date_derniere_sortie=maintenant)
+        
+        toutes = [couche for couches_stock in couches.values() for couche in couches_stock]
+        modifiees = [
+            couche for couche in toutes
+            if couche.pk is not None
+            and initiales[couche.pk] != (couche.quantite_initiale, couche.quantite_restante, couche.cout_unitaire)
+        ]
+        # Couches seulement consommées, puis couches CMP ayant reçu une entrée
+        CoucheCout.objects.bulk_update([
+            couche for couche in modifiees if couche.quantite_initiale == initiales[couche.pk][0]
+        ], ['quantite_restante'])
+        CoucheCout.objects.bulk_update([
+            couche for couche in modifiees if couche.quantite_initiale != initiales[couche.pk][0]
+        ], ['quantite_initiale', 'quantite_restante', 'cout_unitaire'])
+        CoucheCout.objects.bulk_create([couche for couche in toutes if couche.pk is None])
+        
+        # Garder les instances de stock chargées cohérentes avec la base
+        for stock in stocks.values():
+            stock.quantite_actuelle = quantites[stock.pk]
+            stock.actualiser_alerte()
+            stock.date_modification = maintenant
+            if stock.pk in entres:
+                stock.date_derniere_entree = maintenant
+            if stock.pk in sortis:
+                stock.date_derniere_sortie = maintenant
+        for mouvement in mouvements:
+            if MouvementStock.stock.is_cached(mouvement):
+                stock = stocks[mouvement.stock_id]
+                mouvement.stock.quantite_actuelle = stock.quantite_actuelle
+                mouvement.stock.valeur_stock = stock.valeur_stock
+                mouvement.stock.is_low = stock.is_low
+                mouvement.stock.manque = stock.manque
+        return mouvements
+
+
+# Achats dont le recalcul du montant total est différé (voir Achat.differer_recalcul)
+_achats_differes = ContextVar('achats_differes', default=frozenset())
 
 
 class Achat(models.Model):
@@ -420,18 +638,7 @@ class Achat(models.Model):
     def save(self, *args, **kwargs):
         if not self.numero_achat:
             # Génération automatique du numéro d'achat
-            year = datetime.now().year
-            last_achat = Achat.objects.filter(
-                numero_achat__startswith=f'ACH-{year}-'
-            ).order_by('numero_achat').last()
-            
-            if last_achat:
-                last_number = int(last_achat.numero_achat.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.numero_achat = f'ACH-{year}-{new_number:04d}'
+            self.numero_achat = SequenceNumerotation.prochain_code('ACH')
         
         # Déduire du budget du projet si l'achat est validé ou reçu
         if self.pk:  # Si l'achat existe déjà (modification)
@@ -439,23 +646,150 @@ class Achat(models.Model):
             # Si le statut change vers Validé ou Reçu
             if old_achat.statut in ['Brouillon', 'Annulé'] and self.statut in ['Validé', 'Reçu']:
                 # Créer une transaction de dépense pour déduire du budget
-                from apps.finances.models import Transaction
-                Transaction.objects.create(
-                    projet=self.projet,
-                    type='Dépense',
-                    categorie='Achat Matériaux',
-                    montant=self.montant_total,
-                    description=f'Achat {self.numero_achat} - {self.fournisseur.nom} - {self.notes or ""}',
-                    date_transaction=self.date_achat,
-                    mode_paiement=self.mode_paiement if self.mode_paiement != 'Crédit' else 'Espèces',
-                    statut='Validée'
-                )
+                self.get_transaction_depense().save()
         
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('inventory:achat_detail', kwargs={'pk': self.pk})
     
+    def get_transaction_depense(self, nom_fournisseur=None):
+        """Construit (sans l'enregistrer) la transaction de dépense qui déduit l'achat du budget"""
+        from apps.finances.models import Transaction
+        return Transaction(
+            projet_id=self.projet_id,
+            type='Dépense',
+            categorie='Achat Matériaux',
+            montant=self.montant_total,
+            description=f'Achat {self.numero_achat} - {nom_fournisseur or self.fournisseur.nom} - {self.notes or ""}',
+            date_transaction=self.date_achat,
+            mode_paiement=self.mode_paiement if self.mode_paiement != 'Crédit' else 'Espèces',
+            statut='Validée'
+        )
+    
+    @classmethod
+    def creer_en_masse(cls, documents, batch_size=1000):
+        """
+        Crée des achats avec leurs lignes par lots (import).
+        `documents` : liste de couples (achat, [lignes]) non enregistrés.
+        Les achats importés au statut Validé ou Reçu génèrent leur transaction de
+        dépense, comme lors de la validation ; les stocks ne sont pas mouvementés.
+        """
+        from apps.finances.models import Fournisseur, Transaction
+        
+        for achat, lignes in documents:
+            for ligne in lignes:
+                ligne.montant_ligne = ligne.quantite * ligne.prix_unitaire
+            achat.montant_total = sum((ligne.montant_ligne for ligne in lignes), Decimal('0'))
+        
+        with transaction.atomic():
+            achats = creer_documents_en_masse(documents, 'numero_achat', 'ACH', 'achat', batch_size)
+            
+            valides = [achat for achat in achats if achat.statut in ['Validé', 'Reçu']]
+            fournisseurs = dict(Fournisseur.objects.filter(
+                pk__in={achat.fournisseur_id for achat in valides}
+            ).values_list('pk', 'nom'))
+            Transaction.creer_en_masse([
+                achat.get_transaction_depense(fournisseurs[achat.fournisseur_id])
+                for achat in valides
+            ], batch_size=batch_size)
+        return achats
+    
+    def recevoir(self, utilisateur):
+        """
+        Réceptionne l'achat en une transaction : entrée en stock de toutes les lignes
+        et recalcul du prix unitaire moyen pondéré des produits.
+        Le nombre de requêtes ne dépend pas du nombre de lignes : stocks manquants
+        insérés en masse, mouvements reportés par MouvementStock.creer_en_masse et prix
+        enregistrés par un bulk_update. Lève ValidationError si l'achat n'est pas au
+        statut Validé.
+        """
+        maintenant = timezone.now()
+        
+        with transaction.atomic():
+            # Le changement de statut conditionnel verrouille l'achat : une seconde
+            # réception concurrente ne trouve plus de ligne à mettre à jour
+            recus = Achat.objects.filter(pk=self.pk, statut='Validé').update(
+                statut='Reçu', date_reception=maintenant.date(), date_modification=maintenant
+            )
+            if not recus:
+                raise ValidationError('Seuls les achats validés peuvent être reçus.')
+            
+            lignes = list(self.lignes.order_by('id').values_list('produit_id', 'quantite', 'prix_unitaire'))
+            produit_ids = sorted({produit_id for produit_id, _, _ in lignes})
+            
+            stocks = dict(Stock.objects.filter(
+                projet_id=self.projet_id, produit_id__in=produit_ids
+            ).values_list('produit_id', 'pk'))
+            manquants = [
+                Stock(projet_id=self.projet_id, produit_id=produit_id, quantite_actuelle=Decimal('0'))
+                for produit_id in produit_ids if produit_id not in stocks
+            ]
+            if manquants:
+                Stock.objects.bulk_create(manquants)
+                completer_cles_primaires(manquants, 'produit_id', filtres={'projet_id': self.projet_id})
+                stocks.update({stock.produit_id: stock.pk for stock in manquants})
+            
+            # Stock total tous projets confondus avant réception, en une agrégation groupée
+            produits = Produit.objects.filter(pk__in=produit_ids).annotate(
+                stock_total=Sum('stocks__quantite_actuelle')
+            )
+            produits = {produit.pk: produit for produit in produits}
+            
+            # Prix moyen pondéré : (valeur en stock + valeur reçue) / quantité totale
+            recu = {}
+            for produit_id, quantite, prix_unitaire in lignes:
+                quantite_recue, valeur_recue = recu.get(produit_id, (Decimal('0'), Decimal('0')))
+                recu[produit_id] = (quantite_recue + quantite, valeur_recue + quantite * prix_unitaire)
+            for produit_id, (quantite_recue, valeur_recue) in recu.items():
+                produit = produits[produit_id]
+                stock_total = produit.stock_total or Decimal('0')
+                total = stock_total + quantite_recue
+                if total > 0:
+                    produit.prix_unitaire_moyen = (
+                        (produit.prix_unitaire_moyen * stock_total + valeur_recue) / total
+                    ).quantize(Decimal('0.01'))
+                produit.date_modification = maintenant
+            
+            # Chaque ligne entre en stock à son prix d'achat (couches de coût)
+            motif = f'Réception achat {self.numero_achat}'
+            mouvements = MouvementStock.creer_en_masse([
+                MouvementStock(
+                    stock_id=stocks[produit_id],
+                    type_mouvement='Entrée',
+                    quantite=quantite,
+                    cout_unitaire=prix_unitaire,
+                    achat=self,
+                    motif=motif,
+                    effectue_par=utilisateur
+                )
+                for produit_id, quantite, prix_unitaire in lignes
+            ])
+            Produit.objects.bulk_update(produits.values(), ['prix_unitaire_moyen', 'date_modification'])
+        
+        self.statut = 'Reçu'
+        self.date_reception = maintenant.date()
+        self.date_modification = maintenant
+        return mouvements
+    
+    @contextmanager
+    def differer_recalcul(self):
+        """
+        Diffère le recalcul du montant total pendant l'enregistrement des lignes :
+        un seul recalcul et un seul enregistrement de l'achat à la sortie du bloc
+        
+            with achat.differer_recalcul():
+                for ligne in lignes:
+                    ligne.save()
+        """
+        jeton = _achats_differes.set(_achats_differes.get() | {self.pk})
+        try:
+            yield self
+        finally:
+            _achats_differes.reset(jeton)
+        self.calculer_montant_total()
+        self.save()
+    
     def calculer_montant_total(self):
         """Calcule le montant total de l'achat"""
         total = self.lignes.aggregate(total=Sum(models.F('quantite') * models.F('prix_unitaire')))['total']
@@ -532,9 +866,10 @@ class LigneAchat(models.Model):
         self.montant_ligne = self.quantite * self.prix_unitaire
         super().save(*args, **kwargs)
         
-        # Mise à jour du montant total de l'achat
-        self.achat.calculer_montant_total()
-        self.achat.save()
+        # Mise à jour du montant total de l'achat (sauf recalcul différé)
+        if self.achat_id not in _achats_differes.get():
+            self.achat.calculer_montant_total()
+            self.achat.save()
 
 
 class MouvementStock(models.Model):
@@ -577,6 +912,21 @@ class MouvementStock(models.Model):
         default=0.00,
         verbose_name='Quantité après'
     )
+    cout_unitaire = models.DecimalField(
+        max_digits=19,
+        decimal_places=4,
+        blank=True,
+        null=True,
+        verbose_name='Coût unitaire',
+        help_text='Coût d\'achat pour une entrée, coût des couches consommées pour une sortie'
+    )
+    cout_total = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Coût total',
+        help_text='Calculé automatiquement'
+    )
     date_mouvement = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Date du mouvement'
@@ -598,6 +948,13 @@ class MouvementStock(models.Model):
         verbose_name='Projet destination',
         help_text='Pour les transferts'
     )
+    numero_transfert = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        verbose_name='N° de transfert',
+        help_text='Commun à la sortie et à l\'entrée d\'un même transfert'
+    )
     motif = models.TextField(
         blank=True,
         null=True,
@@ -621,35 +978,465 @@ class MouvementStock(models.Model):
         indexes = [
             models.Index(fields=['stock']),
             models.Index(fields=['type_mouvement']),
-            models.Index(fields=['date_mouvement']),
+            models.Index(fields=['date_mouvement', 'id']),
+            models.Index(fields=['numero_transfert']),
         ]
     
     def __str__(self):
         return f"{self.type_mouvement} - {self.quantite} {self.stock.produit.unite_mesure.symbole} - {self.stock.produit.nom}"
     
     def save(self, *args, **kwargs):
-        # Enregistrer la quantité avant
-        self.quantite_avant = self.stock.quantite_actuelle
+        # Un nouveau mouvement est reporté sur le stock verrouillé dans la même
+        # transaction que son enregistrement ; une modification ne le reporte pas
+        if self.pk is not None:
+            return super().save(*args, **kwargs)
         
-        # Mettre à jour le stock selon le type de mouvement
-        if self.type_mouvement == 'Entrée':
-            self.stock.quantite_actuelle += self.quantite
-            self.stock.date_derniere_entree = self.date_mouvement
-        elif self.type_mouvement == 'Sortie':
-            self.stock.quantite_actuelle -= self.quantite
-            self.stock.date_derniere_sortie = self.date_mouvement
-        elif self.type_mouvement == 'Ajustement':
-            # Pour l'ajustement, la quantité peut être positive ou négative
-            self.stock.quantite_actuelle = self.quantite
-        elif self.type_mouvement == 'Transfert':
-            self.stock.quantite_actuelle -= self.quantite
-            self.stock.date_derniere_sortie = self.date_mouvement
+        with transaction.atomic():
+            Stock.appliquer_mouvements([self])
+            super().save(*args, **kwargs)
+    
+    @classmethod
+    def creer_en_masse(cls, mouvements, batch_size=1000):
+        """
+        Reporte et enregistre des mouvements en une transaction (bon de sortie, réception) :
+        tout ou rien, en un nombre de requêtes indépendant du nombre de lignes
+        """
+        with transaction.atomic():
+            Stock.appliquer_mouvements(mouvements)
+            return cls.objects.bulk_create(mouvements, batch_size=batch_size)
+    
+    @classmethod
+    def transferer(cls, projet_source, projet_destination, lignes, utilisateur, motif=None, batch_size=1000):
+        """
+        Transfère des produits d'un projet à un autre en une seule transaction.
+        `lignes` : liste de couples (produit, quantité) ; un bon de transfert peut
+        porter plusieurs produits. Chaque ligne produit deux mouvements liés par le
+        même numéro de transfert : une sortie (Transfert) du stock source et une entrée
+        au même coût dans le stock destination, créé au besoin.
+        Tous les stocks concernés sont verrouillés d'emblée, par ordre de clé
+        primaire : deux transferts croisés ne peuvent pas s'interbloquer.
+        Lève StockInsuffisant (rien n'est enregistré) si une quantité n'est pas
+        disponible. Retourne le numéro de transfert.
+        """
+        from apps.projects.models import Projet
         
-        # Enregistrer la quantité après
-        self.quantite_apres = self.stock.quantite_actuelle
+        source_id = getattr(projet_source, 'pk', projet_source)
+        destination_id = getattr(projet_destination, 'pk', projet_destination)
+        if source_id == destination_id:
+            raise ValidationError('Le projet de destination doit être différent du projet source.')
+        lignes = [(getattr(produit, 'pk', produit), Decimal(str(quantite))) for produit, quantite in lignes]
+        produit_ids = sorted({produit_id for produit_id, _ in lignes})
         
-        # Recalculer la valeur du stock
-        self.stock.calculer_valeur_stock()
-        self.stock.save()
+        with transaction.atomic():
+            concernes = Stock.objects.filter(projet_id__in=[source_id, destination_id], produit_id__in=produit_ids)
+            Stock.verrouiller(concernes)
+            stocks = {
+                (projet_id, produit_id): pk
+                for projet_id, produit_id, pk in concernes.values_list('projet_id', 'produit_id', 'pk')
+            }
+            absents = [produit_id for produit_id in produit_ids if (source_id, produit_id) not in stocks]
+            if absents:
+                noms = ', '.join(Produit.objects.filter(pk__in=absents).values_list('nom', flat=True))
+                raise StockInsuffisant(f'Aucun stock du projet source pour : {noms}.')
+            manquants = [
+                Stock(projet_id=destination_id, produit_id=produit_id, quantite_actuelle=Decimal('0'))
+                for produit_id in produit_ids if (destination_id, produit_id) not in stocks
+            ]
+            if manquants:
+                Stock.objects.bulk_create(manquants)
+                completer_cles_primaires(manquants, 'produit_id', filtres={'projet_id': destination_id})
+                stocks.update({(destination_id, stock.produit_id): stock.pk for stock in manquants})
+            
+            numero = SequenceNumerotation.prochain_code('TRF')
+            codes = dict(Projet.objects.filter(
+                pk__in=[source_id, destination_id]
+            ).values_list('pk', 'code_projet'))
+            
+            sorties = [
+                cls(
+                    stock_id=stocks[(source_id, produit_id)],
+                    type_mouvement='Transfert',
+                    quantite=quantite,
+                    projet_destination_id=destination_id,
+                    numero_transfert=numero,
+                    motif=motif or f'Transfert vers {codes[destination_id]}',
+                    effectue_par=utilisateur
+                )
+                for produit_id, quantite in lignes
+            ]
+            Stock.appliquer_mouvements(sorties)
+            # Chaque entrée reprend le coût des couches consommées par sa sortie
+            entrees = [
+                cls(
+                    stock_id=stocks[(destination_id, produit_id)],
+                    type_mouvement='Entrée',
+                    quantite=quantite,
+                    cout_unitaire=sortie.cout_unitaire,
+                    numero_transfert=numero,
+                    motif=motif or f'Transfert depuis {codes[source_id]}',
+                    effectue_par=utilisateur
+                )
+                for (produit_id, quantite), sortie in zip(lignes, sorties)
+            ]
+            Stock.appliquer_mouvements(entrees)
+            cls.objects.bulk_create(sorties + entrees, batch_size=batch_size)
+        return numero
+
+
+class CoucheCout(models.Model):
+    """
+    Couche de coût d'un stock : quantité entrée à un coût unitaire, consommée par les
+    sorties. En FIFO, chaque entrée crée une couche et les sorties consomment les plus
+    anciennes ; en coût moyen pondéré (CMP), le stock n'a qu'une couche dont le coût
+    est la moyenne pondérée des entrées.
+    """
+    stock = models.ForeignKey(
+        Stock,
+        on_delete=models.CASCADE,
+        related_name='couches_cout',
+        verbose_name='Stock'
+    )
+    date_entree = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Date d\'entrée'
+    )
+    quantite_initiale = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Quantité initiale'
+    )
+    quantite_restante = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Quantité restante'
+    )
+    cout_unitaire = models.DecimalField(
+        max_digits=19,
+        decimal_places=4,
+        verbose_name='Coût unitaire'
+    )
+    
+    class Meta:
+        verbose_name = 'Couche de coût'
+        verbose_name_plural = 'Couches de coût'
+        ordering = ['date_entree', 'id']
+        indexes = [
+            models.Index(fields=['stock', 'quantite_restante']),
+        ]
+    
+    def __str__(self):
+        return f"{self.stock_id} - {self.quantite_restante}/{self.quantite_initiale} à {self.cout_unitaire}"
+    
+    @staticmethod
+    def cout_moyen(couches, hors_couches, prix_defaut):
+        """Coût unitaire moyen des couches et de la quantité hors couches (prix_defaut si vide)"""
+        quantite = hors_couches + sum(couche.quantite_restante for couche in couches)
+        if quantite <= 0:
+            return prix_defaut
+        valeur = hors_couches * prix_defaut + sum(
+            couche.quantite_restante * couche.cout_unitaire for couche in couches
+        )
+        return valeur / quantite
+    
+    @classmethod
+    def entrer(cls, methode, couches, stock_id, quantite, cout_unitaire, date_entree):
+        """
+        Ajoute une entrée aux couches (liste en mémoire, enregistrée par l'appelant) :
+        nouvelle couche en FIFO, fusion dans la couche unique en CMP. Retourne le coût.
+        """
+        if methode == 'CMP' and couches:
+            couche = couches[0]
+            total = couche.quantite_restante + quantite
+            couche.cout_unitaire = (
+                (couche.quantite_restante * couche.cout_unitaire + quantite * cout_unitaire) / total
+            ).quantize(Decimal('0.0001'))
+            couche.quantite_initiale += quantite
+            couche.quantite_restante = total
+        else:
+            couches.append(cls(
+                stock_id=stock_id,
+                date_entree=date_entree,
+                quantite_initiale=quantite,
+                quantite_restante=quantite,
+                cout_unitaire=Decimal(cout_unitaire).quantize(Decimal('0.0001'))
+            ))
+        return quantite * cout_unitaire
+    
+    @staticmethod
+    def sortir(couches, quantite):
+        """
+        Consomme `quantite` sur les couches, les plus anciennes d'abord (couches triées
+        par date d'entrée ; une seule couche en CMP). Retourne le coût consommé.
+        """
+        cout = Decimal('0')
+        for couche in couches:
+            if quantite <= 0:
+                break
+            consommee = min(couche.quantite_restante, quantite)
+            couche.quantite_restante -= consommee
+            cout += consommee * couche.cout_unitaire
+            quantite -= consommee
+        return cout
+
+
+def _debut_jour(jour):
+    """Début (datetime du fuseau courant) du jour `jour`"""
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+class InstantaneStock(models.Model):
+    """
+    Quantité et valeur de chaque stock (projet, produit) à la fin d'une journée.
+    Les instantanés sont construits périodiquement (fin de jour ou de mois) ;
+    la situation à une date quelconque part de l'instantané le plus proche et
+    n'applique que les mouvements postérieurs (voir positions_au).
+    """
+    PERIODICITE_CHOICES = [
+        ('jour', 'Quotidienne'),
+        ('mois', 'Mensuelle'),
+    ]
+    
+    date = models.DateField(
+        verbose_name='Date'
+    )
+    projet = models.ForeignKey(
+        'projects.Projet',
+        on_delete=models.CASCADE,
+        related_name='instantanes_stock',
+        verbose_name='Projet'
+    )
+    produit = models.ForeignKey(
+        Produit,
+        on_delete=models.CASCADE,
+        related_name='instantanes_stock',
+        verbose_name='Produit'
+    )
+    quantite = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Quantité'
+    )
+    prix_unitaire = models.DecimalField(
+        max_digits=19,
+        decimal_places=4,
+        default=0.00,
+        verbose_name='Prix unitaire',
+        help_text='Coût unitaire moyen des couches de coût du stock (valeur / quantité)'
+    )
+    valeur = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Valeur'
+    )
+    
+    class Meta:
+        verbose_name = 'Instantané de stock'
+        verbose_name_plural = 'Instantanés de stock'
+        ordering = ['-date']
+        unique_together = ['date', 'projet', 'produit']
+    
+    def __str__(self):
+        return f"{self.date} - {self.produit_id}/{self.projet_id} : {self.quantite}"
+    
+    @staticmethod
+    def _ecarts(mouvements):
+        """
+        Variation de quantité et de valeur par stock des mouvements donnés, en une
+        requête groupée : {stock_id: (ecart, valeur)}. Chaque mouvement compte pour son
+        coût total (en plus pour une hausse, en moins pour une baisse) ; les mouvements
+        antérieurs aux couches de coût, sans coût unitaire, au prix moyen du produit.
+        """
+        ecart = F('quantite_apres') - F('quantite_avant')
+        valeur = Case(
+            When(cout_unitaire__isnull=True, then=ecart * F('stock__produit__prix_unitaire_moyen')),
+            When(quantite_apres__lt=F('quantite_avant'), then=-F('cout_total')),
+            default=F('cout_total'),
+            output_field=DecimalField(max_digits=19, decimal_places=4)
+        )
+        return {
+            stock_id: (ecart, valeur)
+            for stock_id, ecart, valeur in mouvements.values('stock_id').annotate(
+                ecart=Sum(ecart), valeur=Sum(valeur)
+            ).values_list('stock_id', 'ecart', 'valeur').order_by()
+        }
+    
+    @classmethod
+    def positions_au(cls, date_reference, projet=None):
+        """
+        Situation des stocks à la fin du jour `date_reference` : liste de dictionnaires
+        {projet_id, produit_id, quantite, prix_unitaire, valeur}, stocks nuls exclus.
         
-        super().save(*args, **kwargs)
+        Part de l'instantané le plus récent à cette date et ajoute les mouvements
+        postérieurs ; les stocks créés depuis cet instantané (ou tous, s'il n'y en a
+        pas) sont reconstitués à rebours depuis leur quantité et leur valeur actuelles.
+        Les mouvements sont valorisés à leur coût total (voir _ecarts) ; le prix
+        unitaire est le coût moyen des couches, valeur / quantité.
+        """
+        fin = _debut_jour(date_reference + timedelta(days=1))
+        instantanes = cls.objects.all()
+        stocks = Stock.objects.filter(date_creation__lt=fin)
+        if projet is not None:
+            instantanes = instantanes.filter(projet=projet)
+            stocks = stocks.filter(projet=projet)
+        date_instantane = cls.objects.filter(date__lte=date_reference).aggregate(
+            derniere=models.Max('date')
+        )['derniere']
+        
+        base = {}
+        if date_instantane:
+            debut = _debut_jour(date_instantane + timedelta(days=1))
+            base = {
+                (ligne['projet_id'], ligne['produit_id']): ligne
+                for ligne in instantanes.filter(date=date_instantane).values(
+                    'projet_id', 'produit_id', 'quantite', 'valeur'
+                ).order_by()
+            }
+        
+        stocks = list(stocks.values(
+            'pk', 'projet_id', 'produit_id', 'quantite_actuelle', 'valeur_stock', 'date_creation'
+        ).order_by('projet_id', 'produit_id'))
+        recents = [stock['pk'] for stock in stocks if not date_instantane or stock['date_creation'] >= debut]
+        # En avant depuis l'instantané pour les stocks qu'il couvre : filtrer sur la
+        # seule période laisse l'index (date_mouvement, id) borner la lecture...
+        ecarts = {}
+        if date_instantane and len(recents) < len(stocks):
+            mouvements = MouvementStock.objects.filter(date_mouvement__gte=debut, date_mouvement__lt=fin)
+            if projet is not None:
+                mouvements = mouvements.filter(stock__projet=projet)
+            ecarts = cls._ecarts(mouvements)
+        # ... à rebours depuis la quantité et la valeur actuelles pour les stocks plus récents
+        ecarts_posterieurs = {}
+        if recents:
+            ecarts_posterieurs = cls._ecarts(
+                MouvementStock.objects.filter(stock_id__in=recents, date_mouvement__gte=fin)
+            )
+        recents = set(recents)
+        
+        positions = []
+        for stock in stocks:
+            cle = (stock['projet_id'], stock['produit_id'])
+            if stock['pk'] in recents:
+                ecart, valeur = ecarts_posterieurs.get(stock['pk'], (0, 0))
+                quantite = stock['quantite_actuelle'] - ecart
+                valeur = stock['valeur_stock'] - valeur
+            else:
+                quantite, valeur = ecarts.get(stock['pk'], (0, 0))
+                ligne = base.get(cle)
+                if ligne:
+                    quantite += ligne['quantite']
+                    valeur += ligne['valeur']
+            if quantite:
+                valeur = Decimal(valeur).quantize(Decimal('0.01'))
+                positions.append({
+                    'projet_id': cle[0],
+                    'produit_id': cle[1],
+                    'quantite': quantite,
+                    'prix_unitaire': (valeur / quantite).quantize(Decimal('0.0001')),
+                    'valeur': valeur,
+                })
+        return positions
+    
+    @classmethod
+    def dates_a_construire(cls, date_fin, periodicite='mois'):
+        """
+        Fins de période (jour ou mois) postérieures au dernier instantané et au plus
+        tard à `date_fin` ; la première est celle du premier mouvement s'il n'existe
+        aucun instantané
+        """
+        derniere = cls.objects.aggregate(derniere=models.Max('date'))['derniere']
+        if derniere:
+            jour = derniere + timedelta(days=1)
+        else:
+            premier = MouvementStock.objects.aggregate(premier=models.Min('date_mouvement'))['premier']
+            if premier is None:
+                return []
+            jour = timezone.localtime(premier).date()
+        
+        dates = []
+        while True:
+            if periodicite == 'mois':
+                mois_suivant = (jour.replace(day=28) + timedelta(days=4)).replace(day=1)
+                jour = mois_suivant - timedelta(days=1)
+            if jour > date_fin:
+                return dates
+            dates.append(jour)
+            jour += timedelta(days=1)
+    
+    @classmethod
+    def construire(cls, date_fin=None, periodicite='mois'):
+        """
+        Construit les instantanés manquants jusqu'à `date_fin` (hier par défaut ;
+        jamais aujourd'hui, la journée n'étant pas close). Chaque instantané part du
+        précédent : seuls les mouvements de la période sont lus.
+        Retourne la liste des dates construites.
+        """
+        hier = timezone.localdate() - timedelta(days=1)
+        date_fin = min(date_fin or hier, hier)
+        dates = cls.dates_a_construire(date_fin, periodicite)
+        for jour in dates:
+            with transaction.atomic():
+                cls.objects.bulk_create([
+                    cls(
+                        date=jour,
+                        projet_id=position['projet_id'],
+                        produit_id=position['produit_id'],
+                        quantite=position['quantite'],
+                        prix_unitaire=position['prix_unitaire'],
+                        valeur=position['valeur'],
+                    )
+                    for position in cls.positions_au(jour)
+                ], batch_size=1000)
+        return dates
+
+
+class SuggestionReapprovisionnement(models.Model):
+    """
+    Point de commande et quantité à commander suggérés pour un stock, calculés par
+    la commande forecast_reorder_points à partir de la consommation lissée du stock
+    et des délais de livraison des achats (voir PrevisionReapprovisionnement)
+    """
+    stock = models.OneToOneField(
+        Stock,
+        on_delete=models.CASCADE,
+        related_name='suggestion_reapprovisionnement',
+        verbose_name='Stock'
+    )
+    consommation_journaliere = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        verbose_name='Consommation journalière',
+        help_text='Moyenne lissée exponentiellement des sorties par jour'
+    )
+    delai_livraison = models.DecimalField(
+        max_digits=6,
+        decimal_places=1,
+        verbose_name='Délai de livraison (jours)'
+    )
+    stock_securite = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Stock de sécurité'
+    )
+    point_commande = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Point de commande'
+    )
+    quantite_suggeree = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Quantité suggérée'
+    )
+    date_calcul = models.DateTimeField(
+        verbose_name='Date du calcul'
+    )
+    
+    class Meta:
+        verbose_name = 'Suggestion de réapprovisionnement'
+        verbose_name_plural = 'Suggestions de réapprovisionnement'
+        ordering = ['stock']
+    
+    def __str__(self):
+        return f"{self.stock_id} - point {self.point_commande}, commander {self.quantite_suggeree}"
@@ -0,0 +1,196 @@
+"""
+Valorisation des stocks à une date donnée et prévision des réapprovisionnements
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Avg, F, Sum, Value
+from django.utils import timezone
+
+from apps.core.utils.requetes import DateReferenceMixin
+from apps.core.utils.sql import JoursEntre
+from apps.projects.models import Projet
+
+from .models import (
+    InstantaneStock, LigneAchat, MouvementStock, Produit, Stock, SuggestionReapprovisionnement, _debut_jour
+)
+
+
+class ValorisationStock(DateReferenceMixin):
+    """
+    Valorisation des stocks à la fin d'une journée, par projet et par catégorie de
+    produit, calculée à partir de l'instantané de stock le plus proche
+    """
+
+    def __init__(self, date_reference=None):
+        self.date_reference = date_reference or date.today()
+        positions = InstantaneStock.positions_au(self.date_reference)
+
+        projets = dict(Projet.objects.filter(
+            pk__in={position['projet_id'] for position in positions}
+        ).values_list('pk', 'nom_projet'))
+        categories = dict(Produit.objects.filter(
+            pk__in={position['produit_id'] for position in positions}
+        ).values_list('pk', 'categorie__nom'))
+
+        groupes = {}
+        for position in positions:
+            cle = (projets[position['projet_id']], position['projet_id'], categories[position['produit_id']])
+            nombre, valeur = groupes.get(cle, (0, 0))
+            groupes[cle] = (nombre + 1, valeur + position['valeur'])
+
+        self.lignes = [
+            {
+                'projet_id': projet_id,
+                'projet': nom_projet,
+                'categorie': categorie,
+                'nombre_produits': nombre,
+                'valeur': valeur,
+            }
+            for (nom_projet, projet_id, categorie), (nombre, valeur) in sorted(groupes.items())
+        ]
+        self.total = sum(ligne['valeur'] for ligne in self.lignes)
+
+    def get_context(self):
+        """Contexte de template de la valorisation, lignes regroupées par projet"""
+        projets = []
+        for ligne in self.lignes:
+            if not projets or projets[-1]['projet_id'] != ligne['projet_id']:
+                projets.append({'projet_id': ligne['projet_id'], 'projet': ligne['projet'], 'categories': [], 'valeur': 0})
+            projets[-1]['categories'].append(ligne)
+            projets[-1]['valeur'] += ligne['valeur']
+        return {
+            'date_reference': self.date_reference,
+            'projets': projets,
+            'total': self.total,
+        }
+
+
+class PrevisionReapprovisionnement:
+    """
+    Point de commande et quantité à commander de chaque stock consommé, calculés
+    d'un bloc avec NumPy sur tous les couples (projet, produit).
+
+    - Consommation journalière : moyenne des sorties par jour sur les `fenetre`
+      jours complets précédant `date_fin`, lissée exponentiellement (portée de
+      `portee` jours, les jours sans sortie comptant pour zéro).
+    - Délai de livraison : délai moyen date_achat → date_reception des achats reçus
+      depuis `fenetre_delais` jours, pour le produit et le projet, à défaut pour le
+      produit, à défaut pour tous les achats, à défaut `delai_defaut` jours.
+    - Point de commande : consommation × délai + stock de sécurité, ce dernier valant
+      facteur_securite × écart type journalier × √délai.
+    - Quantité suggérée : de quoi revenir au point de commande et couvrir
+      `couverture` jours de consommation, stock actuel déduit.
+
+    Les sorties sont regroupées par stock et par jour en SQL ; seul ce regroupement
+    est transféré vers NumPy.
+    """
+
+    def __init__(self, date_fin=None, fenetre=90, portee=14, fenetre_delais=365,
+                 couverture=30, facteur_securite=1.65, delai_defaut=7):
+        self.date_fin = date_fin or date.today()
+        self.fenetre = fenetre
+        self.portee = portee
+        self.fenetre_delais = fenetre_delais
+        self.couverture = couverture
+        self.facteur_securite = facteur_securite
+        self.delai_defaut = delai_defaut
+
+    def sorties_par_jour(self):
+        """Sorties regroupées par stock et par jour : tableaux (stock_ids, jours, quantites)"""
+        debut = _debut_jour(self.date_fin - timedelta(days=self.fenetre))
+        lignes = MouvementStock.objects.filter(
+            type_mouvement='Sortie',
+            date_mouvement__gte=debut,
+            date_mouvement__lt=_debut_jour(self.date_fin),
+        ).annotate(
+            jour=JoursEntre(F('date_mouvement'), Value(debut))
+        ).values('stock_id', 'jour').annotate(
+            total=Sum('quantite')
+        ).values_list('stock_id', 'jour', 'total').order_by()
+
+        donnees = np.array(list(lignes), dtype=float).reshape(-1, 3)
+        jours = np.clip(donnees[:, 1].astype(np.int64), 0, self.fenetre - 1)
+        return donnees[:, 0].astype(np.int64), jours, donnees[:, 2]
+
+    def delais_livraison(self):
+        """Délais moyens en jours : (par (projet, produit), par produit, tous achats)"""
+        recus = LigneAchat.objects.filter(
+            achat__statut='Reçu',
+            achat__date_reception__gte=self.date_fin - timedelta(days=self.fenetre_delais),
+        ).annotate(delai=JoursEntre(F('achat__date_reception'), F('achat__date_achat')))
+
+        par_couple = {
+            (ligne['achat__projet_id'], ligne['produit_id']): ligne['moyenne']
+            for ligne in recus.values('achat__projet_id', 'produit_id').annotate(moyenne=Avg('delai')).order_by()
+        }
+        par_produit = dict(
+            recus.values('produit_id').annotate(moyenne=Avg('delai')).values_list('produit_id', 'moyenne').order_by()
+        )
+        moyenne = recus.aggregate(moyenne=Avg('delai'))['moyenne']
+        return par_couple, par_produit, self.delai_defaut if moyenne is None else moyenne
+
+    def calculer(self):
+        """Suggestions non enregistrées, une par stock ayant eu des sorties dans la fenêtre"""
+        stock_ids, jours, quantites = self.sorties_par_jour()
+        if not len(stock_ids):
+            return []
+        ids, index = np.unique(stock_ids, return_inverse=True)
+
+        # Poids du lissage exponentiel : 1 pour le dernier jour, (1 - alpha)^n n jours plus tôt
+        alpha = 2 / (self.portee + 1)
+        poids = (1 - alpha) ** np.arange(self.fenetre - 1, -1, -1)
+        poids_sorties = poids[jours]
+        consommation = np.bincount(index, weights=poids_sorties * quantites, minlength=len(ids)) / poids.sum()
+        moment = np.bincount(index, weights=poids_sorties * quantites ** 2, minlength=len(ids)) / poids.sum()
+        ecart_type = np.sqrt(np.maximum(moment - consommation ** 2, 0))
+
+        stocks = np.array(list(
+            Stock.objects.order_by('pk').values_list('pk', 'projet_id', 'produit_id', 'quantite_actuelle')
+        ), dtype=float).reshape(-1, 4)
+        positions = np.searchsorted(stocks[:, 0], ids)
+        # Mouvements de stocks supprimés depuis le regroupement
+        existants = (positions < len(stocks)) & (stocks[np.minimum(positions, len(stocks) - 1), 0] == ids)
+        ids, positions = ids[existants], positions[existants]
+        consommation, ecart_type = consommation[existants], ecart_type[existants]
+        projets = stocks[positions, 1].astype(np.int64)
+        produits = stocks[positions, 2].astype(np.int64)
+
+        par_couple, par_produit, delai_global = self.delais_livraison()
+        delai = np.maximum(np.array([
+            par_couple.get((projet, produit), par_produit.get(produit, delai_global))
+            for projet, produit in zip(projets.tolist(), produits.tolist())
+        ], dtype=float), 0)
+
+        stock_securite = self.facteur_securite * ecart_type * np.sqrt(delai)
+        point_commande = consommation * delai + stock_securite
+        quantite_suggeree = np.maximum(
+            point_commande + consommation * self.couverture - stocks[positions, 3], 0
+        )
+
+        maintenant = timezone.now()
+        return [
+            SuggestionReapprovisionnement(
+                stock_id=stock_id,
+                consommation_journaliere=Decimal(f'{consommation_stock:.4f}'),
+                delai_livraison=Decimal(f'{delai_stock:.1f}'),
+                stock_securite=Decimal(f'{securite:.2f}'),
+                point_commande=Decimal(f'{point:.2f}'),
+                quantite_suggeree=Decimal(f'{quantite:.2f}'),
+                date_calcul=maintenant,
+            )
+            for stock_id, consommation_stock, delai_stock, securite, point, quantite in zip(
+                ids.tolist(), consommation.tolist(), delai.tolist(), stock_securite.tolist(),
+                point_commande.tolist(), quantite_suggeree.tolist()
+            )
+        ]
+
+    def enregistrer(self, batch_size=1000):
+        """Remplace les suggestions enregistrées par celles du calcul ; retourne leur nombre"""
+        suggestions = self.calculer()
+        with transaction.atomic():
+            SuggestionReapprovisionnement.objects.all().delete()
+            SuggestionReapprovisionnement.objects.bulk_create(suggestions, batch_size=batch_size)
+        return len(suggestions)
@@ -1,13 +1,27 @@
-from django.test import TestCase, Client
+import threading
+import time
+from io import StringIO
+
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
+from django.db import connection, connections
+from django.db.models import Max, Sum
+from django.test.utils import CaptureQueriesContext
 from decimal import Decimal
-from datetime import date
+from datetime import date, datetime, timedelta
 
 from .models import (
     UniteMessure, CategorieProduit, Produit, Stock,
-    Achat, LigneAchat, MouvementStock
+    Achat, LigneAchat, MouvementStock, StockInsuffisant, InstantaneStock, CoucheCout,
+    SuggestionReapprovisionnement
 )
+from .services import PrevisionReapprovisionnement
 from apps.projects.models import Projet
 from apps.finances.models import Fournisseur
 from apps.clients.models import Client as ClientModel
@@ -311,3 +325,1231 @@ class MouvementStockTest(TestCase):
         
         self.stock.refresh_from_db()
         self.assertEqual(self.stock.quantite_actuelle, quantite_avant - Decimal('5.00'))
+
+
+class AchatCreationEnMasseTest(TestCase):
+    """Tests pour la création en masse d'achats"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        client = ClientModel.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        self.projet = Projet.objects.create(
+            nom_projet='Projet Test',
+            client=client,
+            montant_prevu=Decimal('1000000.00')
+        )
+        self.fournisseur = Fournisseur.objects.create(
+            nom='Fournisseur Test',
+            telephone='987654321'
+        )
+        unite = UniteMessure.objects.create(nom='Sac', symbole='sac')
+        categorie = CategorieProduit.objects.create(nom='Ciment', code='CIM')
+        self.produit = Produit.objects.create(
+            nom='Ciment CPJ 42.5',
+            categorie=categorie,
+            unite_mesure=unite
+        )
+    
+    def nouvel_achat(self, statut):
+        return Achat(
+            projet=self.projet,
+            fournisseur=self.fournisseur,
+            date_achat=date.today(),
+            mode_paiement='Crédit',
+            statut=statut,
+            notes='Import',
+            saisi_par=self.user
+        )
+    
+    def nouvelles_lignes(self):
+        return [
+            LigneAchat(produit=self.produit, quantite=Decimal('10.00'), prix_unitaire=Decimal('85000.00')),
+            LigneAchat(produit=self.produit, quantite=Decimal('2.50'), prix_unitaire=Decimal('1000.00')),
+        ]
+    
+    def test_identique_au_chemin_unitaire(self):
+        """Test : Montants et transaction de dépense identiques à la saisie puis validation"""
+        from apps.finances.models import Transaction
+        
+        reference = self.nouvel_achat('Brouillon')
+        reference.save()
+        for ligne in self.nouvelles_lignes():
+            ligne.achat = reference
+            ligne.save()
+        reference.statut = 'Validé'
+        reference.save()
+        transaction_reference = Transaction.objects.get()
+        
+        valide, brouillon = Achat.creer_en_masse([
+            (self.nouvel_achat('Validé'), self.nouvelles_lignes()),
+            (self.nouvel_achat('Brouillon'), self.nouvelles_lignes()),
+        ])
+        valide.refresh_from_db()
+        self.assertEqual(valide.montant_total, reference.montant_total)
+        self.assertEqual(
+            sorted(valide.lignes.values_list('montant_ligne', flat=True)),
+            sorted(reference.lignes.values_list('montant_ligne', flat=True))
+        )
+        
+        # Une seule transaction supplémentaire, pour l'achat validé
+        self.assertEqual(Transaction.objects.count(), 2)
+        transaction_import = Transaction.objects.exclude(pk=transaction_reference.pk).get()
+        for champ in ['type', 'categorie', 'montant', 'mode_paiement', 'statut', 'date_transaction']:
+            self.assertEqual(getattr(transaction_import, champ), getattr(transaction_reference, champ))
+        self.assertEqual(
+            transaction_import.description,
+            transaction_reference.description.replace(reference.numero_achat, valide.numero_achat)
+        )
+        
+        # Solde du projet tenu à jour par l'insertion groupée
+        self.projet.refresh_from_db()
+        self.assertEqual(self.projet.get_total_depenses(), reference.montant_total * 2)
+
+
+class AchatRecalculDiffereTest(TestCase):
+    """Tests pour le recalcul différé du montant d'un achat"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        client = ClientModel.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        projet = Projet.objects.create(
+            nom_projet='Projet Test',
+            client=client,
+            montant_prevu=Decimal('1000000.00')
+        )
+        fournisseur = Fournisseur.objects.create(
+            nom='Fournisseur Test',
+            telephone='987654321'
+        )
+        unite = UniteMessure.objects.create(nom='Sac', symbole='sac')
+        categorie = CategorieProduit.objects.create(nom='Ciment', code='CIM')
+        self.produit = Produit.objects.create(
+            nom='Ciment CPJ 42.5',
+            categorie=categorie,
+            unite_mesure=unite
+        )
+        self.achat = Achat.objects.create(
+            projet=projet,
+            fournisseur=fournisseur,
+            date_achat=date.today(),
+            mode_paiement='Espèces',
+            saisi_par=self.user
+        )
+    
+    def enregistrer_lignes(self, nombre):
+        for i in range(nombre):
+            LigneAchat(
+                achat=self.achat,
+                produit=self.produit,
+                quantite=Decimal('2.00'),
+                prix_unitaire=Decimal(1000 * (i + 1))
+            ).save()
+    
+    def test_un_seul_recalcul(self):
+        """Test : Le nombre de requêtes ne dépend plus que du nombre de lignes"""
+        with CaptureQueriesContext(connection) as requetes:
+            with self.achat.differer_recalcul():
+                self.enregistrer_lignes(50)
+        
+        sql = [requete['sql'] for requete in requetes.captured_queries]
+        self.assertEqual(len([requete for requete in sql if requete.startswith('UPDATE "inventory_achat"')]), 1)
+        self.assertEqual(len([requete for requete in sql if 'SUM(' in requete]), 1)
+        
+        self.achat.refresh_from_db()
+        self.assertEqual(self.achat.montant_total, Decimal(2 * 1000 * 50 * 51 // 2))
+    
+    def test_total_identique_sans_differer(self):
+        """Test : Même montant total que l'enregistrement ligne par ligne"""
+        self.enregistrer_lignes(5)
+        self.achat.refresh_from_db()
+        self.assertEqual(self.achat.montant_total, Decimal('30000.00'))
+    
+    def test_exception_annule_le_recalcul(self):
+        """Test : Une erreur dans le bloc n'enregistre pas l'achat et rétablit le recalcul"""
+        with self.assertRaises(ValueError):
+            with self.achat.differer_recalcul():
+                self.enregistrer_lignes(2)
+                raise ValueError
+        self.achat.refresh_from_db()
+        self.assertEqual(self.achat.montant_total, Decimal('0'))
+        
+        self.enregistrer_lignes(1)
+        self.achat.refresh_from_db()
+        self.assertEqual(self.achat.montant_total, Decimal('8000.00'))
+
+
+def creer_stock_test(quantite='0', prix_unitaire='50000.00'):
+    """Crée un utilisateur et un stock de test ; retourne (utilisateur, stock)"""
+    user = User.objects.create_user(username='testuser', password='testpass123')
+    client = ClientModel.objects.create(nom_complet='Client Test', telephone='622000000')
+    projet = Projet.objects.create(
+        nom_projet='Projet Test',
+        client=client,
+        montant_prevu=Decimal('1000000.00')
+    )
+    unite = UniteMessure.objects.create(nom='Sac', symbole='sac')
+    categorie = CategorieProduit.objects.create(nom='Ciment', code='CIM')
+    produit = Produit.objects.create(
+        nom='Ciment CPJ 42.5',
+        categorie=categorie,
+        unite_mesure=unite,
+        prix_unitaire_moyen=Decimal(prix_unitaire)
+    )
+    stock = Stock.objects.create(projet=projet, produit=produit, quantite_actuelle=Decimal(quantite))
+    return user, stock
+
+
+class ComptabilisationStockTest(TestCase):
+    """Tests pour le report verrouillé des mouvements sur le stock"""
+    
+    def setUp(self):
+        self.user, self.stock = creer_stock_test(quantite='20.00')
+    
+    def mouvement(self, type_mouvement, quantite, stock=None):
+        return MouvementStock.objects.create(
+            stock=stock or self.stock,
+            type_mouvement=type_mouvement,
+            quantite=Decimal(quantite),
+            effectue_par=self.user
+        )
+    
+    def test_quantites_avant_apres(self):
+        """Test : Les quantités avant/après sont lues sur le stock en base, pas sur l'instance"""
+        perime = Stock.objects.get(pk=self.stock.pk)
+        self.mouvement('Entrée', '5.00')
+        
+        mouvement = self.mouvement('Sortie', '3.00', stock=perime)
+        
+        self.assertEqual(mouvement.quantite_avant, Decimal('25.00'))
+        self.assertEqual(mouvement.quantite_apres, Decimal('22.00'))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('22.00'))
+        self.assertEqual(self.stock.valeur_stock, Decimal('1100000.00'))
+        self.assertIsNotNone(self.stock.date_derniere_sortie)
+    
+    def test_ajustement(self):
+        """Test : Un ajustement fixe la quantité inventoriée"""
+        mouvement = self.mouvement('Ajustement', '12.00')
+        
+        self.assertEqual(mouvement.quantite_avant, Decimal('20.00'))
+        self.assertEqual(mouvement.quantite_apres, Decimal('12.00'))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('12.00'))
+    
+    def test_stock_negatif_refuse(self):
+        """Test : Une sortie supérieure au stock est refusée sans rien enregistrer"""
+        with self.assertRaises(StockInsuffisant):
+            self.mouvement('Sortie', '20.01')
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('20.00'))
+        self.assertFalse(MouvementStock.objects.exists())
+    
+    def test_modification_sans_report(self):
+        """Test : Modifier le motif d'un mouvement ne le reporte pas une seconde fois"""
+        mouvement = self.mouvement('Entrée', '5.00')
+        mouvement.motif = 'Correction du motif'
+        mouvement.save()
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('25.00'))
+    
+    def test_vue_refuse_stock_insuffisant(self):
+        """Test : La vue de création affiche l'erreur de stock insuffisant"""
+        self.client.force_login(self.user)
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            reponse = self.client.post(reverse('inventory:mouvement_create'), {
+                'stock': self.stock.pk,
+                'type_mouvement': 'Sortie',
+                'quantite': '50',
+            })
+        
+        self.assertEqual(reponse.status_code, 200)
+        self.assertContains(reponse, 'Quantité insuffisante en stock')
+        self.assertFalse(MouvementStock.objects.exists())
+
+
+class ComptabilisationStockConcurrenceTest(TransactionTestCase):
+    """Tests de concurrence : mouvements simultanés sur le même stock"""
+    NOMBRE_THREADS = 8
+    MOUVEMENTS_PAR_THREAD = 250
+    
+    def executer(self, fonction):
+        """Exécute `fonction` dans NOMBRE_THREADS threads ; retourne les erreurs levées"""
+        erreurs = []
+        
+        def cible(numero):
+            try:
+                fonction(numero)
+            except Exception as erreur:
+                erreurs.append(erreur)
+            finally:
+                connections.close_all()
+        
+        threads = [threading.Thread(target=cible, args=(numero,)) for numero in range(self.NOMBRE_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return erreurs
+    
+    def test_aucune_mise_a_jour_perdue(self):
+        """Test : La quantité finale est la somme exacte des mouvements concurrents"""
+        user, stock = creer_stock_test(quantite='1000.00')
+        
+        def poster(numero):
+            for _ in range(self.MOUVEMENTS_PAR_THREAD):
+                MouvementStock.objects.create(
+                    stock_id=stock.pk,
+                    type_mouvement='Entrée' if numero % 2 else 'Sortie',
+                    quantite=Decimal('1.50') if numero % 2 else Decimal('1.00'),
+                    effectue_par_id=user.pk
+                )
+        
+        self.assertEqual(self.executer(poster), [])
+        
+        stock.refresh_from_db()
+        moitie = self.NOMBRE_THREADS // 2 * self.MOUVEMENTS_PAR_THREAD
+        self.assertEqual(stock.quantite_actuelle, Decimal('1000.00') + moitie * Decimal('0.50'))
+        self.assertEqual(MouvementStock.objects.count(), self.NOMBRE_THREADS * self.MOUVEMENTS_PAR_THREAD)
+        # Chaque mouvement part de la quantité laissée par le précédent
+        chaine = list(MouvementStock.objects.order_by('pk').values_list('quantite_avant', 'quantite_apres'))
+        avants = [avant for avant, _ in chaine]
+        apres = [quantite for _, quantite in chaine]
+        apres.remove(stock.quantite_actuelle)
+        self.assertEqual(sorted(avants), sorted([Decimal('1000.00')] + apres))
+    
+    def test_jamais_negatif(self):
+        """Test : Des sorties concurrentes ne rendent jamais le stock négatif"""
+        user, stock = creer_stock_test(quantite='100.00')
+        
+        def sortir(numero):
+            for _ in range(25):
+                try:
+                    MouvementStock.objects.create(
+                        stock_id=stock.pk,
+                        type_mouvement='Sortie',
+                        quantite=Decimal('1.00'),
+                        effectue_par_id=user.pk
+                    )
+                except StockInsuffisant:
+                    pass
+        
+        self.assertEqual(self.executer(sortir), [])
+        
+        stock.refresh_from_db()
+        self.assertEqual(stock.quantite_actuelle, Decimal('0.00'))
+        self.assertEqual(MouvementStock.objects.count(), 100)
+
+
+class AchatReceptionTest(TestCase):
+    """Tests pour la réception groupée d'un achat"""
+    
+    def setUp(self):
+        self.user, self.stock = creer_stock_test(quantite='10.00', prix_unitaire='1000.00')
+        self.projet = self.stock.projet
+        self.produit = self.stock.produit
+        self.fournisseur = Fournisseur.objects.create(nom='Fournisseur Test', telephone='987654321')
+    
+    def achat_valide(self, nombre_produits, lignes_par_produit=1):
+        """Achat validé portant `lignes_par_produit` lignes sur le produit existant et sur nombre_produits - 1 nouveaux"""
+        produits = [self.produit] + [
+            Produit.objects.create(
+                nom=f'Produit {i}',
+                categorie=self.produit.categorie,
+                unite_mesure=self.produit.unite_mesure
+            )
+            for i in range(1, nombre_produits)
+        ]
+        achat = Achat(
+            projet=self.projet,
+            fournisseur=self.fournisseur,
+            date_achat=date.today(),
+            mode_paiement='Espèces',
+            statut='Validé',
+            saisi_par=self.user
+        )
+        return Achat.creer_en_masse([(achat, [
+            LigneAchat(produit=produit, quantite=Decimal('10.00'), prix_unitaire=Decimal('2000.00'))
+            for produit in produits
+            for _ in range(lignes_par_produit)
+        ])])[0]
+    
+    def test_stocks_et_prix_moyen(self):
+        """Test : Quantités, mouvements et prix moyen pondéré après réception"""
+        achat = self.achat_valide(3, lignes_par_produit=2)
+        achat.recevoir(self.user)
+        
+        achat.refresh_from_db()
+        self.assertEqual(achat.statut, 'Reçu')
+        self.assertEqual(achat.date_reception, date.today())
+        
+        # Produit existant : 10 à 1 000 + 20 à 2 000 => 30 à 1 666,67 ; le stock est
+        # valorisé sur ses couches de coût, au prix de chaque entrée
+        self.stock.refresh_from_db()
+        self.produit.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('30.00'))
+        self.assertEqual(self.produit.prix_unitaire_moyen, Decimal('1666.67'))
+        self.assertEqual(self.stock.valeur_stock, Decimal('50000.00'))
+        
+        # Nouveaux produits : stock créé au prix d'achat
+        nouveaux = Stock.objects.exclude(pk=self.stock.pk)
+        self.assertEqual(nouveaux.count(), 2)
+        for stock in nouveaux.select_related('produit'):
+            self.assertEqual(stock.quantite_actuelle, Decimal('20.00'))
+            self.assertEqual(stock.produit.prix_unitaire_moyen, Decimal('2000.00'))
+            self.assertEqual(stock.valeur_stock, Decimal('40000.00'))
+        
+        # Un mouvement par ligne, chaînés sur le même stock
+        mouvements = list(self.stock.mouvements.order_by('pk').values_list('quantite_avant', 'quantite_apres'))
+        self.assertEqual(mouvements, [(Decimal('10.00'), Decimal('20.00')), (Decimal('20.00'), Decimal('30.00'))])
+        self.assertEqual(achat.mouvements_stock.count(), 6)
+    
+    def test_nombre_de_requetes_constant(self):
+        """Test : Le nombre de requêtes ne dépend pas du nombre de lignes"""
+        def compter(achat):
+            with CaptureQueriesContext(connection) as requetes:
+                achat.recevoir(self.user)
+            return len([
+                requete for requete in requetes.captured_queries
+                if 'SAVEPOINT' not in requete['sql']
+            ])
+        
+        # Première réception : le produit existant a ensuite une couche de coût à compléter
+        self.achat_valide(1).recevoir(self.user)
+        petit = compter(self.achat_valide(2))
+        grand = compter(self.achat_valide(30, lignes_par_produit=2))
+        self.assertEqual(petit, grand)
+    
+    def test_achat_non_valide(self):
+        """Test : Un achat déjà reçu ne peut pas être reçu une seconde fois"""
+        achat = self.achat_valide(1)
+        achat.recevoir(self.user)
+        
+        with self.assertRaises(ValidationError):
+            achat.recevoir(self.user)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('20.00'))
+    
+    def test_echec_annule_la_reception(self):
+        """Test : Une erreur en cours de réception n'en laisse aucune trace"""
+        achat = self.achat_valide(3)
+        
+        with mock.patch.object(Produit.objects, 'bulk_update', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                achat.recevoir(self.user)
+        
+        achat.refresh_from_db()
+        self.stock.refresh_from_db()
+        self.assertEqual(achat.statut, 'Validé')
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('10.00'))
+        self.assertFalse(MouvementStock.objects.exists())
+        self.assertEqual(Stock.objects.count(), 1)
+    
+    def test_vue_recevoir(self):
+        """Test : La vue de réception met à jour les stocks"""
+        achat = self.achat_valide(1)
+        self.client.force_login(self.user)
+        
+        reponse = self.client.get(reverse('inventory:achat_recevoir', args=[achat.pk]))
+        
+        self.assertRedirects(reponse, reverse('inventory:achat_detail', args=[achat.pk]), fetch_redirect_response=False)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('20.00'))
+
+
+def le(jour, heure=12):
+    """Datetime du fuseau courant, le `jour` à `heure` heures"""
+    return timezone.make_aware(datetime(jour.year, jour.month, jour.day, heure))
+
+
+class InstantaneStockTest(TestCase):
+    """Tests pour les instantanés de stock et la situation à une date"""
+    
+    def setUp(self):
+        self.user, self.stock = creer_stock_test(prix_unitaire='1000.00')
+        Stock.objects.filter(pk=self.stock.pk).update(date_creation=le(date(2024, 1, 1)))
+        for jour, type_mouvement, quantite in [
+            (date(2024, 1, 15), 'Entrée', '100.00'),
+            (date(2024, 2, 10), 'Sortie', '30.00'),
+            (date(2024, 3, 5), 'Ajustement', '50.00'),
+            (date(2024, 3, 20), 'Entrée', '10.00'),
+        ]:
+            self.mouvement(jour, type_mouvement, quantite)
+    
+    def mouvement(self, jour, type_mouvement, quantite, stock=None, cout_unitaire=None):
+        mouvement = MouvementStock.objects.create(
+            stock=stock or self.stock,
+            type_mouvement=type_mouvement,
+            quantite=Decimal(quantite),
+            cout_unitaire=cout_unitaire and Decimal(cout_unitaire),
+            effectue_par=self.user
+        )
+        MouvementStock.objects.filter(pk=mouvement.pk).update(date_mouvement=le(jour))
+    
+    def quantites_au(self, jour):
+        return {
+            (position['projet_id'], position['produit_id']): position['quantite']
+            for position in InstantaneStock.positions_au(jour)
+        }
+    
+    def test_situation_sans_instantane(self):
+        """Test : Sans instantané, la situation est reconstituée depuis la quantité actuelle"""
+        cle = (self.stock.projet_id, self.stock.produit_id)
+        self.assertEqual(self.quantites_au(date(2023, 12, 31)), {})
+        self.assertEqual(self.quantites_au(date(2024, 1, 31)), {cle: Decimal('100.00')})
+        self.assertEqual(self.quantites_au(date(2024, 2, 29)), {cle: Decimal('70.00')})
+        self.assertEqual(self.quantites_au(date(2024, 3, 5)), {cle: Decimal('50.00')})
+        self.assertEqual(self.quantites_au(date(2024, 3, 31)), {cle: Decimal('60.00')})
+    
+    def test_situation_identique_avec_instantanes(self):
+        """Test : Les instantanés mensuels donnent la même situation à toute date"""
+        jours = [date(2024, 1, 1) + timedelta(days=n) for n in range(0, 100, 3)]
+        attendu = {jour: self.quantites_au(jour) for jour in jours}
+        
+        dates = InstantaneStock.construire(date(2024, 3, 31))
+        
+        self.assertEqual(dates, [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)])
+        self.assertEqual({jour: self.quantites_au(jour) for jour in jours}, attendu)
+        instantane = InstantaneStock.objects.get(date=date(2024, 2, 29))
+        self.assertEqual(instantane.quantite, Decimal('70.00'))
+        self.assertEqual(instantane.valeur, Decimal('70000.00'))
+    
+    def test_construction_incrementale(self):
+        """Test : Seules les périodes postérieures au dernier instantané sont construites"""
+        InstantaneStock.construire(date(2024, 2, 29))
+        self.assertEqual(InstantaneStock.construire(date(2024, 2, 29)), [])
+        
+        dates = InstantaneStock.construire(date(2024, 3, 3), periodicite='jour')
+        
+        self.assertEqual(dates, [date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 3)])
+        self.assertEqual(InstantaneStock.objects.get(date=date(2024, 3, 3)).quantite, Decimal('70.00'))
+    
+    def test_stock_cree_apres_instantane(self):
+        """Test : Un stock créé après l'instantané est repris avec sa quantité initiale"""
+        InstantaneStock.construire(date(2024, 3, 31))
+        produit = Produit.objects.create(
+            nom='Fer de 12',
+            categorie=self.stock.produit.categorie,
+            unite_mesure=self.stock.produit.unite_mesure
+        )
+        nouveau = Stock.objects.create(projet=self.stock.projet, produit=produit, quantite_actuelle=Decimal('8.00'))
+        Stock.objects.filter(pk=nouveau.pk).update(date_creation=le(date(2024, 4, 2)))
+        self.mouvement(date(2024, 4, 10), 'Sortie', '3.00', stock=nouveau)
+        
+        cle = (nouveau.projet_id, produit.pk)
+        self.assertNotIn(cle, self.quantites_au(date(2024, 4, 1)))
+        self.assertEqual(self.quantites_au(date(2024, 4, 5))[cle], Decimal('8.00'))
+        self.assertEqual(self.quantites_au(date(2024, 4, 30))[cle], Decimal('5.00'))
+    
+    def test_valeur_des_couches_de_cout(self):
+        """Test : La valeur suit les couches de coût et le coût total des mouvements, pas le prix moyen"""
+        categorie = self.stock.produit.categorie
+        categorie.methode_valorisation = 'FIFO'
+        categorie.save()
+        produit = Produit.objects.create(nom='Fer de 12', categorie=categorie, unite_mesure=self.stock.produit.unite_mesure)
+        fer = Stock.objects.create(projet=self.stock.projet, produit=produit)
+        Stock.objects.filter(pk=fer.pk).update(date_creation=le(date(2024, 4, 1)))
+        self.mouvement(date(2024, 4, 5), 'Entrée', '10.00', stock=fer, cout_unitaire='100.00')
+        self.mouvement(date(2024, 4, 10), 'Entrée', '10.00', stock=fer, cout_unitaire='200.00')
+        self.mouvement(date(2024, 5, 10), 'Sortie', '15.00', stock=fer)
+        cle = (fer.projet_id, produit.pk)
+        
+        def position_au(jour):
+            return next(
+                (position['quantite'], position['prix_unitaire'], position['valeur'])
+                for position in InstantaneStock.positions_au(jour)
+                if (position['projet_id'], position['produit_id']) == cle
+            )
+        
+        attendu = (Decimal('20.00'), Decimal('150.0000'), Decimal('3000.00'))
+        self.assertEqual(position_au(date(2024, 4, 30)), attendu)
+        InstantaneStock.construire(date(2024, 4, 30))
+        instantane = InstantaneStock.objects.get(date=date(2024, 4, 30), produit=produit)
+        self.assertEqual((instantane.quantite, instantane.prix_unitaire, instantane.valeur), attendu)
+        
+        fer.refresh_from_db()
+        self.assertEqual(fer.valeur_stock, Decimal('1000.00'))
+        self.assertEqual(position_au(date(2024, 5, 31)), (Decimal('5.00'), Decimal('200.0000'), Decimal('1000.00')))
+    
+    def test_commande(self):
+        """Test : La commande construit les instantanés jusqu'à la date demandée"""
+        sortie = StringIO()
+        call_command('build_stock_snapshots', '--jusqu-au', '2024-02-29', stdout=sortie)
+        
+        self.assertIn('2 instantané(s)', sortie.getvalue())
+        self.assertEqual(InstantaneStock.objects.count(), 2)
+    
+    def test_valorisation(self):
+        """Test : La page de valorisation regroupe les stocks par projet et par catégorie"""
+        InstantaneStock.construire(date(2024, 3, 31))
+        self.client.force_login(self.user)
+        
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            reponse = self.client.get(reverse('inventory:valorisation_stock'), {'date': '2024-02-29'})
+        
+        self.assertEqual(reponse.status_code, 200)
+        projet, = reponse.context['projets']
+        self.assertEqual(projet['categories'][0]['categorie'], 'Ciment')
+        self.assertEqual(reponse.context['total'], Decimal('70000.00'))
+
+
+class InstantaneStockDebitTest(TestCase):
+    """Test de performance : valorisation de fin de mois sur trois ans de mouvements"""
+    NOMBRE_STOCKS = 50
+    MOUVEMENTS_PAR_MOIS = 40
+    
+    def test_fin_de_mois_depuis_instantane(self):
+        """Test : La situation de fin de mois se lit dans l'instantané, sans parcourir l'historique"""
+        user, stock = creer_stock_test()
+        produits = Produit.objects.bulk_create([
+            Produit(
+                code_produit=f'PROD-TEST-{numero:03d}',
+                nom=f'Produit {numero}',
+                categorie=stock.produit.categorie,
+                unite_mesure=stock.produit.unite_mesure
+            )
+            for numero in range(self.NOMBRE_STOCKS)
+        ])
+        stocks = Stock.objects.bulk_create([
+            Stock(projet=stock.projet, produit=produit, quantite_actuelle=Decimal('1440.00'))
+            for produit in produits
+        ])
+        Stock.objects.update(date_creation=le(date(2023, 1, 1)))
+        
+        # 36 mois d'entrées d'une unité
+        mois = [date(2023 + n // 12, n % 12 + 1, 1) for n in range(36)]
+        for jour in mois:
+            dernier = MouvementStock.objects.aggregate(dernier=Max('pk'))['dernier'] or 0
+            MouvementStock.objects.bulk_create([
+                MouvementStock(
+                    stock=stocks[numero % self.NOMBRE_STOCKS],
+                    type_mouvement='Entrée',
+                    quantite=Decimal('1.00'),
+                    quantite_avant=Decimal('0'),
+                    quantite_apres=Decimal('1.00'),
+                    effectue_par=user
+                )
+                for numero in range(self.NOMBRE_STOCKS * self.MOUVEMENTS_PAR_MOIS)
+            ], batch_size=5000)
+            MouvementStock.objects.filter(pk__gt=dernier).update(
+                date_mouvement=le(jour + timedelta(days=14))
+            )
+        
+        fin_de_mois = date(2024, 6, 30)
+        sans_instantane = time.perf_counter()
+        attendu = InstantaneStock.positions_au(fin_de_mois)
+        sans_instantane = time.perf_counter() - sans_instantane
+        
+        InstantaneStock.construire(date(2025, 12, 31))
+        
+        avec_instantane = time.perf_counter()
+        positions = InstantaneStock.positions_au(fin_de_mois)
+        avec_instantane = time.perf_counter() - avec_instantane
+        
+        self.assertEqual(positions, attendu)
+        self.assertEqual(positions[0]['quantite'], Decimal('720.00'))
+        self.assertEqual(InstantaneStock.objects.count(), 36 * self.NOMBRE_STOCKS)
+        self.assertLess(avec_instantane, 0.05)
+        self.assertLess(avec_instantane, sans_instantane)
+
+
+class CoucheCoutTest(TestCase):
+    """Tests pour la valorisation des mouvements sur les couches de coût"""
+    
+    def setUp(self):
+        self.user, self.stock = creer_stock_test(prix_unitaire='1000.00')
+        self.categorie = self.stock.produit.categorie
+    
+    def mouvement(self, type_mouvement, quantite, cout_unitaire=None, stock=None):
+        return MouvementStock.objects.create(
+            stock=stock or self.stock,
+            type_mouvement=type_mouvement,
+            quantite=Decimal(quantite),
+            cout_unitaire=cout_unitaire and Decimal(cout_unitaire),
+            effectue_par=self.user
+        )
+    
+    def entrer_deux_lots(self, methode):
+        self.categorie.methode_valorisation = methode
+        self.categorie.save()
+        self.mouvement('Entrée', '10.00', '100.00')
+        self.mouvement('Entrée', '10.00', '200.00')
+    
+    def test_fifo(self):
+        """Test : En FIFO, une sortie consomme les lots les plus anciens"""
+        self.entrer_deux_lots('FIFO')
+        
+        sortie = self.mouvement('Sortie', '15.00')
+        
+        self.assertEqual(sortie.cout_total, Decimal('2000.00'))
+        self.assertEqual(sortie.cout_unitaire, Decimal('133.3333'))
+        self.assertEqual(
+            list(CoucheCout.objects.filter(stock=self.stock).values_list('quantite_restante', 'cout_unitaire')),
+            [(Decimal('0.00'), Decimal('100.0000')), (Decimal('5.00'), Decimal('200.0000'))]
+        )
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.valeur_stock, Decimal('1000.00'))
+    
+    def test_cout_moyen_pondere(self):
+        """Test : En CMP, les entrées sont fusionnées au coût moyen pondéré"""
+        self.entrer_deux_lots('CMP')
+        
+        sortie = self.mouvement('Sortie', '15.00')
+        
+        self.assertEqual(sortie.cout_total, Decimal('2250.00'))
+        couche = CoucheCout.objects.get(stock=self.stock)
+        self.assertEqual((couche.quantite_restante, couche.cout_unitaire), (Decimal('5.00'), Decimal('150.0000')))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.valeur_stock, Decimal('750.00'))
+    
+    def test_quantite_hors_couches(self):
+        """Test : Le stock saisi sans couche sort en premier, au prix moyen du produit"""
+        Stock.objects.filter(pk=self.stock.pk).update(quantite_actuelle=Decimal('10.00'))
+        self.entrer_deux_lots('FIFO')
+        
+        sortie = self.mouvement('Sortie', '15.00')
+        
+        self.assertEqual(sortie.cout_total, Decimal('10500.00'))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.valeur_stock, Decimal('2500.00'))
+    
+    def test_transfert_au_cout_des_couches(self):
+        """Test : Un transfert entre dans le projet destination au coût des couches consommées"""
+        self.entrer_deux_lots('FIFO')
+        destination = Projet.objects.create(
+            nom_projet='Projet Destination',
+            client=self.stock.projet.client,
+            montant_prevu=Decimal('1000000.00')
+        )
+        self.client.force_login(self.user)
+        
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            self.client.post(reverse('inventory:mouvement_create'), {
+                'stock': self.stock.pk,
+                'type_mouvement': 'Transfert',
+                'quantite': '12',
+                'projet_destination': destination.pk,
+            })
+        
+        stock_destination = Stock.objects.get(projet=destination)
+        self.assertEqual(stock_destination.valeur_stock, Decimal('1400.00'))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.valeur_stock, Decimal('1600.00'))
+    
+    def bon_de_sortie(self, stocks, lignes):
+        return [
+            MouvementStock(
+                stock=stocks[numero % len(stocks)],
+                type_mouvement='Sortie',
+                quantite=Decimal('1.00'),
+                effectue_par=self.user
+            )
+            for numero in range(lignes)
+        ]
+    
+    def test_bon_de_sortie_en_masse(self):
+        """Test : Un bon de sortie de 500 lignes ne lit pas les stocks ligne par ligne"""
+        self.categorie.methode_valorisation = 'FIFO'
+        self.categorie.save()
+        produits = [self.stock.produit] + [
+            Produit.objects.create(nom=f'Produit {numero}', categorie=self.categorie, unite_mesure=self.stock.produit.unite_mesure)
+            for numero in range(1, 50)
+        ]
+        stocks = [self.stock] + [Stock.objects.create(projet=self.stock.projet, produit=produit) for produit in produits[1:]]
+        MouvementStock.creer_en_masse([
+            MouvementStock(stock=stock, type_mouvement='Entrée', quantite=Decimal('20.00'),
+                           cout_unitaire=Decimal(100 * lot), effectue_par=self.user)
+            for lot in (1, 2) for stock in stocks
+        ])
+        
+        def requetes(lignes):
+            with CaptureQueriesContext(connection) as capture:
+                MouvementStock.creer_en_masse(self.bon_de_sortie(stocks, lignes))
+            return [requete['sql'] for requete in capture.captured_queries if 'SAVEPOINT' not in requete['sql']]
+        
+        petit = requetes(5)
+        grand = requetes(500)
+        
+        selects = lambda sql: [requete for requete in sql if requete.startswith('SELECT')]
+        self.assertEqual(len(selects(grand)), len(selects(petit)))
+        self.assertEqual(len(requetes(60)), len(petit))
+        # 565 unités sorties sur 50 stocks : 11 ou 12 par stock, toutes sur le premier lot à 100
+        self.assertEqual(Stock.objects.aggregate(total=Sum('quantite_actuelle'))['total'], Decimal('1435.00'))
+        self.assertEqual(
+            MouvementStock.objects.filter(type_mouvement='Sortie').aggregate(total=Sum('cout_total'))['total'],
+            Decimal('56500.00')
+        )
+    
+    def test_bon_de_sortie_tout_ou_rien(self):
+        """Test : Une ligne en rupture annule tout le bon de sortie"""
+        self.mouvement('Entrée', '10.00', '100.00')
+        
+        with self.assertRaises(StockInsuffisant):
+            MouvementStock.creer_en_masse(self.bon_de_sortie([self.stock], 11))
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('10.00'))
+        self.assertEqual(MouvementStock.objects.filter(type_mouvement='Sortie').count(), 0)
+        self.assertEqual(CoucheCout.objects.get().quantite_restante, Decimal('10.00'))
+
+
+class TransfertStockTest(TestCase):
+    """Tests pour le transfert de stock entre projets"""
+    
+    def setUp(self):
+        self.user, self.stock = creer_stock_test(prix_unitaire='1000.00')
+        self.source = self.stock.projet
+        self.destination = Projet.objects.create(
+            nom_projet='Projet Destination',
+            client=self.source.client,
+            montant_prevu=Decimal('1000000.00')
+        )
+        self.fer = Produit.objects.create(
+            nom='Fer de 12',
+            categorie=self.stock.produit.categorie,
+            unite_mesure=self.stock.produit.unite_mesure
+        )
+        self.stock_fer = Stock.objects.create(projet=self.source, produit=self.fer)
+        MouvementStock.creer_en_masse([
+            MouvementStock(stock=self.stock, type_mouvement='Entrée', quantite=Decimal('20.00'),
+                           cout_unitaire=Decimal('100.00'), effectue_par=self.user),
+            MouvementStock(stock=self.stock_fer, type_mouvement='Entrée', quantite=Decimal('50.00'),
+                           cout_unitaire=Decimal('30.00'), effectue_par=self.user),
+        ])
+    
+    def test_bon_multi_produits(self):
+        """Test : Chaque ligne crée une sortie et une entrée liées par le numéro de transfert"""
+        numero = MouvementStock.transferer(
+            self.source, self.destination,
+            [(self.stock.produit, '5'), (self.fer, '20'), (self.stock.produit, '3')],
+            self.user
+        )
+        
+        self.assertTrue(numero.startswith('TRF-'))
+        mouvements = MouvementStock.objects.filter(numero_transfert=numero)
+        self.assertEqual(mouvements.filter(type_mouvement='Transfert', projet_destination=self.destination).count(), 3)
+        self.assertEqual(mouvements.filter(type_mouvement='Entrée', stock__projet=self.destination).count(), 3)
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('12.00'))
+        ciment = Stock.objects.get(projet=self.destination, produit=self.stock.produit)
+        fer = Stock.objects.get(projet=self.destination, produit=self.fer)
+        self.assertEqual((ciment.quantite_actuelle, ciment.valeur_stock), (Decimal('8.00'), Decimal('800.00')))
+        self.assertEqual((fer.quantite_actuelle, fer.valeur_stock), (Decimal('20.00'), Decimal('600.00')))
+        self.assertEqual(
+            mouvements.filter(type_mouvement='Transfert').aggregate(total=Sum('cout_total'))['total'],
+            mouvements.filter(type_mouvement='Entrée').aggregate(total=Sum('cout_total'))['total']
+        )
+    
+    def test_tout_ou_rien(self):
+        """Test : Une ligne en rupture annule tout le transfert, entrées comprises"""
+        with self.assertRaises(StockInsuffisant):
+            MouvementStock.transferer(
+                self.source, self.destination,
+                [(self.stock.produit, '5'), (self.fer, '51')],
+                self.user
+            )
+        
+        self.assertFalse(MouvementStock.objects.exclude(numero_transfert=None).exists())
+        self.assertFalse(Stock.objects.filter(projet=self.destination).exists())
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantite_actuelle, Decimal('20.00'))
+    
+    def test_produit_absent_du_projet_source(self):
+        """Test : Un produit sans stock dans le projet source est refusé"""
+        autre = Produit.objects.create(
+            nom='Gravier',
+            categorie=self.fer.categorie,
+            unite_mesure=self.fer.unite_mesure
+        )
+        with self.assertRaises(StockInsuffisant):
+            MouvementStock.transferer(self.source, self.destination, [(autre, '1')], self.user)
+    
+    def test_meme_projet(self):
+        """Test : Un transfert vers le projet source est refusé"""
+        with self.assertRaises(ValidationError):
+            MouvementStock.transferer(self.source, self.source, [(self.fer, '1')], self.user)
+    
+    def test_vue_transfert(self):
+        """Test : La vue de création enregistre les deux jambes du transfert"""
+        self.client.force_login(self.user)
+        
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            reponse = self.client.post(reverse('inventory:mouvement_create'), {
+                'stock': self.stock_fer.pk,
+                'type_mouvement': 'Transfert',
+                'quantite': '10',
+                'projet_destination': self.destination.pk,
+            })
+        
+        self.assertRedirects(reponse, reverse('inventory:stock_detail', args=[self.stock_fer.pk]), fetch_redirect_response=False)
+        sortie = MouvementStock.objects.get(type_mouvement='Transfert')
+        entree = MouvementStock.objects.get(numero_transfert=sortie.numero_transfert, type_mouvement='Entrée')
+        self.assertEqual(entree.stock.projet, self.destination)
+        self.assertEqual(entree.quantite_apres, Decimal('10.00'))
+
+
+class TransfertStockConcurrenceTest(TransactionTestCase):
+    """Tests de concurrence : transferts croisés entre deux projets"""
+    
+    def test_transferts_croises(self):
+        """Test : Des transferts simultanés dans les deux sens aboutissent tous"""
+        user, stock = creer_stock_test(quantite='0')
+        projet_b = Projet.objects.create(
+            nom_projet='Projet B',
+            client=stock.projet.client,
+            montant_prevu=Decimal('1000000.00')
+        )
+        stock_b = Stock.objects.create(projet=projet_b, produit=stock.produit)
+        MouvementStock.creer_en_masse([
+            MouvementStock(stock=s, type_mouvement='Entrée', quantite=Decimal('500.00'), effectue_par=user)
+            for s in (stock, stock_b)
+        ])
+        
+        erreurs = []
+        
+        def transferer(source, destination):
+            try:
+                for _ in range(50):
+                    MouvementStock.transferer(source, destination, [(stock.produit_id, '1')], user)
+            except Exception as erreur:
+                erreurs.append(erreur)
+            finally:
+                connections.close_all()
+        
+        threads = [
+            threading.Thread(target=transferer, args=sens)
+            for sens in [(stock.projet_id, projet_b.pk), (projet_b.pk, stock.projet_id)] * 3
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(erreurs, [])
+        self.assertEqual(Stock.objects.aggregate(total=Sum('quantite_actuelle'))['total'], Decimal('1000.00'))
+        self.assertEqual(MouvementStock.objects.exclude(numero_transfert=None).values('numero_transfert').distinct().count(), 300)
+
+
+class TransfertStockDebitTest(TestCase):
+    """Test de performance : bon de transfert de 1 000 lignes entre deux chantiers"""
+    NOMBRE_LIGNES = 1000
+    
+    def test_bon_de_1000_lignes(self):
+        """Test : 1 000 lignes sont transférées en un lot, sans lecture ligne par ligne"""
+        user, stock = creer_stock_test()
+        destination = Projet.objects.create(
+            nom_projet='Projet Destination',
+            client=stock.projet.client,
+            montant_prevu=Decimal('1000000.00')
+        )
+        produits = Produit.objects.bulk_create([
+            Produit(
+                code_produit=f'PROD-TEST-{numero:04d}',
+                nom=f'Produit {numero}',
+                categorie=stock.produit.categorie,
+                unite_mesure=stock.produit.unite_mesure
+            )
+            for numero in range(self.NOMBRE_LIGNES)
+        ])
+        stocks = Stock.objects.bulk_create([
+            Stock(projet=stock.projet, produit=produit) for produit in produits
+        ])
+        MouvementStock.creer_en_masse([
+            MouvementStock(stock=s, type_mouvement='Entrée', quantite=Decimal('10.00'),
+                           cout_unitaire=Decimal('500.00'), effectue_par=user)
+            for s in stocks
+        ])
+        
+        def selects(lignes):
+            with CaptureQueriesContext(connection) as capture:
+                MouvementStock.transferer(stock.projet, destination, lignes, user)
+            return len([requete for requete in capture.captured_queries if requete['sql'].startswith('SELECT')])
+        
+        # Premier transfert : initialise le compteur de numérotation TRF
+        MouvementStock.transferer(stock.projet, destination, [(produits[0], '1')], user)
+        petit = selects([(produit, '1') for produit in produits[1:11]])
+        
+        debut = time.perf_counter()
+        grand = selects([(produit, '2') for produit in produits])
+        duree = time.perf_counter() - debut
+        
+        self.assertEqual(grand, petit)
+        self.assertEqual(
+            Stock.objects.filter(projet=destination).aggregate(total=Sum('valeur_stock'))['total'],
+            Decimal('1005500.00')
+        )
+        self.assertLess(duree, 5)
+
+
+class AlerteStockFaibleTest(TestCase):
+    """Tests pour l'indicateur de stock faible tenu à jour sur Stock"""
+    
+    def setUp(self):
+        self.user, self.stock = creer_stock_test(quantite='20.00')
+        self.produit = self.stock.produit
+        self.produit.stock_minimum = Decimal('10.00')
+        self.produit.save()
+    
+    def mouvement(self, type_mouvement, quantite):
+        return MouvementStock.objects.create(
+            stock=self.stock,
+            type_mouvement=type_mouvement,
+            quantite=Decimal(quantite),
+            effectue_par=self.user
+        )
+    
+    def test_sortie_sous_le_minimum(self):
+        """Test : Une sortie qui passe sous le minimum lève l'alerte et calcule le manque"""
+        self.mouvement('Sortie', '14')
+        
+        self.stock.refresh_from_db()
+        self.assertTrue(self.stock.is_low)
+        self.assertEqual(self.stock.manque, Decimal('4.00'))
+        self.assertEqual(self.produit.get_projets_avec_stock_faible(), [self.stock.projet])
+        
+        self.mouvement('Entrée', '10')
+        self.stock.refresh_from_db()
+        self.assertFalse(self.stock.is_low)
+        self.assertEqual(self.stock.manque, Decimal('0.00'))
+        self.assertEqual(self.produit.get_projets_avec_stock_faible(), [])
+    
+    def test_modification_du_minimum(self):
+        """Test : Modifier le stock minimum recalcule l'alerte des stocks du produit"""
+        self.assertFalse(Stock.objects.get(pk=self.stock.pk).is_low)
+        
+        self.produit.stock_minimum = Decimal('25.50')
+        self.produit.save()
+        
+        stock = Stock.objects.get(pk=self.stock.pk)
+        self.assertTrue(stock.is_low)
+        self.assertEqual(stock.manque, Decimal('5.50'))
+    
+    def test_enregistrement_direct(self):
+        """Test : Un stock saisi directement calcule son alerte à l'enregistrement"""
+        self.stock.quantite_actuelle = Decimal('3.00')
+        self.stock.save()
+        
+        stock = Stock.objects.get(pk=self.stock.pk)
+        self.assertTrue(stock.is_low)
+        self.assertEqual(stock.manque, Decimal('7.00'))
+    
+    def test_page_alertes_groupee_par_projet(self):
+        """Test : La page des alertes compte les alertes par projet sans relire la liste"""
+        autre_projet = Projet.objects.create(
+            nom_projet='Autre Projet',
+            client=self.stock.projet.client,
+            montant_prevu=Decimal('1000000.00')
+        )
+        Stock.objects.create(projet=autre_projet, produit=self.produit, quantite_actuelle=Decimal('1.00'))
+        Stock.objects.create(projet=autre_projet, produit=Produit.objects.create(
+            nom='Sable',
+            categorie=self.produit.categorie,
+            unite_mesure=self.produit.unite_mesure,
+            stock_minimum=Decimal('5.00')
+        ))
+        self.mouvement('Sortie', '12')
+        
+        client = Client()
+        client.force_login(self.user)
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            response = client.get(reverse('inventory:alertes_stock'))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_alertes'], 3)
+        alertes = response.context['alertes_par_projet']
+        self.assertEqual(alertes[self.stock.projet.code_projet]['nombre'], 1)
+        self.assertEqual(alertes[self.stock.projet.code_projet]['manque_total'], Decimal('2.00'))
+        self.assertEqual(alertes[autre_projet.code_projet]['nombre'], 2)
+        self.assertEqual(alertes[autre_projet.code_projet]['manque_total'], Decimal('14.00'))
+        self.assertEqual(
+            [stock.manque for stock in alertes[autre_projet.code_projet]['stocks']],
+            [Decimal('9.00'), Decimal('5.00')]
+        )
+
+
+class PrevisionReapprovisionnementTest(TestCase):
+    """Tests pour les suggestions de réapprovisionnement"""
+    
+    def setUp(self):
+        self.user, self.stock = creer_stock_test(quantite='100.00')
+        self.projet = self.stock.projet
+        self.produit = self.stock.produit
+        self.fournisseur = Fournisseur.objects.create(nom='Fournisseur Test', telephone='987654321')
+    
+    def sortie(self, jour, quantite, type_mouvement='Sortie', stock=None):
+        mouvement = MouvementStock.objects.create(
+            stock=stock or self.stock,
+            type_mouvement=type_mouvement,
+            quantite=Decimal(quantite),
+            projet_destination=self.projet if type_mouvement == 'Transfert' else None,
+            effectue_par=self.user
+        )
+        MouvementStock.objects.filter(pk=mouvement.pk).update(date_mouvement=le(jour))
+    
+    def achat_recu(self, projet, date_achat, jours):
+        achat = Achat(
+            projet=projet,
+            fournisseur=self.fournisseur,
+            date_achat=date_achat,
+            date_reception=date_achat + timedelta(days=jours),
+            mode_paiement='Espèces',
+            statut='Reçu',
+            saisi_par=self.user
+        )
+        Achat.creer_en_masse([(achat, [
+            LigneAchat(produit=self.produit, quantite=Decimal('10.00'), prix_unitaire=Decimal('1000.00'))
+        ])])
+    
+    def test_consommation_lissee_et_point_de_commande(self):
+        """Test : Consommation lissée par jour, délai du couple (projet, produit) et point de commande"""
+        self.sortie(date(2026, 2, 25), '2')
+        self.sortie(date(2026, 2, 25), '3')
+        self.sortie(date(2026, 2, 28), '4')
+        self.sortie(date(2026, 2, 10), '50')  # hors fenêtre
+        self.sortie(date(2026, 2, 27), '7', type_mouvement='Transfert')  # pas une consommation
+        
+        autre_projet = Projet.objects.create(
+            nom_projet='Autre Projet', client=self.projet.client, montant_prevu=Decimal('1000000.00')
+        )
+        self.achat_recu(self.projet, date(2026, 1, 5), 4)
+        self.achat_recu(self.projet, date(2026, 1, 20), 6)
+        self.achat_recu(autre_projet, date(2026, 1, 5), 20)
+        
+        prevision = PrevisionReapprovisionnement(
+            date_fin=date(2026, 3, 1), fenetre=10, portee=4, couverture=10, facteur_securite=2
+        )
+        self.assertEqual(prevision.enregistrer(), 1)
+        
+        # Fenêtre du 19/02 au 28/02 : sorties de 5 le 7e jour et de 4 le 10e
+        poids = [0.6 ** (9 - jour) for jour in range(10)]
+        consommation = (5 * poids[6] + 4 * poids[9]) / sum(poids)
+        ecart_type = ((25 * poids[6] + 16 * poids[9]) / sum(poids) - consommation ** 2) ** 0.5
+        point_commande = consommation * 5 + 2 * ecart_type * 5 ** 0.5
+        
+        suggestion = SuggestionReapprovisionnement.objects.get()
+        self.assertEqual(suggestion.stock, self.stock)
+        self.assertEqual(suggestion.consommation_journaliere, Decimal(f'{consommation:.4f}'))
+        self.assertEqual(suggestion.delai_livraison, Decimal('5.0'))
+        self.assertEqual(suggestion.point_commande, Decimal(f'{point_commande:.2f}'))
+        # Stock restant : 100 - 5 - 4 - 50 - 7 = 34
+        self.assertEqual(suggestion.quantite_suggeree, Decimal(f'{point_commande + consommation * 10 - 34:.2f}'))
+    
+    def test_delais_par_defaut_et_quantite_suggeree(self):
+        """Test : Délai du produit, puis de tous les achats, puis par défaut ; quantité à commander"""
+        fer = Produit.objects.create(
+            nom='Fer de 12', categorie=self.produit.categorie, unite_mesure=self.produit.unite_mesure
+        )
+        stock_fer = Stock.objects.create(projet=self.projet, produit=fer, quantite_actuelle=Decimal('100.00'))
+        autre_projet = Projet.objects.create(
+            nom_projet='Autre Projet', client=self.projet.client, montant_prevu=Decimal('1000000.00')
+        )
+        for jour in range(1, 29):
+            self.sortie(date(2026, 2, jour), '3')
+            self.sortie(date(2026, 2, jour), '3', stock=stock_fer)
+        
+        prevision = PrevisionReapprovisionnement(date_fin=date(2026, 3, 1), fenetre=28, delai_defaut=3)
+        prevision.enregistrer()
+        suggestions = {
+            suggestion.stock_id: suggestion for suggestion in SuggestionReapprovisionnement.objects.all()
+        }
+        # Consommation régulière : pas d'écart type, pas de stock de sécurité
+        self.assertEqual(suggestions[self.stock.pk].consommation_journaliere, Decimal('3.0000'))
+        self.assertEqual(suggestions[self.stock.pk].stock_securite, Decimal('0.00'))
+        self.assertEqual(suggestions[self.stock.pk].delai_livraison, Decimal('3.0'))
+        self.assertEqual(suggestions[self.stock.pk].point_commande, Decimal('9.00'))
+        # Point de commande + 30 jours de consommation - stock restant (100 - 28 × 3)
+        self.assertEqual(suggestions[self.stock.pk].quantite_suggeree, Decimal('83.00'))
+        
+        # Achat du ciment sur un autre projet : délai du produit, puis de tous les achats pour le fer
+        self.achat_recu(autre_projet, date(2026, 1, 5), 8)
+        prevision.enregistrer()
+        self.assertEqual(SuggestionReapprovisionnement.objects.count(), 2)
+        self.assertEqual(SuggestionReapprovisionnement.objects.get(stock=self.stock).delai_livraison, Decimal('8.0'))
+        self.assertEqual(SuggestionReapprovisionnement.objects.get(stock=stock_fer).delai_livraison, Decimal('8.0'))
+    
+    def test_page_alertes(self):
+        """Test : Les stocks arrivés au point de commande apparaissent sur la page des alertes"""
+        for jour in range(1, 29):
+            self.sortie(date(2026, 2, jour), '3')
+        PrevisionReapprovisionnement(date_fin=date(2026, 3, 1), fenetre=28).enregistrer()
+        
+        client = Client()
+        client.force_login(self.user)
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            response = client.get(reverse('inventory:alertes_stock'))
+        self.assertEqual([suggestion.stock for suggestion in response.context['suggestions']], [self.stock])
+        self.assertContains(response, 'Suggestions de réapprovisionnement')
+    
+    def test_commande(self):
+        """Test : La commande forecast_reorder_points enregistre les suggestions"""
+        self.sortie(date.today() - timedelta(days=1), '5')
+        sortie = StringIO()
+        call_command('forecast_reorder_points', '--fenetre', '30', stdout=sortie)
+        self.assertIn('1 suggestion(s)', sortie.getvalue())
+        self.assertEqual(SuggestionReapprovisionnement.objects.get().stock, self.stock)
+
+
+class PrevisionReapprovisionnementDebitTest(TestCase):
+    """Test de performance : prévision sur trois mois de sorties de nombreux stocks"""
+    NOMBRE_STOCKS = 100
+    SORTIES_PAR_STOCK = 400
+    
+    def test_prevision_vectorisee(self):
+        """Test : La prévision regroupe les sorties en SQL et calcule tous les stocks d'un bloc"""
+        user, stock = creer_stock_test()
+        produits = Produit.objects.bulk_create([
+            Produit(
+                code_produit=f'PROD-TEST-{numero:03d}',
+                nom=f'Produit {numero}',
+                categorie=stock.produit.categorie,
+                unite_mesure=stock.produit.unite_mesure
+            )
+            for numero in range(self.NOMBRE_STOCKS)
+        ])
+        stocks = Stock.objects.bulk_create([
+            Stock(projet=stock.projet, produit=produit, quantite_actuelle=Decimal('100.00'))
+            for produit in produits
+        ])
+        MouvementStock.objects.bulk_create([
+            MouvementStock(
+                stock=stocks[numero % self.NOMBRE_STOCKS],
+                type_mouvement='Sortie',
+                quantite=Decimal('1.00'),
+                quantite_avant=Decimal('0'),
+                quantite_apres=Decimal('0'),
+                effectue_par=user
+            )
+            for numero in range(self.NOMBRE_STOCKS * self.SORTIES_PAR_STOCK)
+        ], batch_size=5000)
+        # Chaque stock sort une unité par jour sur les 80 derniers jours, cinq fois par jour
+        for jour in range(80):
+            MouvementStock.objects.filter(
+                pk__in=MouvementStock.objects.filter(
+                    date_mouvement__gt=le(date(2026, 3, 1))
+                ).values('pk')[:self.NOMBRE_STOCKS * 5]
+            ).update(date_mouvement=le(date(2026, 3, 1) - timedelta(days=jour + 1)))
+        
+        debut = time.perf_counter()
+        nombre = PrevisionReapprovisionnement(date_fin=date(2026, 3, 1), fenetre=80).enregistrer()
+        duree = time.perf_counter() - debut
+        
+        self.assertEqual(nombre, self.NOMBRE_STOCKS)
+        self.assertEqual(
+            set(SuggestionReapprovisionnement.objects.values_list('consommation_journaliere', flat=True)),
+            {Decimal('5.0000')}
+        )
+        self.assertLess(duree, 2)
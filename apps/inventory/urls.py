@@ -32,4 +32,7 @@ urlpatterns = [
     
     # Alertes
     path('alertes/', views.alertes_stock, name='alertes_stock'),
+    
+    # Valorisation
+    path('valorisation/', views.valorisation_stock, name='valorisation_stock'),
 ]
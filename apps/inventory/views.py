@@ -1,15 +1,15 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.db.models import Sum, Q, F, Count
 from django.http import JsonResponse
 from django.utils import timezone
 from django.core.paginator import Paginator
-from decimal import Decimal
 
 from .models import (
     UniteMessure, CategorieProduit, Produit, Stock,
-    Achat, LigneAchat, MouvementStock
+    Achat, LigneAchat, MouvementStock, SuggestionReapprovisionnement
 )
 from .forms import (
     UniteMessureForm, CategorieProduitForm, ProduitForm, StockForm,
@@ -17,6 +17,8 @@ from .forms import (
     StockFilterForm, AchatFilterForm
 )
 from apps.projects.models import Projet
+from apps.core.pagination import ApproximateCountPaginator, KeysetPaginator
+from .services import ValorisationStock
 
 
 # ============ DASHBOARD ============
@@ -32,9 +34,10 @@ def inventory_dashboard(request):
     valeur_totale = Stock.objects.aggregate(total=Sum('valeur_stock'))['total'] or 0
     
     # Produits avec stock faible
-    stocks_faibles = Stock.objects.select_related('produit', 'projet').filter(
-        quantite_actuelle__lt=F('produit__stock_minimum')
-    ).order_by('quantite_actuelle')[:10]
+    stocks_faibles = Stock.objects.select_related(
+        'produit', 'projet', 'produit__unite_mesure'
+    ).filter(is_low=True).order_by('-manque')[:10]
+    total_alertes = Stock.objects.filter(is_low=True).count()
     
     # Achats récents
     achats_recents = Achat.objects.select_related('projet', 'fournisseur').order_by('-date_achat')[:10]
@@ -57,6 +60,7 @@ def inventory_dashboard(request):
         'total_stocks': total_stocks,
         'valeur_totale': valeur_totale,
         'stocks_faibles': stocks_faibles,
+        'total_alertes': total_alertes,
         'achats_recents': achats_recents,
         'mouvements_recents': mouvements_recents,
         'stats_projets': stats_projets,
@@ -184,7 +188,7 @@ def stock_list(request):
         if categorie:
             stocks = stocks.filter(produit__categorie=categorie)
         if stock_faible:
-            stocks = stocks.filter(quantite_actuelle__lt=F('produit__stock_minimum'))
+            stocks = stocks.filter(is_low=True)
     
     # Recherche
     search = request.GET.get('search', '')
@@ -280,7 +284,7 @@ def achat_list(request):
         )
     
     # Pagination
-    paginator = Paginator(achats, 20)
+    paginator = ApproximateCountPaginator(achats, 20)
     page = request.GET.get('page')
     achats = paginator.get_page(page)
     
@@ -324,15 +328,12 @@ def achat_create(request):
             achat.saisi_par = request.user
             achat.save()
             
-            # Sauvegarder les lignes
+            # Sauvegarder les lignes (un seul recalcul du montant total)
             lignes = formset.save(commit=False)
-            for ligne in lignes:
-                ligne.achat = achat
-                ligne.save()
-            
-            # Recalculer le montant total
-            achat.calculer_montant_total()
-            achat.save()
+            with achat.differer_recalcul():
+                for ligne in lignes:
+                    ligne.achat = achat
+                    ligne.save()
             
             messages.success(request, f'Achat {achat.numero_achat} créé avec succès.')
             return redirect('inventory:achat_detail', pk=achat.pk)
@@ -364,11 +365,9 @@ def achat_update(request, pk):
         
         if form.is_valid() and formset.is_valid():
             form.save()
-            formset.save()
-            
-            # Recalculer le montant total
-            achat.calculer_montant_total()
-            achat.save()
+            # Un seul recalcul du montant total pour l'ensemble des lignes
+            with achat.differer_recalcul():
+                formset.save()
             
             messages.success(request, f'Achat {achat.numero_achat} modifié avec succès.')
             return redirect('inventory:achat_detail', pk=achat.pk)
@@ -409,42 +408,12 @@ def achat_recevoir(request, pk):
     """Marquer un achat comme reçu et mettre à jour les stocks"""
     achat = get_object_or_404(Achat, pk=pk)
     
-    if achat.statut != 'Validé':
-        messages.error(request, 'Seuls les achats validés peuvent être reçus.')
+    try:
+        achat.recevoir(request.user)
+    except ValidationError as erreur:
+        messages.error(request, erreur.message)
         return redirect('inventory:achat_detail', pk=achat.pk)
     
-    # Mettre à jour les stocks pour chaque ligne
-    for ligne in achat.lignes.all():
-        # Récupérer ou créer le stock
-        stock, created = Stock.objects.get_or_create(
-            projet=achat.projet,
-            produit=ligne.produit,
-            defaults={'quantite_actuelle': 0}
-        )
-        
-        # Créer le mouvement de stock
-        mouvement = MouvementStock.objects.create(
-            stock=stock,
-            type_mouvement='Entrée',
-            quantite=ligne.quantite,
-            achat=achat,
-            motif=f'Réception achat {achat.numero_achat}',
-            effectue_par=request.user
-        )
-        
-        # Mettre à jour le prix unitaire moyen du produit
-        total_quantite = ligne.produit.get_stock_total()
-        if total_quantite > 0:
-            valeur_actuelle = ligne.produit.prix_unitaire_moyen * Decimal(str(total_quantite - ligne.quantite))
-            valeur_nouvelle = ligne.prix_unitaire * ligne.quantite
-            ligne.produit.prix_unitaire_moyen = (valeur_actuelle + valeur_nouvelle) / Decimal(str(total_quantite))
-            ligne.produit.save()
-    
-    # Marquer l'achat comme reçu
-    achat.statut = 'Reçu'
-    achat.date_reception = timezone.now().date()
-    achat.save()
-    
     messages.success(request, f'Achat {achat.numero_achat} reçu et stocks mis à jour.')
     return redirect('inventory:achat_detail', pk=achat.pk)
 
@@ -475,10 +444,9 @@ def mouvement_list(request):
             Q(motif__icontains=search)
         )
     
-    # Pagination
-    paginator = Paginator(mouvements, 50)
-    page = request.GET.get('page')
-    mouvements = paginator.get_page(page)
+    # Pagination par curseur (date, id)
+    paginator = KeysetPaginator(mouvements, 50)
+    mouvements = paginator.get_page(request.GET.get('page'))
     
     projets = Projet.objects.filter(statut__in=['Planifié', 'En_cours'])
     
@@ -507,29 +475,22 @@ def mouvement_create(request):
                 messages.error(request, 'Le projet de destination est obligatoire pour un transfert.')
                 return render(request, 'inventory/mouvement_form.html', {'form': form, 'title': 'Nouveau mouvement'})
             
-            # Validation de la quantité pour les sorties
-            if mouvement.type_mouvement in ['Sortie', 'Transfert']:
-                if mouvement.quantite > mouvement.stock.quantite_actuelle:
-                    messages.error(request, 'Quantité insuffisante en stock.')
-                    return render(request, 'inventory/mouvement_form.html', {'form': form, 'title': 'Nouveau mouvement'})
-            
-            mouvement.save()
-            
-            # Pour les transferts, créer une entrée dans le projet destination
-            if mouvement.type_mouvement == 'Transfert' and mouvement.projet_destination:
-                stock_dest, created = Stock.objects.get_or_create(
-                    projet=mouvement.projet_destination,
-                    produit=mouvement.stock.produit,
-                    defaults={'quantite_actuelle': 0}
-                )
-                
-                MouvementStock.objects.create(
-                    stock=stock_dest,
-                    type_mouvement='Entrée',
-                    quantite=mouvement.quantite,
-                    motif=f'Transfert depuis {mouvement.stock.projet.code_projet}',
-                    effectue_par=request.user
-                )
+            # La disponibilité est vérifiée sur le stock verrouillé, à l'enregistrement ;
+            # un transfert enregistre sa sortie et son entrée dans la même transaction
+            try:
+                if mouvement.type_mouvement == 'Transfert':
+                    MouvementStock.transferer(
+                        mouvement.stock.projet_id,
+                        mouvement.projet_destination,
+                        [(mouvement.stock.produit_id, mouvement.quantite)],
+                        request.user,
+                        motif=mouvement.motif
+                    )
+                else:
+                    mouvement.save()
+            except ValidationError as erreur:
+                messages.error(request, erreur.message)
+                return render(request, 'inventory/mouvement_form.html', {'form': form, 'title': 'Nouveau mouvement'})
             
             messages.success(request, 'Mouvement de stock enregistré avec succès.')
             return redirect('inventory:stock_detail', pk=mouvement.stock.pk)
@@ -545,27 +506,47 @@ def mouvement_create(request):
 @login_required
 def alertes_stock(request):
     """Page des alertes de stock faible"""
-    # Stocks faibles par projet
-    stocks_faibles = Stock.objects.select_related(
-        'produit', 'projet', 'produit__unite_mesure'
-    ).filter(
-        quantite_actuelle__lt=F('produit__stock_minimum')
-    ).order_by('projet', 'quantite_actuelle')
+    stocks_faibles = Stock.objects.filter(is_low=True)
     
-    # Grouper par projet
+    # Nombre d'alertes et manque total par projet, groupés en SQL
     alertes_par_projet = {}
-    for stock in stocks_faibles:
-        projet_code = stock.projet.code_projet
-        if projet_code not in alertes_par_projet:
-            alertes_par_projet[projet_code] = {
-                'projet': stock.projet,
-                'stocks': []
-            }
-        alertes_par_projet[projet_code]['stocks'].append(stock)
+    for ligne in stocks_faibles.values('projet').annotate(
+        nombre=Count('id'), manque_total=Sum('manque')
+    ).order_by('projet'):
+        alertes_par_projet[ligne['projet']] = {
+            'nombre': ligne['nombre'],
+            'manque_total': ligne['manque_total'],
+            'stocks': [],
+        }
+    
+    for stock in stocks_faibles.select_related(
+        'produit', 'projet', 'produit__categorie', 'produit__unite_mesure'
+    ).order_by('projet', '-manque'):
+        alerte = alertes_par_projet.get(stock.projet_id)
+        if alerte is not None:
+            alerte['projet'] = stock.projet
+            alerte['stocks'].append(stock)
     
     context = {
-        'alertes_par_projet': alertes_par_projet,
-        'total_alertes': stocks_faibles.count(),
+        'alertes_par_projet': {
+            alerte['projet'].code_projet: alerte
+            for alerte in alertes_par_projet.values() if alerte['stocks']
+        },
+        'total_alertes': sum(alerte['nombre'] for alerte in alertes_par_projet.values()),
+        # Stocks arrivés au point de commande suggéré (commande forecast_reorder_points)
+        'suggestions': SuggestionReapprovisionnement.objects.select_related(
+            'stock__projet', 'stock__produit__unite_mesure'
+        ).filter(
+            stock__quantite_actuelle__lte=F('point_commande'), quantite_suggeree__gt=0
+        ).order_by('stock__projet', '-quantite_suggeree'),
     }
     
     return render(request, 'inventory/alertes_stock.html', context)
+
+
+# ============ VALORISATION ============
+
+@login_required
+def valorisation_stock(request):
+    """Valorisation des stocks à une date, par projet et par catégorie"""
+    return render(request, 'inventory/valorisation_stock.html', ValorisationStock.depuis_requete(request).get_context())
@@ -1,7 +1,24 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class InvoicingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.invoicing'
     verbose_name = 'Devis et Facturation'
+
+    def ready(self):
+        if not settings.FACTURES_RETARD_AUTO:
+            return
+        # Serveur web uniquement : ni les commandes de gestion, ni le processus
+        # de surveillance de runserver
+        commande = sys.argv[1] if len(sys.argv) > 1 else ''
+        if os.path.basename(sys.argv[0]) == 'manage.py' and not (
+            commande == 'runserver' and os.environ.get('RUN_MAIN') == 'true'
+        ):
+            return
+        from apps.invoicing import planificateur
+        planificateur.demarrer()
@@ -6,6 +6,7 @@ from django.db.models import Sum, Q
 from reportlab.lib.units import cm
 from apps.core.utils.exports import ExcelExporter, PDFExporter, format_currency, format_date
 from .models import Devis, Facture
+from .services import BalanceAgee
 from datetime import datetime
 
 
@@ -57,8 +58,6 @@ def export_devis_excel(request):
     exporter.add_headers(headers)
     
     # Données
-    total_ht = 0
-    total_ttc = 0
     for devis in queryset:
         row = [
             devis.numero_devis,
@@ -72,15 +71,12 @@ def export_devis_excel(request):
             devis.validite_jours or "N/A"
         ]
         exporter.add_row(row)
-        if devis.montant_ht:
-            total_ht += float(devis.montant_ht)
-        if devis.montant_ttc:
-            total_ttc += float(devis.montant_ttc)
     
-    # Ligne de total
+    # Ligne de total (agrégée en base)
+    totaux = queryset.totaux()
     exporter.add_row([
         "", "", "", "TOTAL:",
-        total_ht, "", total_ttc, "", ""
+        float(totaux['total_ht']), "", float(totaux['total_ttc']), "", ""
     ], is_total=True)
     
     # Ajuster les colonnes
@@ -125,8 +121,6 @@ def export_devis_pdf(request):
     headers = ["N° Devis", "Date", "Client", "Projet", "Montant HT", "Montant TTC", "Statut"]
     
     data = []
-    total_ht = 0
-    total_ttc = 0
     for devis in queryset:
         row = [
             devis.numero_devis,
@@ -138,13 +132,10 @@ def export_devis_pdf(request):
             devis.get_statut_display()
         ]
         data.append(row)
-        if devis.montant_ht:
-            total_ht += float(devis.montant_ht)
-        if devis.montant_ttc:
-            total_ttc += float(devis.montant_ttc)
     
-    # Ajouter le total
-    data.append(["", "", "", "TOTAL:", format_currency(total_ht), format_currency(total_ttc), ""])
+    # Ajouter le total (agrégé en base)
+    totaux = queryset.totaux()
+    data.append(["", "", "", "TOTAL:", format_currency(totaux['total_ht']), format_currency(totaux['total_ttc']), ""])
     
     # Largeurs de colonnes
     col_widths = [3*cm, 2.5*cm, 4*cm, 5*cm, 3.5*cm, 3.5*cm, 2.5*cm]
@@ -270,11 +261,6 @@ def export_factures_excel(request):
     exporter.add_headers(headers)
     
     # Données
-    total_ht = 0
-    total_ttc = 0
-    total_paye = 0
-    total_reste = 0
-    
     for facture in queryset:
         reste = float(facture.montant_ttc or 0) - float(facture.montant_paye or 0)
         row = [
@@ -291,19 +277,13 @@ def export_factures_excel(request):
             format_date(facture.date_echeance)
         ]
         exporter.add_row(row)
-        
-        if facture.montant_ht:
-            total_ht += float(facture.montant_ht)
-        if facture.montant_ttc:
-            total_ttc += float(facture.montant_ttc)
-        if facture.montant_paye:
-            total_paye += float(facture.montant_paye)
-        total_reste += reste
-    
-    # Ligne de total
+    
+    # Ligne de total (agrégée en base)
+    totaux = queryset.totaux()
     exporter.add_row([
         "", "", "", "TOTAL:",
-        total_ht, "", total_ttc, total_paye, total_reste, "", ""
+        float(totaux['total_ht']), "", float(totaux['total_ttc']),
+        float(totaux['total_paye']), float(totaux['total_restant']), "", ""
     ], is_total=True)
     
     # Ajuster les colonnes
@@ -348,10 +328,6 @@ def export_factures_pdf(request):
     headers = ["N° Facture", "Date", "Client", "Montant TTC", "Payé", "Reste", "Statut"]
     
     data = []
-    total_ttc = 0
-    total_paye = 0
-    total_reste = 0
-    
     for facture in queryset:
         reste = float(facture.montant_ttc or 0) - float(facture.montant_paye or 0)
         row = [
@@ -364,15 +340,13 @@ def export_factures_pdf(request):
             facture.get_statut_paiement_display()
         ]
         data.append(row)
-        
-        if facture.montant_ttc:
-            total_ttc += float(facture.montant_ttc)
-        if facture.montant_paye:
-            total_paye += float(facture.montant_paye)
-        total_reste += reste
     
-    # Ajouter le total
-    data.append(["", "", "TOTAL:", format_currency(total_ttc), format_currency(total_paye), format_currency(total_reste), ""])
+    # Ajouter le total (agrégé en base)
+    totaux = queryset.totaux()
+    data.append([
+        "", "", "TOTAL:", format_currency(totaux['total_ttc']),
+        format_currency(totaux['total_paye']), format_currency(totaux['total_restant']), ""
+    ])
     
     # Largeurs de colonnes
     col_widths = [3*cm, 2.5*cm, 5*cm, 3.5*cm, 3.5*cm, 3.5*cm, 2.5*cm]
@@ -452,3 +426,70 @@ def export_facture_detail_pdf(request, pk):
     exporter.add_footer_info(f"Document généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')} - ETRAGC SARLU")
     
     return exporter.get_response()
+
+
+# ===== EXPORTS BALANCE ÂGÉE =====
+
+@login_required
+def export_balance_agee_excel(request):
+    """Exporter la balance âgée des créances en Excel"""
+    balance = BalanceAgee.depuis_requete(request)
+    
+    filename = f"balance_agee_{balance.date_reference.strftime('%Y%m%d')}.xlsx"
+    exporter = ExcelExporter(filename, "Balance âgée")
+    
+    exporter.add_title("ETRAGC SARLU - Balance Âgée des Créances")
+    exporter.add_empty_row()
+    exporter.add_info("Situation au:", format_date(balance.date_reference))
+    exporter.add_info("Date d'export:", datetime.now().strftime('%d/%m/%Y %H:%M'))
+    exporter.add_info("Nombre de factures:", balance.totaux['nombre_factures'])
+    exporter.add_empty_row()
+    
+    exporter.add_headers(
+        ["Client", "Projet"] + [f"{libelle} (GNF)" for _, libelle in balance.TRANCHES] + ["Total (GNF)"]
+    )
+    for ligne in balance.lignes:
+        exporter.add_row(
+            [ligne['client__nom_complet'], ligne['projet__nom_projet'] or "Sans projet"]
+            + [float(ligne[colonne]) for colonne in balance.COLONNES]
+        )
+    exporter.add_row(
+        ["TOTAL:", ""] + [float(balance.totaux[colonne]) for colonne in balance.COLONNES],
+        is_total=True
+    )
+    
+    exporter.auto_adjust_columns()
+    
+    return exporter.get_response()
+
+
+@login_required
+def export_balance_agee_pdf(request):
+    """Exporter la balance âgée des créances en PDF"""
+    balance = BalanceAgee.depuis_requete(request)
+    
+    filename = f"balance_agee_{balance.date_reference.strftime('%Y%m%d')}.pdf"
+    exporter = PDFExporter(filename, "ETRAGC SARLU - Balance Âgée des Créances", orientation='landscape')
+    
+    exporter.add_title()
+    exporter.add_info_table([
+        ["Situation au:", format_date(balance.date_reference)],
+        ["Nombre de factures:", str(balance.totaux['nombre_factures'])],
+    ])
+    
+    headers = ["Client", "Projet"] + [libelle for _, libelle in balance.TRANCHES] + ["Total"]
+    data = [
+        [ligne['client__nom_complet'][:25], (ligne['projet__nom_projet'] or "Sans projet")[:25]]
+        + [format_currency(ligne[colonne]) for colonne in balance.COLONNES]
+        for ligne in balance.lignes
+    ]
+    data.append(
+        ["TOTAL:", ""] + [format_currency(balance.totaux[colonne]) for colonne in balance.COLONNES]
+    )
+    
+    col_widths = [4.5*cm, 4.5*cm] + [2.8*cm] * len(balance.COLONNES)
+    exporter.add_data_table(headers, data, col_widths)
+    
+    exporter.add_footer_info(f"Document généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')} - ETRAGC SARLU")
+    
+    return exporter.get_response()
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.invoicing.models import Facture
+
+
+class Command(BaseCommand):
+    help = "Passe en retard les factures échues non payées et met à jour leurs jours de retard"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Date de référence au format AAAA-MM-JJ (aujourd'hui par défaut)"
+        )
+
+    def handle(self, *args, **options):
+        aujourd_hui = None
+        if options['date']:
+            try:
+                aujourd_hui = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Date invalide : {options['date']} (format attendu AAAA-MM-JJ)")
+
+        nombre = Facture.actualiser_retards(aujourd_hui)
+        self.stdout.write(self.style.SUCCESS(f'✓ {nombre} facture(s) passée(s) en retard'))
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:42
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Round
+
+
+def initialiser_montants(apps, schema_editor):
+    """Calcule les montants TVA et TTC stockés à partir du montant HT existant"""
+    montant = models.DecimalField(max_digits=15, decimal_places=2)
+    zero = Value(Decimal('0'), output_field=montant)
+    cent = Value(Decimal('100'), output_field=montant)
+    
+    Devis = apps.get_model('invoicing', 'Devis')
+    Devis.objects.update(montant_tva=Case(
+        When(
+            appliquer_tva=True, taux_tva__isnull=False,
+            then=Round(F('montant_ht') * F('taux_tva') / cent, 2)
+        ),
+        default=zero,
+        output_field=montant,
+    ))
+    Devis.objects.update(montant_ttc=F('montant_ht') + F('montant_tva'))
+    
+    Facture = apps.get_model('invoicing', 'Facture')
+    Facture.objects.update(montant_tva=Round(F('montant_ht') * F('taux_tva') / cent, 2))
+    Facture.objects.update(montant_ttc=F('montant_ht') + F('montant_tva'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0002_add_tva_optional_and_statuts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devis',
+            name='montant_ttc',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Calculé automatiquement', max_digits=15, verbose_name='Montant TTC'),
+        ),
+        migrations.AddField(
+            model_name='devis',
+            name='montant_tva',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Calculé automatiquement', max_digits=15, verbose_name='Montant TVA'),
+        ),
+        migrations.AddField(
+            model_name='facture',
+            name='montant_ttc',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Calculé automatiquement', max_digits=15, verbose_name='Montant TTC'),
+        ),
+        migrations.AddField(
+            model_name='facture',
+            name='montant_tva',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Calculé automatiquement', max_digits=15, verbose_name='Montant TVA'),
+        ),
+        migrations.AddIndex(
+            model_name='devis',
+            index=models.Index(fields=['montant_ttc'], name='invoicing_d_montant_bcfb48_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['montant_ttc'], name='invoicing_f_montant_15b620_idx'),
+        ),
+        migrations.RunPython(initialiser_montants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:50
+
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import F, Value
+
+from apps.core.utils.sql import JoursEntre
+
+
+def initialiser_jours_retard(apps, schema_editor):
+    """Calcule les jours de retard des factures échues non payées"""
+    aujourd_hui = date.today()
+    Facture = apps.get_model('invoicing', 'Facture')
+    Facture.objects.filter(date_echeance__lt=aujourd_hui).exclude(
+        statut_paiement='Payée'
+    ).update(jours_retard=JoursEntre(Value(aujourd_hui), F('date_echeance')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0003_montants_stockes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facture',
+            name='jours_retard',
+            field=models.PositiveIntegerField(default=0, help_text='Mis à jour chaque nuit par la commande age_overdue_invoices', verbose_name='Jours de retard'),
+        ),
+        migrations.RunPython(initialiser_jours_retard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0004_jours_retard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['statut_paiement', 'date_echeance'], name='invoicing_f_statut__53c535_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='facture',
+            name='invoicing_f_statut__c3a40b_idx',
+        ),
+    ]
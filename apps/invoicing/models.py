@@ -1,10 +1,53 @@
-from django.db import models
+import json
+import logging
+
+from django.db import connection, models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.conf import settings
 from django.core.validators import MinValueValidator
-from datetime import datetime, timedelta
-from decimal import Decimal
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from apps.core.models import Parametre, SequenceNumerotation
+from apps.core.utils.bulk import creer_documents_en_masse
+from apps.core.utils.sql import JoursEntre
+
+logger = logging.getLogger(__name__)
+
+MONTANT = models.DecimalField(max_digits=15, decimal_places=2)
+ZERO = Value(Decimal('0'), output_field=MONTANT)
+CENT = Value(Decimal('100'), output_field=MONTANT)
+
+
+def arrondir(montant):
+    """Arrondit un montant au centime"""
+    return Decimal(str(montant)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def montant_lignes_sql(modele_ligne, champ_document):
+    """Sous-requête SQL : somme des quantite * prix_unitaire_ht des lignes du document"""
+    return Coalesce(Subquery(
+        modele_ligne.objects.filter(**{champ_document: OuterRef('pk')}).order_by().values(
+            champ_document
+        ).annotate(
+            total=Sum(F('quantite') * F('prix_unitaire_ht'), output_field=MONTANT)
+        ).values('total')
+    ), ZERO)
+
+
+class DevisQuerySet(models.QuerySet):
+    """QuerySet des devis"""
+    
+    def totaux(self):
+        """Totaux HT et TTC agrégés en base"""
+        return self.aggregate(
+            total_ht=Coalesce(Sum('montant_ht'), ZERO),
+            total_ttc=Coalesce(Sum('montant_ttc'), ZERO),
+        )
 
 
 class Devis(models.Model):
@@ -65,6 +108,20 @@ class Devis(models.Model):
         null=True,
         verbose_name='Taux TVA (%)'
     )
+    montant_tva = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Montant TVA',
+        help_text='Calculé automatiquement'
+    )
+    montant_ttc = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Montant TTC',
+        help_text='Calculé automatiquement'
+    )
     statut = models.CharField(
         max_length=20,
         choices=STATUT_CHOICES,
@@ -96,6 +153,8 @@ class Devis(models.Model):
         verbose_name='Date de modification'
     )
     
+    objects = DevisQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Devis'
         verbose_name_plural = 'Devis'
@@ -105,6 +164,7 @@ class Devis(models.Model):
             models.Index(fields=['client']),
             models.Index(fields=['statut']),
             models.Index(fields=['date_emission']),
+            models.Index(fields=['montant_ttc']),
         ]
     
     def __str__(self):
@@ -113,39 +173,25 @@ class Devis(models.Model):
     def save(self, *args, **kwargs):
         if not self.numero_devis:
             # Génération automatique du numéro de devis
-            year = datetime.now().year
-            last_devis = Devis.objects.filter(
-                numero_devis__startswith=f'DEV-{year}-'
-            ).order_by('numero_devis').last()
-            
-            if last_devis:
-                last_number = int(last_devis.numero_devis.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.numero_devis = f'DEV-{year}-{new_number:03d}'
+            self.numero_devis = SequenceNumerotation.prochain_code('DEV')
         
+        self.calculer_montants()
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('invoicing:devis_detail', kwargs={'pk': self.pk})
     
-    @property
-    def montant_tva(self):
-        """Calcule le montant de la TVA"""
+    def calculer_montants(self):
+        """Calcule les montants TVA et TTC à partir du montant HT"""
+        self.montant_ht = Decimal(str(self.montant_ht))
         if self.appliquer_tva and self.taux_tva:
-            return self.montant_ht * (Decimal(str(self.taux_tva)) / Decimal('100'))
-        return Decimal('0')
-    
-    @property
-    def montant_ttc(self):
-        """Calcule le montant TTC"""
-        return self.montant_ht + self.montant_tva
+            self.montant_tva = arrondir(self.montant_ht * Decimal(str(self.taux_tva)) / Decimal('100'))
+        else:
+            self.montant_tva = Decimal('0')
+        self.montant_ttc = self.montant_ht + self.montant_tva
     
     def is_expire(self):
         """Vérifie si le devis est expiré"""
-        from datetime import date
         return date.today() > self.date_validite
     
     def get_statut_badge_class(self):
@@ -162,11 +208,55 @@ class Devis(models.Model):
         return statut_classes.get(self.statut, 'bg-secondary')
     
     def calculer_montant_total(self):
-        """Recalcule le montant HT à partir des lignes"""
+        """Recalcule le montant HT à partir des lignes (agrégation SQL)"""
         if self.pk:
-            total = sum((ligne.montant_ht for ligne in self.lignes.all()), Decimal('0'))
-            self.montant_ht = total
+            self.montant_ht = self.lignes.aggregate(
+                total=Sum(F('quantite') * F('prix_unitaire_ht'), output_field=MONTANT)
+            )['total'] or Decimal('0')
             self.save()
+    
+    @staticmethod
+    def totaux_page(devis_list):
+        """
+        Totaux HT et TTC de devis déjà chargés (page d'une liste), mêmes clés que
+        DevisQuerySet.totaux() ; une page paginée peut être une simple liste
+        """
+        return {
+            'total_ht': sum((devis.montant_ht for devis in devis_list), Decimal('0')),
+            'total_ttc': sum((devis.montant_ttc for devis in devis_list), Decimal('0')),
+        }
+    
+    @classmethod
+    def actualiser_montants(cls, pks):
+        """
+        Recalcule les montants HT, TVA et TTC à partir des lignes en une seule requête
+        UPDATE ; à appeler une fois après l'enregistrement des lignes (formset)
+        """
+        montant_ht = montant_lignes_sql(LigneDevis, 'devis')
+        montant_tva = Case(
+            When(
+                appliquer_tva=True, taux_tva__isnull=False,
+                then=Round(montant_ht * F('taux_tva') / CENT, 2)
+            ),
+            default=ZERO,
+            output_field=MONTANT,
+        )
+        cls.objects.filter(pk__in=pks).update(
+            montant_ht=montant_ht,
+            montant_tva=montant_tva,
+            montant_ttc=montant_ht + montant_tva,
+        )
+    
+    @classmethod
+    def creer_en_masse(cls, documents, batch_size=1000):
+        """
+        Crée des devis avec leurs lignes par lots (import).
+        `documents` : liste de couples (devis, [lignes]) non enregistrés.
+        """
+        for devis, lignes in documents:
+            devis.montant_ht = sum((ligne.montant_ht for ligne in lignes), Decimal('0'))
+            devis.calculer_montants()
+        return creer_documents_en_masse(documents, 'numero_devis', 'DEV', 'devis', batch_size)
 
 
 class LigneDevis(models.Model):
@@ -223,21 +313,94 @@ class LigneDevis(models.Model):
     def montant_ht(self):
         """Calcule le montant HT de la ligne"""
         return Decimal(str(self.quantite)) * Decimal(str(self.prix_unitaire_ht))
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+
+
+class FactureQuerySet(models.QuerySet):
+    """QuerySet des factures"""
+    
+    def totaux(self):
+        """Totaux HT, TTC, payé et restant agrégés en base"""
+        return self.aggregate(
+            total_ht=Coalesce(Sum('montant_ht'), ZERO),
+            total_ttc=Coalesce(Sum('montant_ttc'), ZERO),
+            total_paye=Coalesce(Sum('montant_paye'), ZERO),
+            total_restant=Coalesce(Sum(F('montant_ttc') - F('montant_paye'), output_field=MONTANT), ZERO),
+        )
+    
+    def balance_agee(self, date_reference=None):
+        """
+        Reste à payer TTC des factures non soldées par client et par projet, réparti
+        en tranches d'ancienneté de l'échéance (TRANCHES_AGE) à `date_reference`.
+        
+        Le reste à payer est celui de la date de référence : les paiements datés
+        après elle sont rajoutés au reste dû actuel (montant TTC - montant payé), et
+        les factures sont retenues sur leur date d'émission et ce reste : factures non
+        soldées, ou soldées par des paiements postérieurs. Une seule requête groupée ;
+        la somme des paiements postérieurs n'est calculée que pour les factures qui
+        en ont reçu.
+        """
+        date_reference = date_reference or date.today()
+        restant_actuel = F('montant_ttc') - F('montant_paye')
+        paiements_posterieurs = PaiementFacture.objects.filter(date_paiement__gt=date_reference)
+        paye_apres = Subquery(
+            paiements_posterieurs.filter(facture=OuterRef('pk')).order_by().values('facture').annotate(
+                total=Sum('montant')
+            ).values('total'),
+            output_field=MONTANT
+        )
+        restant = Case(
+            When(pk__in=paiements_posterieurs.values('facture'), then=restant_actuel + paye_apres),
+            default=restant_actuel,
+            output_field=MONTANT
+        )
+        
+        def echeance_avant(jours):
+            return date_reference - timedelta(days=jours)
+        
+        def tranche(condition):
+            return Coalesce(Sum(Case(
+                When(condition, then=F('restant')), default=ZERO, output_field=MONTANT
+            )), ZERO)
+        
+        # Factures non soldées aujourd'hui (index (statut_paiement, date_echeance)),
+        # plus celles qui ne le sont que depuis des paiements postérieurs
+        return self.alias(restant=restant).filter(
+            Q(statut_paiement__in=Facture.STATUTS_NON_SOLDES) | Q(pk__in=paiements_posterieurs.values('facture')),
+            date_emission__lte=date_reference,
+            restant__gt=0,
+        ).values(
+            'client_id', 'client__nom_complet', 'projet_id', 'projet__nom_projet'
+        ).annotate(
+            non_echu=tranche(Q(date_echeance__gte=date_reference)),
+            jours_0_30=tranche(Q(date_echeance__lt=date_reference, date_echeance__gte=echeance_avant(30))),
+            jours_31_60=tranche(Q(date_echeance__lt=echeance_avant(30), date_echeance__gte=echeance_avant(60))),
+            jours_61_90=tranche(Q(date_echeance__lt=echeance_avant(60), date_echeance__gte=echeance_avant(90))),
+            jours_90_plus=tranche(Q(date_echeance__lt=echeance_avant(90))),
+            total=Coalesce(Sum('restant'), ZERO),
+            nombre_factures=Count('id'),
+        ).order_by('client__nom_complet', 'projet__nom_projet')
 
 
 class Facture(models.Model):
     """
     Modèle pour gérer les factures clients
     """
+    # Tranches de la balance âgée : (annotation, libellé)
+    TRANCHES_AGE = [
+        ('non_echu', 'Non échu'),
+        ('jours_0_30', '0-30 jours'),
+        ('jours_31_60', '31-60 jours'),
+        ('jours_61_90', '61-90 jours'),
+        ('jours_90_plus', '+90 jours'),
+    ]
+    
     STATUT_PAIEMENT_CHOICES = [
         ('Impayée', 'Impayée'),
         ('Partielle', 'Partielle'),
         ('Payée', 'Payée'),
         ('En_retard', 'En retard'),
     ]
+    STATUTS_NON_SOLDES = ['Impayée', 'Partielle', 'En_retard']
     
     numero_facture = models.CharField(
         max_length=50,
@@ -285,6 +448,20 @@ class Facture(models.Model):
         default=18.00,
         verbose_name='Taux TVA (%)'
     )
+    montant_tva = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Montant TVA',
+        help_text='Calculé automatiquement'
+    )
+    montant_ttc = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Montant TTC',
+        help_text='Calculé automatiquement'
+    )
     montant_paye = models.DecimalField(
         max_digits=15,
         decimal_places=2,
@@ -298,6 +475,11 @@ class Facture(models.Model):
         default='Impayée',
         verbose_name='Statut de paiement'
     )
+    jours_retard = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Jours de retard',
+        help_text='Mis à jour chaque nuit par la commande age_overdue_invoices'
+    )
     conditions_paiement = models.TextField(
         blank=True,
         null=True,
@@ -323,6 +505,8 @@ class Facture(models.Model):
         verbose_name='Date de modification'
     )
     
+    objects = FactureQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Facture'
         verbose_name_plural = 'Factures'
@@ -330,8 +514,9 @@ class Facture(models.Model):
         indexes = [
             models.Index(fields=['numero_facture']),
             models.Index(fields=['client']),
-            models.Index(fields=['statut_paiement']),
+            models.Index(fields=['statut_paiement', 'date_echeance']),
             models.Index(fields=['date_emission']),
+            models.Index(fields=['montant_ttc']),
         ]
     
     def __str__(self):
@@ -340,43 +525,23 @@ class Facture(models.Model):
     def save(self, *args, **kwargs):
         if not self.numero_facture:
             # Génération automatique du numéro de facture
-            year = datetime.now().year
-            last_facture = Facture.objects.filter(
-                numero_facture__startswith=f'FACT-{year}-'
-            ).order_by('numero_facture').last()
-            
-            if last_facture:
-                last_number = int(last_facture.numero_facture.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.numero_facture = f'FACT-{year}-{new_number:03d}'
+            self.numero_facture = SequenceNumerotation.prochain_code('FACT')
         
-        # Mise à jour du statut de paiement
-        if self.montant_paye >= self.montant_ttc:
-            self.statut_paiement = 'Payée'
-        elif self.montant_paye > 0:
-            self.statut_paiement = 'Partielle'
-        elif self.is_en_retard():
-            self.statut_paiement = 'En_retard'
-        else:
-            self.statut_paiement = 'Impayée'
+        # Mise à jour des montants et du statut de paiement
+        self.calculer_montants()
+        self.statut_paiement = self.calculer_statut_paiement()
+        self.jours_retard = self.get_jours_retard()
         
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('invoicing:facture_detail', kwargs={'pk': self.pk})
     
-    @property
-    def montant_tva(self):
-        """Calcule le montant de la TVA"""
-        return self.montant_ht * (Decimal(str(self.taux_tva)) / Decimal('100'))
-    
-    @property
-    def montant_ttc(self):
-        """Calcule le montant TTC"""
-        return self.montant_ht + self.montant_tva
+    def calculer_montants(self):
+        """Calcule les montants TVA et TTC à partir du montant HT"""
+        self.montant_ht = Decimal(str(self.montant_ht))
+        self.montant_tva = arrondir(self.montant_ht * Decimal(str(self.taux_tva)) / Decimal('100'))
+        self.montant_ttc = self.montant_ht + self.montant_tva
     
     @property
     def montant_restant(self):
@@ -385,13 +550,11 @@ class Facture(models.Model):
     
     def is_en_retard(self):
         """Vérifie si la facture est en retard"""
-        from datetime import date
         return date.today() > self.date_echeance and self.statut_paiement != 'Payée'
     
     def get_jours_retard(self):
         """Retourne le nombre de jours de retard"""
         if self.is_en_retard():
-            from datetime import date
             return (date.today() - self.date_echeance).days
         return 0
     
@@ -406,23 +569,132 @@ class Facture(models.Model):
         return statut_classes.get(self.statut_paiement, 'bg-secondary')
     
     def calculer_montant_total(self):
-        """Recalcule le montant HT à partir des lignes"""
+        """Recalcule le montant HT à partir des lignes (agrégation SQL)"""
         if self.pk:
-            total = sum((ligne.montant_ht for ligne in self.lignes.all()), Decimal('0'))
-            self.montant_ht = total
+            self.montant_ht = self.lignes.aggregate(
+                total=Sum(F('quantite') * F('prix_unitaire_ht'), output_field=MONTANT)
+            )['total'] or Decimal('0')
             self.save()
     
-    def mettre_a_jour_statut_paiement(self):
-        """Met à jour le statut de paiement en fonction du montant payé"""
+    @staticmethod
+    def totaux_page(factures):
+        """
+        Totaux HT, TTC, payé et restant de factures déjà chargées (page d'une liste),
+        mêmes clés que FactureQuerySet.totaux() ; une page paginée peut être une simple liste
+        """
+        totaux = {'total_ht': Decimal('0'), 'total_ttc': Decimal('0'), 'total_paye': Decimal('0')}
+        for facture in factures:
+            totaux['total_ht'] += facture.montant_ht
+            totaux['total_ttc'] += facture.montant_ttc
+            totaux['total_paye'] += facture.montant_paye
+        totaux['total_restant'] = totaux['total_ttc'] - totaux['total_paye']
+        return totaux
+    
+    @staticmethod
+    def expression_statut_paiement(montant_ttc=F('montant_ttc'), montant_paye=F('montant_paye')):
+        """Expression SQL du statut de paiement (même règle que calculer_statut_paiement)"""
+        return Case(
+            When(GreaterThanOrEqual(montant_paye, montant_ttc), then=Value('Payée')),
+            When(GreaterThan(montant_paye, ZERO), then=Value('Partielle')),
+            When(date_echeance__lt=date.today(), then=Value('En_retard')),
+            default=Value('Impayée'),
+            output_field=models.CharField(),
+        )
+    
+    @classmethod
+    def actualiser_montants(cls, pks):
+        """
+        Recalcule les montants HT, TVA, TTC et le statut de paiement à partir
+        des lignes en une seule requête UPDATE ; à appeler une fois après
+        l'enregistrement des lignes (formset)
+        """
+        montant_ht = montant_lignes_sql(LigneFacture, 'facture')
+        montant_tva = Round(montant_ht * F('taux_tva') / CENT, 2)
+        montant_ttc = montant_ht + montant_tva
+        cls.objects.filter(pk__in=pks).update(
+            montant_ht=montant_ht,
+            montant_tva=montant_tva,
+            montant_ttc=montant_ttc,
+            statut_paiement=cls.expression_statut_paiement(montant_ttc=montant_ttc),
+        )
+    
+    @classmethod
+    def verrouiller(cls, pks):
+        """
+        Verrouille les lignes des factures (SELECT ... FOR UPDATE) dans un ordre déterministe.
+        Sans verrou de ligne (SQLite), c'est l'UPDATE suivant qui prend le verrou d'écriture :
+        une lecture préalable empêcherait la transaction de devenir écrivain.
+        """
+        if connection.features.has_select_for_update:
+            list(cls.objects.select_for_update().filter(pk__in=pks).order_by('pk').values_list('pk', flat=True))
+    
+    @classmethod
+    def appliquer_paiement(cls, pk, montant):
+        """
+        Ajoute `montant` (négatif pour une annulation) au montant payé et recalcule
+        le statut de paiement, en une seule requête UPDATE
+        """
+        montant_paye = F('montant_paye') + Value(Decimal(str(montant)), output_field=MONTANT)
+        # Le statut est affecté en premier : MySQL évalue les affectations de gauche
+        # à droite et verrait sinon le montant payé déjà incrémenté
+        cls.objects.filter(pk=pk).update(
+            statut_paiement=cls.expression_statut_paiement(montant_paye=montant_paye),
+            montant_paye=montant_paye,
+        )
+    
+    @classmethod
+    def actualiser_retards(cls, aujourd_hui=None):
+        """
+        Passe en retard toutes les factures impayées échues (une requête UPDATE ensembliste),
+        met à jour les jours de retard et enregistre le résultat de l'exécution.
+        Retourne le nombre de factures passées en retard.
+        """
+        aujourd_hui = aujourd_hui or date.today()
+        echues = cls.objects.filter(date_echeance__lt=aujourd_hui).exclude(statut_paiement='Payée')
+        
+        with transaction.atomic():
+            nombre = echues.filter(statut_paiement='Impayée').update(statut_paiement='En_retard')
+            echues.update(jours_retard=JoursEntre(Value(aujourd_hui), F('date_echeance')))
+            cls.objects.filter(
+                Q(statut_paiement='Payée') | Q(date_echeance__gte=aujourd_hui), jours_retard__gt=0
+            ).update(jours_retard=0)
+        
+        Parametre.set_valeur(
+            'factures_retard_derniere_execution',
+            json.dumps({'date': aujourd_hui.isoformat(), 'factures_passees_en_retard': nombre}),
+            description='Dernière exécution du passage en retard des factures',
+            type_donnee='JSON'
+        )
+        logger.info('%s facture(s) passée(s) en retard au %s', nombre, aujourd_hui)
+        return nombre
+    
+    def calculer_statut_paiement(self):
+        """Retourne le statut de paiement correspondant au montant payé et à l'échéance"""
         if self.montant_paye >= self.montant_ttc:
-            self.statut_paiement = 'Payée'
+            return 'Payée'
         elif self.montant_paye > 0:
-            self.statut_paiement = 'Partielle'
+            return 'Partielle'
         elif self.is_en_retard():
-            self.statut_paiement = 'En_retard'
-        else:
-            self.statut_paiement = 'Impayée'
+            return 'En_retard'
+        return 'Impayée'
+    
+    def mettre_a_jour_statut_paiement(self):
+        """Met à jour le statut de paiement en fonction du montant payé"""
+        self.statut_paiement = self.calculer_statut_paiement()
         self.save()
+    
+    @classmethod
+    def creer_en_masse(cls, documents, batch_size=1000):
+        """
+        Crée des factures avec leurs lignes par lots (import).
+        `documents` : liste de couples (facture, [lignes]) non enregistrés ;
+        montant HT et statut de paiement sont calculés comme dans save().
+        """
+        for facture, lignes in documents:
+            facture.montant_ht = sum((ligne.montant_ht for ligne in lignes), Decimal('0'))
+            facture.calculer_montants()
+            facture.statut_paiement = facture.calculer_statut_paiement()
+        return creer_documents_en_masse(documents, 'numero_facture', 'FACT', 'facture', batch_size)
 
 
 class LigneFacture(models.Model):
@@ -479,9 +751,6 @@ class LigneFacture(models.Model):
     def montant_ht(self):
         """Calcule le montant HT de la ligne"""
         return Decimal(str(self.quantite)) * Decimal(str(self.prix_unitaire_ht))
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
 
 
 class PaiementFacture(models.Model):
@@ -550,10 +819,25 @@ class PaiementFacture(models.Model):
         return f"Paiement {self.montant} GNF - {self.facture.numero_facture}"
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Mettre à jour le montant payé de la facture
-        total_paye = self.facture.paiements.aggregate(
-            total=models.Sum('montant')
-        )['total'] or 0
-        self.facture.montant_paye = total_paye
-        self.facture.save()
+        # Verrouiller la facture et y reporter la différence de montant avant
+        # d'enregistrer le paiement, dans la même transaction
+        with transaction.atomic():
+            ancien = None
+            if self.pk:
+                ancien = PaiementFacture.objects.filter(pk=self.pk).values('facture_id', 'montant').first()
+            
+            if ancien and ancien['facture_id'] != self.facture_id:
+                Facture.verrouiller([self.facture_id, ancien['facture_id']])
+                Facture.appliquer_paiement(ancien['facture_id'], -ancien['montant'])
+                ancien = None
+            else:
+                Facture.verrouiller([self.facture_id])
+            Facture.appliquer_paiement(self.facture_id, self.montant - (ancien['montant'] if ancien else 0))
+            
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Facture.verrouiller([self.facture_id])
+            Facture.appliquer_paiement(self.facture_id, -self.montant)
+            return super().delete(*args, **kwargs)
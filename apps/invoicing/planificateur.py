@@ -0,0 +1,51 @@
+"""
+Planificateur en processus du passage en retard des factures échues.
+
+Optionnel (settings.FACTURES_RETARD_AUTO) : en production, une tâche planifiée
+lançant `manage.py age_overdue_invoices` reste préférable.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_minuteur = None
+_verrou = threading.Lock()
+
+
+def _executer():
+    from apps.invoicing.models import Facture
+
+    try:
+        Facture.actualiser_retards()
+    except Exception:
+        logger.exception('Échec du passage en retard des factures')
+    finally:
+        close_old_connections()
+        _programmer(settings.FACTURES_RETARD_INTERVALLE)
+
+
+def _programmer(delai):
+    global _minuteur
+    with _verrou:
+        _minuteur = threading.Timer(delai, _executer)
+        _minuteur.daemon = True
+        _minuteur.start()
+
+
+def demarrer():
+    """Démarre le minuteur une seule fois par processus (première exécution après une minute)"""
+    if _minuteur is None:
+        _programmer(60)
+
+
+def arreter():
+    """Arrête le minuteur"""
+    global _minuteur
+    with _verrou:
+        if _minuteur is not None:
+            _minuteur.cancel()
+            _minuteur = None
@@ -0,0 +1,39 @@
+"""
+Calcul de la balance âgée des créances clients
+"""
+from datetime import date
+
+from apps.core.utils.requetes import DateReferenceMixin
+
+from .models import Facture
+
+
+class BalanceAgee(DateReferenceMixin):
+    """
+    Balance âgée des factures non soldées à une date de référence, par client et
+    par projet, calculée en une seule requête groupée
+    """
+    TRANCHES = Facture.TRANCHES_AGE
+    COLONNES = [cle for cle, _ in TRANCHES] + ['total']
+
+    def __init__(self, date_reference=None):
+        self.date_reference = date_reference or date.today()
+        self.lignes = list(Facture.objects.balance_agee(self.date_reference))
+        self.totaux = {
+            colonne: sum(ligne[colonne] for ligne in self.lignes)
+            for colonne in self.COLONNES
+        }
+        self.totaux['nombre_factures'] = sum(ligne['nombre_factures'] for ligne in self.lignes)
+
+    def get_context(self):
+        """Contexte de template de la balance âgée"""
+        return {
+            'date_reference': self.date_reference,
+            'tranches': self.TRANCHES,
+            'lignes': [
+                dict(ligne, montants=[ligne[colonne] for colonne in self.COLONNES])
+                for ligne in self.lignes
+            ],
+            'totaux': [self.totaux[colonne] for colonne in self.COLONNES],
+            'nombre_factures': self.totaux['nombre_factures'],
+        }
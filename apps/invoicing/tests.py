@@ -1,9 +1,20 @@
-from django.test import TestCase
+from django.test import TestCase, Client as TestClient, override_settings
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from datetime import date, timedelta
-from apps.invoicing.models import Devis, LigneDevis
+import threading
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.urls import reverse
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from apps.invoicing.models import Devis, LigneDevis, Facture, LigneFacture, PaiementFacture
 from apps.clients.models import Client
+from apps.core.models import Parametre
 from apps.projects.models import Projet
 
 User = get_user_model()
@@ -179,3 +190,748 @@ class DevisModelTest(TestCase):
             )
             
             self.assertEqual(devis.get_statut_badge_class(), badge_attendu)
+
+
+class CreationEnMasseTest(TestCase):
+    """Tests pour la création en masse de devis et factures"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        self.lignes = [
+            (Decimal('3.00'), Decimal('150000.00')),
+            (Decimal('2.50'), Decimal('80000.00')),
+        ]
+    
+    def nouvelle_facture(self, **kwargs):
+        valeurs = {
+            'client': self.client,
+            'date_emission': date.today() - timedelta(days=60),
+            'date_echeance': date.today() + timedelta(days=30),
+            'montant_ht': Decimal('0'),
+            'taux_tva': Decimal('18.00'),
+            'montant_paye': Decimal('0'),
+            'cree_par': self.user,
+        }
+        valeurs.update(kwargs)
+        return Facture(**valeurs)
+    
+    def nouvelles_lignes(self, modele):
+        return [
+            modele(ordre=i, designation=f'Ligne {i}', quantite=quantite, prix_unitaire_ht=prix)
+            for i, (quantite, prix) in enumerate(self.lignes, start=1)
+        ]
+    
+    def test_devis_identiques_au_chemin_unitaire(self):
+        """Test : Même montant que la création ligne par ligne, numéros consécutifs"""
+        reference = Devis.objects.create(
+            client=self.client,
+            date_emission=date.today(),
+            date_validite=date.today() + timedelta(days=30),
+            cree_par=self.user
+        )
+        for ligne in self.nouvelles_lignes(LigneDevis):
+            ligne.devis = reference
+            ligne.save()
+        reference.calculer_montant_total()
+        
+        devis = Devis.creer_en_masse([
+            (Devis(
+                client=self.client,
+                date_emission=date.today(),
+                date_validite=date.today() + timedelta(days=30),
+                cree_par=self.user
+            ), self.nouvelles_lignes(LigneDevis))
+            for _ in range(3)
+        ])
+        
+        numero_reference = int(reference.numero_devis.split('-')[-1])
+        for i, devis_cree in enumerate(devis, start=1):
+            devis_cree = Devis.objects.get(pk=devis_cree.pk)
+            self.assertEqual(devis_cree.montant_ht, reference.montant_ht)
+            self.assertEqual(devis_cree.montant_ttc, reference.montant_ttc)
+            self.assertEqual(devis_cree.lignes.count(), 2)
+            self.assertEqual(int(devis_cree.numero_devis.split('-')[-1]), numero_reference + i)
+    
+    def test_statuts_de_paiement_identiques(self):
+        """Test : Les statuts de paiement sont ceux calculés par save()"""
+        cas = [
+            {},
+            {'date_echeance': date.today() - timedelta(days=5)},
+            {'montant_paye': Decimal('100000.00')},
+            {'montant_paye': Decimal('1000000.00')},
+        ]
+        for valeurs in cas:
+            reference = self.nouvelle_facture(**valeurs)
+            reference.save()
+            for ligne in self.nouvelles_lignes(LigneFacture):
+                ligne.facture = reference
+                ligne.save()
+            reference.calculer_montant_total()
+            reference.mettre_a_jour_statut_paiement()
+            
+            facture, = Facture.creer_en_masse(
+                [(self.nouvelle_facture(**valeurs), self.nouvelles_lignes(LigneFacture))]
+            )
+            facture = Facture.objects.get(pk=facture.pk)
+            self.assertEqual(facture.montant_ht, reference.montant_ht)
+            self.assertEqual(facture.statut_paiement, reference.statut_paiement)
+    
+    def test_nombre_de_requetes_par_lot(self):
+        """Test : Le nombre de requêtes dépend du nombre de lots, pas du nombre de documents"""
+        documents = [
+            (self.nouvelle_facture(), self.nouvelles_lignes(LigneFacture))
+            for _ in range(50)
+        ]
+        with CaptureQueriesContext(connection) as requetes:
+            Facture.creer_en_masse(documents, batch_size=100)
+        sql = [
+            requete['sql'] for requete in requetes.captured_queries
+            if 'SAVEPOINT' not in requete['sql']
+        ]
+        # Création du compteur de numérotation + un INSERT d'entêtes + un INSERT de lignes
+        self.assertEqual(len([requete for requete in sql if requete.startswith('INSERT')]), 3)
+        self.assertLessEqual(len(sql), 6)
+        self.assertEqual(LigneFacture.objects.count(), 100)
+
+
+class CreationEnMasseDebitTest(TestCase):
+    """Test de débit : import de 100 000 lignes de factures"""
+    NOMBRE_FACTURES = 1000
+    LIGNES_PAR_FACTURE = 100
+    
+    def test_import_100k_lignes(self):
+        """Test : 100 000 lignes importées par lots avec des numéros uniques"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        
+        documents = [
+            (
+                Facture(
+                    client=client,
+                    date_emission=date.today(),
+                    date_echeance=date.today() + timedelta(days=30),
+                    taux_tva=Decimal('18.00'),
+                    montant_paye=Decimal('0'),
+                    cree_par=user
+                ),
+                [
+                    LigneFacture(
+                        ordre=j,
+                        designation=f'Ligne {j}',
+                        quantite=Decimal('1.00'),
+                        prix_unitaire_ht=Decimal(1000 + j)
+                    )
+                    for j in range(self.LIGNES_PAR_FACTURE)
+                ]
+            )
+            for _ in range(self.NOMBRE_FACTURES)
+        ]
+        
+        with CaptureQueriesContext(connection) as requetes:
+            Facture.creer_en_masse(documents, batch_size=1000)
+        
+        total_lignes = self.NOMBRE_FACTURES * self.LIGNES_PAR_FACTURE
+        self.assertEqual(LigneFacture.objects.count(), total_lignes)
+        self.assertEqual(
+            Facture.objects.values('numero_facture').distinct().count(),
+            self.NOMBRE_FACTURES
+        )
+        montant_attendu = sum(Decimal(1000 + j) for j in range(self.LIGNES_PAR_FACTURE))
+        self.assertFalse(Facture.objects.exclude(montant_ht=montant_attendu).exists())
+        # Insertions groupées : au moins une centaine de lignes par requête
+        # (SQLite découpe les lots selon sa limite de paramètres)
+        self.assertLess(len(requetes.captured_queries), total_lignes // 100)
+
+
+class MontantsStockesTest(TestCase):
+    """Tests pour les montants TVA et TTC stockés"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        self.facture = Facture.objects.create(
+            client=self.client,
+            date_emission=date.today(),
+            date_echeance=date.today() + timedelta(days=30),
+            montant_ht=Decimal('0'),
+            taux_tva=Decimal('18.00'),
+            montant_paye=Decimal('0'),
+            cree_par=self.user
+        )
+    
+    def ajouter_ligne(self, quantite, prix):
+        ligne = LigneFacture.objects.create(
+            facture=self.facture,
+            designation='Ligne',
+            quantite=Decimal(quantite),
+            prix_unitaire_ht=Decimal(prix)
+        )
+        Facture.actualiser_montants([self.facture.pk])
+        return ligne
+    
+    def test_montants_maintenus_par_les_lignes(self):
+        """Test : Le recalcul après ajout ou suppression de lignes met à jour HT, TVA et TTC en base"""
+        ligne = self.ajouter_ligne('2.00', '100000.00')
+        self.ajouter_ligne('1.50', '33333.33')
+        self.facture.refresh_from_db()
+        self.assertEqual(self.facture.montant_ht, Decimal('250000.00'))
+        self.assertEqual(self.facture.montant_tva, Decimal('45000.00'))
+        self.assertEqual(self.facture.montant_ttc, Decimal('295000.00'))
+        self.assertEqual(self.facture.statut_paiement, 'Impayée')
+        
+        ligne.delete()
+        Facture.actualiser_montants([self.facture.pk])
+        self.facture.refresh_from_db()
+        self.assertEqual(self.facture.montant_ht, Decimal('50000.00'))
+        self.assertEqual(self.facture.montant_ttc, Decimal('59000.00'))
+    
+    def test_sql_identique_au_calcul_python(self):
+        """Test : Le recalcul SQL donne les mêmes montants que save()"""
+        self.ajouter_ligne('3.00', '12345.67')
+        self.facture.refresh_from_db()
+        montants_sql = (self.facture.montant_ht, self.facture.montant_tva, self.facture.montant_ttc)
+        
+        self.facture.calculer_montant_total()
+        self.facture.refresh_from_db()
+        self.assertEqual(
+            (self.facture.montant_ht, self.facture.montant_tva, self.facture.montant_ttc),
+            montants_sql
+        )
+    
+    def test_tri_filtre_et_totaux_en_base(self):
+        """Test : Tri, filtre et totaux sur les colonnes stockées"""
+        self.ajouter_ligne('1.00', '100000.00')
+        autre = Facture.objects.create(
+            client=self.client,
+            date_emission=date.today(),
+            date_echeance=date.today() + timedelta(days=30),
+            montant_ht=Decimal('500000.00'),
+            taux_tva=Decimal('18.00'),
+            montant_paye=Decimal('100000.00'),
+            cree_par=self.user
+        )
+        
+        self.assertEqual(list(Facture.objects.order_by('-montant_ttc')), [autre, self.facture])
+        self.assertEqual(list(Facture.objects.filter(montant_ttc__gt=200000)), [autre])
+        
+        totaux = Facture.objects.totaux()
+        self.assertEqual(totaux['total_ttc'], Decimal('708000.00'))
+        self.assertEqual(totaux['total_paye'], Decimal('100000.00'))
+        self.assertEqual(totaux['total_restant'], Decimal('608000.00'))
+        self.assertEqual(self.client.get_factures_impayees(), Decimal('608000.00'))
+    
+    def test_formset_un_seul_recalcul(self):
+        """Test : Enregistrer une facture et ses lignes recalcule les montants une seule fois"""
+        client = TestClient()
+        client.force_login(self.user)
+        donnees = {
+            'client': self.client.pk,
+            'date_emission': date.today().isoformat(),
+            'date_echeance': (date.today() + timedelta(days=30)).isoformat(),
+            'montant_ht': '0',
+            'lignes-TOTAL_FORMS': '5',
+            'lignes-INITIAL_FORMS': '0',
+            'lignes-MIN_NUM_FORMS': '1',
+            'lignes-MAX_NUM_FORMS': '1000',
+        }
+        for numero in range(5):
+            donnees[f'lignes-{numero}-quantite'] = '2'
+            donnees[f'lignes-{numero}-prix_unitaire_ht'] = '10000'
+        
+        with CaptureQueriesContext(connection) as requetes:
+            with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+                response = client.post(reverse('invoicing:facture_create'), donnees)
+        
+        self.assertEqual(response.status_code, 302)
+        facture = Facture.objects.latest('pk')
+        self.assertEqual(facture.lignes.count(), 5)
+        self.assertEqual(facture.montant_ttc, Decimal('118000.00'))
+        recalculs = [
+            requete for requete in requetes.captured_queries
+            if requete['sql'].startswith('UPDATE "invoicing_facture"')
+        ]
+        self.assertEqual(len(recalculs), 1)
+
+
+
+class ListesPagineesTest(TestCase):
+    """Tests des listes de devis et de factures au-delà du seuil de comptage exact"""
+    NOMBRE = 1001
+    
+    def setUp(self):
+        """Préparation des données de test : 1 001 devis et 1 001 factures"""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        montants = {
+            'montant_ht': Decimal('100000.00'),
+            'taux_tva': Decimal('18.00'),
+            'montant_tva': Decimal('18000.00'),
+            'montant_ttc': Decimal('118000.00'),
+        }
+        Devis.objects.bulk_create([
+            Devis(
+                numero_devis=f'DEV-TEST-{numero:06d}', client=client, date_emission=date.today(),
+                date_validite=date.today() + timedelta(days=30), cree_par=self.user, **montants
+            )
+            for numero in range(self.NOMBRE)
+        ])
+        Facture.objects.bulk_create([
+            Facture(
+                numero_facture=f'FACT-TEST-{numero:06d}', client=client, date_emission=date.today(),
+                date_echeance=date.today() + timedelta(days=30), montant_paye=Decimal('18000.00'),
+                cree_par=self.user, **montants
+            )
+            for numero in range(self.NOMBRE)
+        ])
+        self.client.force_login(self.user)
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_liste_des_devis(self):
+        """Test : Les totaux de page de la liste des devis en comptage estimé"""
+        reponse = self.client.get(reverse('invoicing:devis_list'), {'page': 2})
+        
+        self.assertEqual(reponse.status_code, 200)
+        self.assertFalse(reponse.context['paginator'].compte_exact)
+        self.assertEqual(reponse.context['total_ht'], Decimal('2000000.00'))
+        self.assertEqual(reponse.context['total_ttc'], Decimal('2360000.00'))
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_liste_des_factures(self):
+        """Test : Les totaux de page de la liste des factures en comptage estimé"""
+        reponse = self.client.get(reverse('invoicing:facture_list'), {'page': 2})
+        
+        self.assertEqual(reponse.status_code, 200)
+        self.assertFalse(reponse.context['paginator'].compte_exact)
+        self.assertEqual(reponse.context['total_ttc'], Decimal('2360000.00'))
+        self.assertEqual(reponse.context['total_paye'], Decimal('360000.00'))
+        self.assertEqual(reponse.context['total_restant'], Decimal('2000000.00'))
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_liste_filtree_exacte(self):
+        """Test : Les totaux de page d'une liste filtrée comptée exactement"""
+        reponse = self.client.get(reverse('invoicing:facture_list'), {'search': 'FACT-TEST-00000'})
+        
+        self.assertTrue(reponse.context['paginator'].compte_exact)
+        self.assertEqual(reponse.context['paginator'].count, 10)
+        self.assertEqual(reponse.context['total_ttc'], Decimal('1180000.00'))
+
+def creer_facture_test(client, user, montant_ht='100000.00'):
+    """Crée une facture de test (TVA 18 %)"""
+    return Facture.objects.create(
+        client=client,
+        date_emission=date.today(),
+        date_echeance=date.today() + timedelta(days=30),
+        montant_ht=Decimal(montant_ht),
+        taux_tva=Decimal('18.00'),
+        montant_paye=Decimal('0'),
+        cree_par=user
+    )
+
+
+class PaiementFactureTest(TestCase):
+    """Tests pour l'enregistrement des paiements de factures"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        self.facture = creer_facture_test(self.client, self.user)
+    
+    def payer(self, montant, facture=None):
+        return PaiementFacture.objects.create(
+            facture=facture or self.facture,
+            date_paiement=date.today(),
+            montant=Decimal(montant),
+            mode_paiement='Espèces',
+            enregistre_par=self.user
+        )
+    
+    def test_une_seule_ecriture_de_facture(self):
+        """Test : Un paiement déclenche exactement une écriture sur la facture"""
+        with CaptureQueriesContext(connection) as requetes:
+            self.payer('50000.00')
+        ecritures = [
+            requete['sql'] for requete in requetes.captured_queries
+            if requete['sql'].startswith('UPDATE "invoicing_facture"')
+        ]
+        self.assertEqual(len(ecritures), 1)
+        
+        self.facture.refresh_from_db()
+        self.assertEqual(self.facture.montant_paye, Decimal('50000.00'))
+        self.assertEqual(self.facture.statut_paiement, 'Partielle')
+    
+    def test_statut_derive_du_montant_paye(self):
+        """Test : Le statut suit les paiements, modifications et suppressions"""
+        paiement = self.payer('18000.00')
+        self.payer('100000.00')
+        self.facture.refresh_from_db()
+        self.assertEqual(self.facture.montant_paye, Decimal('118000.00'))
+        self.assertEqual(self.facture.statut_paiement, 'Payée')
+        
+        paiement.montant = Decimal('10000.00')
+        paiement.save()
+        self.facture.refresh_from_db()
+        self.assertEqual(self.facture.montant_paye, Decimal('110000.00'))
+        self.assertEqual(self.facture.statut_paiement, 'Partielle')
+        
+        PaiementFacture.objects.exclude(pk=paiement.pk).get().delete()
+        paiement.delete()
+        self.facture.refresh_from_db()
+        self.assertEqual(self.facture.montant_paye, Decimal('0'))
+        self.assertEqual(self.facture.statut_paiement, 'Impayée')
+    
+    def test_changement_de_facture(self):
+        """Test : Déplacer un paiement vers une autre facture met à jour les deux"""
+        autre = creer_facture_test(self.client, self.user)
+        paiement = self.payer('30000.00')
+        paiement.facture = autre
+        paiement.save()
+        
+        self.facture.refresh_from_db()
+        autre.refresh_from_db()
+        self.assertEqual(self.facture.montant_paye, Decimal('0'))
+        self.assertEqual(autre.montant_paye, Decimal('30000.00'))
+
+
+class PaiementFactureConcurrenceTest(TransactionTestCase):
+    """Test de concurrence : plusieurs caissiers encaissent la même facture"""
+    NOMBRE_THREADS = 8
+    PAIEMENTS_PAR_THREAD = 25
+    
+    def test_aucune_mise_a_jour_perdue(self):
+        """Test : Le montant payé est la somme exacte des paiements concurrents"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        facture = creer_facture_test(client, user, montant_ht='1000000.00')
+        erreurs = []
+        
+        def encaisser():
+            try:
+                for _ in range(self.PAIEMENTS_PAR_THREAD):
+                    PaiementFacture.objects.create(
+                        facture_id=facture.pk,
+                        date_paiement=date.today(),
+                        montant=Decimal('1000.00'),
+                        mode_paiement='Espèces',
+                        enregistre_par=user
+                    )
+            except Exception as exc:
+                erreurs.append(exc)
+            finally:
+                connections.close_all()
+        
+        threads = [threading.Thread(target=encaisser) for _ in range(self.NOMBRE_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(erreurs, [])
+        facture.refresh_from_db()
+        total = Decimal('1000.00') * self.NOMBRE_THREADS * self.PAIEMENTS_PAR_THREAD
+        self.assertEqual(facture.montant_paye, total)
+        self.assertEqual(facture.statut_paiement, 'Partielle')
+
+
+class FacturesEnRetardTest(TestCase):
+    """Tests pour le passage en retard des factures échues"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client_facture = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        # Échéance à J+30 : en retard de 10 jours au jour de référence J+40
+        self.impayee = creer_facture_test(self.client_facture, self.user)
+        self.partielle = creer_facture_test(self.client_facture, self.user)
+        Facture.appliquer_paiement(self.partielle.pk, '50000.00')
+        self.payee = creer_facture_test(self.client_facture, self.user)
+        Facture.appliquer_paiement(self.payee.pk, '118000.00')
+        self.reference = date.today() + timedelta(days=40)
+    
+    def test_passage_en_retard(self):
+        """Test : Seules les factures impayées échues passent en retard"""
+        nombre = Facture.actualiser_retards(self.reference)
+        
+        self.assertEqual(nombre, 1)
+        statuts = dict(Facture.objects.values_list('pk', 'statut_paiement'))
+        self.assertEqual(statuts[self.impayee.pk], 'En_retard')
+        self.assertEqual(statuts[self.partielle.pk], 'Partielle')
+        self.assertEqual(statuts[self.payee.pk], 'Payée')
+    
+    def test_jours_retard(self):
+        """Test : Les jours de retard sont stockés pour les factures non payées"""
+        Facture.actualiser_retards(self.reference)
+        
+        jours = dict(Facture.objects.values_list('pk', 'jours_retard'))
+        self.assertEqual(jours[self.impayee.pk], 10)
+        self.assertEqual(jours[self.partielle.pk], 10)
+        self.assertEqual(jours[self.payee.pk], 0)
+    
+    def test_execution_repetee(self):
+        """Test : Une seconde exécution ne repasse aucune facture et avance les jours"""
+        Facture.actualiser_retards(self.reference)
+        nombre = Facture.actualiser_retards(self.reference + timedelta(days=5))
+        
+        self.assertEqual(nombre, 0)
+        self.impayee.refresh_from_db()
+        self.assertEqual(self.impayee.jours_retard, 15)
+    
+    def test_remise_a_zero_apres_paiement(self):
+        """Test : Une facture soldée après échéance n'a plus de jours de retard"""
+        Facture.actualiser_retards(self.reference)
+        Facture.appliquer_paiement(self.impayee.pk, '118000.00')
+        Facture.actualiser_retards(self.reference)
+        
+        self.impayee.refresh_from_db()
+        self.assertEqual(self.impayee.statut_paiement, 'Payée')
+        self.assertEqual(self.impayee.jours_retard, 0)
+    
+    def test_une_seule_mise_a_jour_de_statut(self):
+        """Test : Le passage en retard est une seule requête UPDATE ensembliste"""
+        for _ in range(20):
+            creer_facture_test(self.client_facture, self.user)
+        with CaptureQueriesContext(connection) as requetes:
+            nombre = Facture.actualiser_retards(self.reference)
+        
+        self.assertEqual(nombre, 21)
+        mises_a_jour = [
+            requete['sql'] for requete in requetes.captured_queries
+            if requete['sql'].startswith('UPDATE "invoicing_facture" SET "statut_paiement"')
+        ]
+        self.assertEqual(len(mises_a_jour), 1)
+    
+    def test_execution_enregistree(self):
+        """Test : Le nombre de factures passées en retard est enregistré"""
+        Facture.actualiser_retards(self.reference)
+        
+        resultat = Parametre.get_valeur('factures_retard_derniere_execution')
+        self.assertEqual(resultat['date'], self.reference.isoformat())
+        self.assertEqual(resultat['factures_passees_en_retard'], 1)
+    
+    def test_commande(self):
+        """Test : La commande age_overdue_invoices accepte une date de référence"""
+        sortie = StringIO()
+        call_command('age_overdue_invoices', date=self.reference.isoformat(), stdout=sortie)
+        
+        self.assertIn('1 facture(s) passée(s) en retard', sortie.getvalue())
+        self.impayee.refresh_from_db()
+        self.assertEqual(self.impayee.statut_paiement, 'En_retard')
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_compteurs_accueil(self):
+        """Test : L'accueil compte les factures non soldées et leur reste dû TTC"""
+        Facture.actualiser_retards(self.reference)
+        self.client.force_login(self.user)
+        
+        stats = self.client.get(reverse('invoicing:home')).context['stats']
+        
+        self.assertEqual(stats['total_factures'], 3)
+        self.assertEqual(stats['factures_impayees'], 2)
+        self.assertEqual(stats['factures_partielles'], 1)
+        self.assertEqual(stats['factures_en_retard'], 1)
+        self.assertEqual(stats['montant_a_recevoir'], Decimal('186000.00'))
+
+
+class BalanceAgeeTest(TestCase):
+    """Tests pour la balance âgée des créances"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client_a = Client.objects.create(nom_complet='Client A', telephone='622000000')
+        self.client_b = Client.objects.create(nom_complet='Client B', telephone='622000001')
+        self.projet = Projet.objects.create(
+            code_projet='PROJ-TEST-001',
+            nom_projet='Projet Test',
+            client=self.client_a,
+            montant_prevu=Decimal('10000000.00'),
+            date_debut=date.today(),
+            statut='En_cours'
+        )
+        self.reference = date(2026, 6, 30)
+    
+    def creer_facture(self, client, jours_echeance, projet=None, montant_paye='0', emission=None):
+        """Crée une facture de 118 000 GNF TTC échue depuis `jours_echeance` jours à la référence"""
+        facture = Facture.objects.create(
+            client=client,
+            projet=projet,
+            date_emission=emission or self.reference - timedelta(days=200),
+            date_echeance=self.reference - timedelta(days=jours_echeance),
+            montant_ht=Decimal('100000.00'),
+            taux_tva=Decimal('18.00'),
+            montant_paye=Decimal('0'),
+            cree_par=self.user
+        )
+        if Decimal(montant_paye):
+            Facture.appliquer_paiement(facture.pk, montant_paye)
+        return facture
+    
+    def balance(self):
+        return {
+            (ligne['client_id'], ligne['projet_id']): ligne
+            for ligne in Facture.objects.balance_agee(self.reference)
+        }
+    
+    def test_repartition_par_tranche(self):
+        """Test : Le reste à payer est réparti selon l'ancienneté de l'échéance"""
+        self.creer_facture(self.client_a, -5, projet=self.projet)
+        self.creer_facture(self.client_a, 10, projet=self.projet)
+        self.creer_facture(self.client_a, 45, projet=self.projet, montant_paye='18000.00')
+        self.creer_facture(self.client_a, 75)
+        self.creer_facture(self.client_b, 120)
+        
+        balance = self.balance()
+        ligne = balance[(self.client_a.pk, self.projet.pk)]
+        self.assertEqual(ligne['non_echu'], Decimal('118000.00'))
+        self.assertEqual(ligne['jours_0_30'], Decimal('118000.00'))
+        self.assertEqual(ligne['jours_31_60'], Decimal('100000.00'))
+        self.assertEqual(ligne['jours_61_90'], Decimal('0'))
+        self.assertEqual(ligne['total'], Decimal('336000.00'))
+        self.assertEqual(ligne['nombre_factures'], 3)
+        self.assertEqual(balance[(self.client_a.pk, None)]['jours_61_90'], Decimal('118000.00'))
+        self.assertEqual(balance[(self.client_b.pk, None)]['jours_90_plus'], Decimal('118000.00'))
+    
+    def test_bornes_des_tranches(self):
+        """Test : 30 jours de retard restent dans 0-30, 31 jours passent dans 31-60"""
+        self.creer_facture(self.client_a, 0)
+        self.creer_facture(self.client_a, 30)
+        self.creer_facture(self.client_a, 31)
+        self.creer_facture(self.client_a, 90)
+        self.creer_facture(self.client_a, 91)
+        
+        ligne = self.balance()[(self.client_a.pk, None)]
+        self.assertEqual(ligne['non_echu'], Decimal('118000.00'))
+        self.assertEqual(ligne['jours_0_30'], Decimal('118000.00'))
+        self.assertEqual(ligne['jours_31_60'], Decimal('118000.00'))
+        self.assertEqual(ligne['jours_61_90'], Decimal('118000.00'))
+        self.assertEqual(ligne['jours_90_plus'], Decimal('118000.00'))
+    
+    def test_factures_exclues(self):
+        """Test : Les factures soldées ou émises après la référence sont exclues"""
+        self.creer_facture(self.client_a, 120, montant_paye='118000.00')
+        self.creer_facture(self.client_a, -30, emission=self.reference + timedelta(days=1))
+        
+        self.assertEqual(self.balance(), {})
+    
+    def test_paiements_posterieurs_a_la_reference(self):
+        """Test : Une facture soldée après la référence figure avec son reste dû à cette date"""
+        soldee_apres = self.creer_facture(self.client_a, 45, projet=self.projet)
+        soldee_avant = self.creer_facture(self.client_a, 45, projet=self.projet)
+        for facture, montant, jours in [
+            (soldee_apres, '50000.00', -10),
+            (soldee_apres, '68000.00', 5),
+            (soldee_avant, '118000.00', -1),
+        ]:
+            PaiementFacture.objects.create(
+                facture=facture, date_paiement=self.reference + timedelta(days=jours),
+                montant=Decimal(montant), mode_paiement='Virement', enregistre_par=self.user
+            )
+        soldee_apres.refresh_from_db()
+        self.assertEqual(soldee_apres.statut_paiement, 'Payée')
+        
+        ligne = self.balance()[(self.client_a.pk, self.projet.pk)]
+        self.assertEqual(ligne['jours_31_60'], Decimal('68000.00'))
+        self.assertEqual(ligne['total'], Decimal('68000.00'))
+        self.assertEqual(ligne['nombre_factures'], 1)
+        self.assertEqual(list(Facture.objects.balance_agee(self.reference + timedelta(days=5))), [])
+    
+    def test_une_seule_requete(self):
+        """Test : La balance âgée est calculée en une seule requête"""
+        for jours in range(0, 150, 10):
+            self.creer_facture(self.client_a, jours, projet=self.projet)
+        
+        with self.assertNumQueries(1):
+            list(Facture.objects.balance_agee(self.reference))
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_vue_et_exports(self):
+        """Test : La page et les exports Excel et PDF de la balance âgée"""
+        self.creer_facture(self.client_a, 45, projet=self.projet)
+        self.client.force_login(self.user)
+        parametres = {'date': self.reference.isoformat()}
+        
+        reponse = self.client.get(reverse('invoicing:balance_agee'), parametres)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.context['date_reference'], self.reference)
+        self.assertEqual(reponse.context['totaux'][2], Decimal('118000.00'))
+        
+        reponse = self.client.get(reverse('invoicing:balance_agee_export_excel'), parametres)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('balance_agee_20260630.xlsx', reponse['Content-Disposition'])
+        
+        reponse = self.client.get(reverse('invoicing:balance_agee_export_pdf'), parametres)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse['Content-Type'], 'application/pdf')
+
+
+class BalanceAgeeDebitTest(TestCase):
+    """Test de performance : balance âgée sur 100 000 factures"""
+    NOMBRE_FACTURES = 100000
+    
+    def test_moins_d_une_seconde(self):
+        """Test : La balance âgée de 100 000 factures se calcule en moins d'une seconde"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        clients = Client.objects.bulk_create([
+            Client(nom_complet=f'Client {numero}', telephone=f'62200{numero:04d}')
+            for numero in range(50)
+        ])
+        reference = date(2026, 6, 30)
+        statuts = ['Impayée', 'Partielle', 'Payée', 'En_retard']
+        Facture.objects.bulk_create([
+            Facture(
+                numero_facture=f'FACT-TEST-{numero:06d}',
+                client=clients[numero % len(clients)],
+                date_emission=reference - timedelta(days=200),
+                date_echeance=reference - timedelta(days=numero % 150),
+                montant_ht=Decimal('100000.00'),
+                taux_tva=Decimal('18.00'),
+                montant_tva=Decimal('18000.00'),
+                montant_ttc=Decimal('118000.00'),
+                montant_paye=Decimal('118000.00') if statuts[numero % len(statuts)] == 'Payée' else Decimal('0'),
+                statut_paiement=statuts[numero % len(statuts)],
+                cree_par=user,
+            )
+            for numero in range(self.NOMBRE_FACTURES)
+        ], batch_size=5000)
+        
+        debut = time.perf_counter()
+        lignes = list(Facture.objects.balance_agee(reference))
+        duree = time.perf_counter() - debut
+        
+        self.assertEqual(len(lignes), len(clients))
+        self.assertEqual(sum(ligne['nombre_factures'] for ligne in lignes), self.NOMBRE_FACTURES * 3 // 4)
+        self.assertLess(duree, 1)
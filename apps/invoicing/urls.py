@@ -31,4 +31,9 @@ urlpatterns = [
     path('factures/export/excel/', exports.export_factures_excel, name='factures_export_excel'),
     path('factures/export/pdf/', exports.export_factures_pdf, name='factures_export_pdf'),
     path('factures/<int:pk>/export/pdf/', exports.export_facture_detail_pdf, name='facture_export_detail_pdf'),
+    
+    # Balance âgée
+    path('balance-agee/', views.balance_agee, name='balance_agee'),
+    path('balance-agee/export/excel/', exports.export_balance_agee_excel, name='balance_agee_export_excel'),
+    path('balance-agee/export/pdf/', exports.export_balance_agee_pdf, name='balance_agee_export_pdf'),
 ]
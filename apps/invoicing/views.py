@@ -4,23 +4,43 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView, DetailView, DeleteView
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import Q, Sum
+from django.db.models import Count, F, Q, Sum
 from .models import Devis, Facture, LigneDevis, LigneFacture, PaiementFacture
+from apps.core.pagination import ApproximateCountPaginator
+from .services import BalanceAgee
 from .forms import DevisForm, FactureForm, LigneDevisFormSet, LigneFactureFormSet, PaiementFactureForm
 
 
 @login_required
 def invoicing_home(request):
     """Page d'accueil du module facturation"""
+    # Compteurs groupés par statut : une requête par table, servie par l'index du statut
+    devis_par_statut = dict(
+        Devis.objects.order_by().values_list('statut').annotate(nombre=Count('id'))
+    )
+    factures_par_statut = {}
+    montant_a_recevoir = 0
+    for ligne in Facture.objects.order_by().values('statut_paiement').annotate(
+        nombre=Count('id'),
+        restant=Sum(F('montant_ttc') - F('montant_paye')),
+    ):
+        factures_par_statut[ligne['statut_paiement']] = ligne['nombre']
+        if ligne['statut_paiement'] != 'Payée':
+            montant_a_recevoir += ligne['restant'] or 0
+    
+    # Factures non soldées : impayées, partielles et en retard ; le montant à recevoir
+    # est leur reste dû TTC (montant TTC - montant payé)
     stats = {
-        'total_devis': Devis.objects.count(),
-        'devis_en_attente': Devis.objects.filter(statut='En attente').count(),
-        'devis_acceptes': Devis.objects.filter(statut='Accepté').count(),
-        'total_factures': Facture.objects.count(),
-        'factures_impayees': Facture.objects.filter(statut_paiement='Impayée').count(),
-        'montant_a_recevoir': Facture.objects.filter(statut_paiement__in=['Impayée', 'Partielle']).aggregate(
-            total=Sum('montant_ht')
-        )['total'] or 0,
+        'total_devis': sum(devis_par_statut.values()),
+        'devis_en_attente': devis_par_statut.get('Envoyé', 0),
+        'devis_acceptes': devis_par_statut.get('Accepté', 0),
+        'total_factures': sum(factures_par_statut.values()),
+        'factures_impayees': sum(
+            nombre for statut, nombre in factures_par_statut.items() if statut != 'Payée'
+        ),
+        'factures_partielles': factures_par_statut.get('Partielle', 0),
+        'factures_en_retard': factures_par_statut.get('En_retard', 0),
+        'montant_a_recevoir': montant_a_recevoir,
     }
     
     devis_recents = Devis.objects.select_related('client', 'projet').order_by('-date_emission')[:5]
@@ -34,6 +54,12 @@ def invoicing_home(request):
     return render(request, 'invoicing/home.html', context)
 
 
+@login_required
+def balance_agee(request):
+    """Balance âgée des créances clients par client et par projet"""
+    return render(request, 'invoicing/balance_agee.html', BalanceAgee.depuis_requete(request).get_context())
+
+
 # ===== DEVIS =====
 class DevisListView(LoginRequiredMixin, ListView):
     """Liste des devis"""
@@ -41,6 +67,7 @@ class DevisListView(LoginRequiredMixin, ListView):
     template_name = 'invoicing/devis_list.html'
     context_object_name = 'devis_list'
     paginate_by = 20
+    paginator_class = ApproximateCountPaginator
     
     def get_queryset(self):
         queryset = Devis.objects.select_related('client', 'projet').order_by('-date_emission')
@@ -63,10 +90,8 @@ class DevisListView(LoginRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Calculer les totaux pour la page actuelle
-        devis_list = context['devis_list']
-        context['total_ht'] = sum(d.montant_ht for d in devis_list)
-        context['total_ttc'] = sum(d.montant_ttc for d in devis_list)
+        # Totaux de la page actuelle, calculés sur les lignes affichées (liste ou queryset)
+        context.update(Devis.totaux_page(context['page_obj']))
         return context
 
 
@@ -97,8 +122,8 @@ class DevisCreateView(LoginRequiredMixin, CreateView):
             lignes.instance = self.object
             lignes.save()
             
-            # Calculer le montant total
-            self.object.calculer_montant_total()
+            # Recalculer les montants à partir des lignes (une requête UPDATE)
+            Devis.actualiser_montants([self.object.pk])
             
             messages.success(self.request, f'Devis {self.object.numero_devis} créé avec succès.')
             return redirect(self.success_url)
@@ -130,8 +155,8 @@ class DevisUpdateView(LoginRequiredMixin, UpdateView):
             lignes.instance = self.object
             lignes.save()
             
-            # Recalculer le montant total
-            self.object.calculer_montant_total()
+            # Recalculer les montants à partir des lignes (une requête UPDATE)
+            Devis.actualiser_montants([self.object.pk])
             
             messages.success(self.request, f'Devis {self.object.numero_devis} modifié avec succès.')
             return redirect(self.success_url)
@@ -171,6 +196,7 @@ class FactureListView(LoginRequiredMixin, ListView):
     template_name = 'invoicing/facture_list.html'
     context_object_name = 'factures'
     paginate_by = 20
+    paginator_class = ApproximateCountPaginator
     
     def get_queryset(self):
         queryset = Facture.objects.select_related('client', 'projet', 'devis').order_by('-date_emission')
@@ -193,12 +219,8 @@ class FactureListView(LoginRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Calculer les totaux pour la page actuelle
-        factures = context['factures']
-        context['total_ht'] = sum(f.montant_ht for f in factures)
-        context['total_ttc'] = sum(f.montant_ttc for f in factures)
-        context['total_paye'] = sum(f.montant_paye for f in factures)
-        context['total_restant'] = sum(f.montant_restant for f in factures)
+        # Totaux de la page actuelle, calculés sur les lignes affichées (liste ou queryset)
+        context.update(Facture.totaux_page(context['page_obj']))
         return context
 
 
@@ -229,8 +251,8 @@ class FactureCreateView(LoginRequiredMixin, CreateView):
             lignes.instance = self.object
             lignes.save()
             
-            # Calculer le montant total
-            self.object.calculer_montant_total()
+            # Recalculer les montants à partir des lignes (une requête UPDATE)
+            Facture.actualiser_montants([self.object.pk])
             
             messages.success(self.request, f'Facture {self.object.numero_facture} créée avec succès.')
             return redirect(self.success_url)
@@ -262,8 +284,8 @@ class FactureUpdateView(LoginRequiredMixin, UpdateView):
             lignes.instance = self.object
             lignes.save()
             
-            # Recalculer le montant total
-            self.object.calculer_montant_total()
+            # Recalculer les montants à partir des lignes (une requête UPDATE)
+            Facture.actualiser_montants([self.object.pk])
             
             messages.success(self.request, f'Facture {self.object.numero_facture} modifiée avec succès.')
             return redirect(self.success_url)
@@ -308,11 +330,9 @@ def ajouter_paiement(request, pk):
             paiement = form.save(commit=False)
             paiement.facture = facture
             paiement.enregistre_par = request.user
+            # Montant payé et statut de la facture mis à jour par le paiement
             paiement.save()
             
-            # Mettre à jour le statut de la facture
-            facture.mettre_a_jour_statut_paiement()
-            
             messages.success(request, 'Paiement enregistré avec succès.')
             return redirect('invoicing:facture_detail', pk=facture.pk)
     else:
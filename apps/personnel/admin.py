@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Personnel, AffectationPersonnel, PaiementPersonnel
+from .models import Personnel, AffectationPersonnel, PaiementPersonnel, LotPaie
 
 
 @admin.register(Personnel)
@@ -24,7 +24,7 @@ class PaiementPersonnelAdmin(admin.ModelAdmin):
     list_display = ['personnel', 'projet', 'date_paiement', 'montant', 'mode_paiement', 'statut', 'saisi_par']
     list_filter = ['statut', 'mode_paiement', 'date_paiement']
     search_fields = ['personnel__nom', 'personnel__prenom', 'projet__code_projet', 'description']
-    raw_id_fields = ['personnel', 'projet', 'saisi_par', 'valide_par']
+    raw_id_fields = ['personnel', 'projet', 'saisi_par', 'valide_par', 'lot']
     date_hierarchy = 'date_paiement'
     readonly_fields = ['date_creation', 'date_modification']
     
@@ -36,10 +36,26 @@ class PaiementPersonnelAdmin(admin.ModelAdmin):
             'fields': ('mode_paiement', 'statut', 'description', 'piece_justificative')
         }),
         ('Validation', {
-            'fields': ('saisi_par', 'date_validation', 'valide_par')
+            'fields': ('saisi_par', 'date_validation', 'valide_par', 'lot')
         }),
         ('Métadonnées', {
             'fields': ('date_creation', 'date_modification'),
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(LotPaie)
+class LotPaieAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'date_paiement', 'mode_paiement', 'statut', 'saisi_par', 'date_validation']
+    list_filter = ['statut', 'mode_paiement']
+    raw_id_fields = ['saisi_par', 'valide_par']
+    date_hierarchy = 'periode_debut'
+    readonly_fields = ['statut', 'date_validation', 'valide_par', 'date_creation']
+    
+    def has_delete_permission(self, request, obj=None):
+        # Un lot validé a produit ses dépenses : le supprimer (et ses paiements en
+        # cascade) laisserait ces transactions sans paiement
+        if obj is not None and obj.statut == 'Validé':
+            return False
+        return super().has_delete_permission(request, obj)
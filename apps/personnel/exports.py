@@ -0,0 +1,58 @@
+"""
+Vues d'export pour le module Personnel
+"""
+from django.contrib.auth.decorators import login_required
+from apps.core.utils.exports import ExcelExporter, format_date
+from apps.projects.models import Projet
+from .models import Personnel
+from .services import EtatPaie
+from datetime import datetime
+
+
+@login_required
+def export_paie_excel(request):
+    """Exporter l'état de la paie (salaire dû, payé, reste à payer) par employé et par projet en Excel"""
+    etat = EtatPaie.depuis_requete(request)
+    noms = {pk: f"{prenom} {nom}" for pk, prenom, nom in Personnel.objects.values_list('pk', 'prenom', 'nom')}
+    projets = {pk: f"{code} - {nom}" for pk, code, nom in Projet.objects.values_list('pk', 'code_projet', 'nom_projet')}
+    
+    filename = f"etat_paie_{etat.date_reference.strftime('%Y%m%d')}.xlsx"
+    exporter = ExcelExporter(filename, "État de la paie")
+    
+    exporter.add_title("ETRAGC SARLU - État de la Paie du Personnel")
+    exporter.add_empty_row()
+    exporter.add_info("Situation au:", format_date(etat.date_reference))
+    exporter.add_info("Date d'export:", datetime.now().strftime('%d/%m/%Y %H:%M'))
+    exporter.add_info("Nombre d'employés:", len(etat.par_personnel))
+    exporter.add_empty_row()
+    
+    exporter.add_headers([
+        "Employé",
+        "Projet",
+        "Salaire journalier (GNF)",
+        "Jours travaillés",
+        "Salaire dû (GNF)",
+        "Total payé (GNF)",
+        "Reste à payer (GNF)",
+    ])
+    for ligne in sorted(etat.lignes, key=lambda ligne: (noms[ligne['personnel_id']], projets[ligne['projet_id']])):
+        exporter.add_row([
+            noms[ligne['personnel_id']],
+            projets[ligne['projet_id']],
+            float(ligne['salaire_journalier'] or 0),
+            ligne['jours'],
+            float(ligne['salaire_du']),
+            float(ligne['total_paye']),
+            float(ligne['reste_a_payer']),
+        ])
+    exporter.add_row([
+        "TOTAL:", "", "",
+        etat.totaux['jours'],
+        float(etat.totaux['salaire_du']),
+        float(etat.totaux['total_paye']),
+        float(etat.totaux['reste_a_payer']),
+    ], is_total=True)
+    
+    exporter.auto_adjust_columns()
+    
+    return exporter.get_response()
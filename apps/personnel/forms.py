@@ -1,5 +1,5 @@
 from django import forms
-from .models import Personnel, AffectationPersonnel, PaiementPersonnel
+from .models import Personnel, AffectationPersonnel, PaiementPersonnel, LotPaie
 
 
 class PersonnelForm(forms.ModelForm):
@@ -64,3 +64,21 @@ class PaiementPersonnelForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'piece_justificative': forms.FileInput(attrs={'class': 'form-control'}),
         }
+
+
+class LotPaieForm(forms.ModelForm):
+    """Formulaire de lancement d'une paie"""
+    class Meta:
+        model = LotPaie
+        fields = ['periode_debut', 'periode_fin', 'date_paiement', 'mode_paiement']
+        widgets = {
+            'periode_debut': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'periode_fin': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'date_paiement': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'mode_paiement': forms.Select(attrs={'class': 'form-select'}),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['date_paiement'].required = False
+        self.fields['date_paiement'].help_text = 'Fin de période par défaut'
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0003_add_salaire_convenu'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paiementpersonnel',
+            index=models.Index(fields=['date_paiement', 'id'], name='personnel_p_date_pa_4b8649_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='paiementpersonnel',
+            name='personnel_p_date_pa_748c88_idx',
+        ),
+    ]
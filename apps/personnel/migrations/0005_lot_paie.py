@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('personnel', '0004_index_pagination_curseur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotPaie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode_debut', models.DateField(verbose_name='Début de période')),
+                ('periode_fin', models.DateField(verbose_name='Fin de période')),
+                ('date_paiement', models.DateField(verbose_name='Date de paiement')),
+                ('mode_paiement', models.CharField(choices=[('Espèces', 'Espèces'), ('Chèque', 'Chèque'), ('Virement', 'Virement'), ('Mobile_Money', 'Mobile Money')], default='Espèces', max_length=20, verbose_name='Mode de paiement')),
+                ('statut', models.CharField(choices=[('Brouillon', 'Brouillon'), ('Validé', 'Validé')], default='Brouillon', max_length=20, verbose_name='Statut')),
+                ('date_validation', models.DateTimeField(blank=True, null=True, verbose_name='Date de validation')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('saisi_par', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='lots_paie_saisis', to=settings.AUTH_USER_MODEL, verbose_name='Saisi par')),
+                ('valide_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lots_paie_valides', to=settings.AUTH_USER_MODEL, verbose_name='Validé par')),
+            ],
+            options={
+                'verbose_name': 'Lot de paie',
+                'verbose_name_plural': 'Lots de paie',
+                'ordering': ['-periode_debut', '-date_creation'],
+            },
+        ),
+        migrations.AddField(
+            model_name='paiementpersonnel',
+            name='lot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='paiements', to='personnel.lotpaie', verbose_name='Lot de paie'),
+        ),
+        migrations.AddIndex(
+            model_name='lotpaie',
+            index=models.Index(fields=['periode_debut', 'periode_fin'], name='personnel_l_periode_74c049_idx'),
+        ),
+    ]
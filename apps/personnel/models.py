@@ -1,8 +1,16 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.conf import settings
+from django.db.models import F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from apps.core.utils.sql import JoursEntre
 
 
 class Personnel(models.Model):
@@ -171,15 +179,10 @@ class Personnel(models.Model):
         if projet:
             affectations = affectations.filter(projet=projet)
         
-        total_jours = 0
-        for affectation in affectations:
-            if affectation.date_fin:
-                jours = (affectation.date_fin - affectation.date_debut).days + 1
-            else:
-                jours = (date.today() - affectation.date_debut).days + 1
-            total_jours += jours
-        
-        return Decimal(str(total_jours)) * self.salaire_journalier
+        total_jours = affectations.aggregate(
+            total=models.Sum(AffectationPersonnel.jours_travailles(date.today()))
+        )['total'] or 0
+        return Decimal(total_jours) * self.salaire_journalier
     
     def get_reste_a_payer(self, projet=None):
         """Calcule le reste à payer (salaire dû - paiements reçus)"""
@@ -208,31 +211,10 @@ class Personnel(models.Model):
         return (total_paye / self.salaire_convenu) * Decimal('100')
     
     def get_paiements_par_projet(self):
-        """Retourne un dictionnaire des paiements groupés par projet"""
-        from django.db.models import Sum
-        from collections import defaultdict
-        
-        resultats = []
-        projets_ids = self.affectations.values_list('projet_id', flat=True).distinct()
-        
-        for projet_id in projets_ids:
-            from apps.projects.models import Projet
-            try:
-                projet = Projet.objects.get(pk=projet_id)
-                salaire_du = self.get_salaire_du(projet)
-                total_paye = self.get_total_paiements(projet)
-                reste = salaire_du - total_paye
-                
-                resultats.append({
-                    'projet': projet,
-                    'salaire_du': salaire_du,
-                    'total_paye': total_paye,
-                    'reste_a_payer': reste,
-                })
-            except Projet.DoesNotExist:
-                pass
+        """Retourne le salaire dû, le total payé et le reste à payer par projet (voir EtatPaie)"""
+        from .services import EtatPaie
         
-        return resultats
+        return EtatPaie([self.pk]).get_context_personnel(self.pk)['paiements_par_projet']
 
 
 class AffectationPersonnel(models.Model):
@@ -297,6 +279,32 @@ class AffectationPersonnel(models.Model):
     def __str__(self):
         return f"{self.personnel.get_full_name()} - {self.projet.code_projet}"
     
+    @staticmethod
+    def jours_travailles(date_reference):
+        """
+        Expression SQL du nombre de jours travaillés d'une affectation, bornes incluses :
+        jusqu'à date_fin, ou jusqu'à date_reference si l'affectation est en cours
+        """
+        return JoursEntre(Coalesce('date_fin', Value(date_reference)), F('date_debut')) + 1
+    
+    @staticmethod
+    def jours_sur_periode(debut, fin):
+        """
+        Expression SQL du nombre de jours d'une affectation compris dans la période
+        [debut, fin], bornes incluses (à appliquer aux affectations qui la chevauchent)
+        """
+        debut = Value(debut, output_field=models.DateField())
+        fin = Value(fin, output_field=models.DateField())
+        return JoursEntre(Least(Coalesce('date_fin', fin), fin), Greatest('date_debut', debut)) + 1
+    
+    @classmethod
+    def sur_periode(cls, debut, fin):
+        """Affectations qui chevauchent la période [debut, fin]"""
+        return cls.objects.filter(
+            Q(date_fin__isnull=True) | Q(date_fin__gte=debut),
+            date_debut__lte=fin
+        )
+    
     def get_duree_jours(self):
         """Retourne la durée de l'affectation en jours"""
         if self.date_fin:
@@ -400,6 +408,14 @@ class PaiementPersonnel(models.Model):
         related_name='paiements_personnel_valides',
         verbose_name='Validé par'
     )
+    lot = models.ForeignKey(
+        'LotPaie',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='paiements',
+        verbose_name='Lot de paie'
+    )
     date_creation = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Date de création'
@@ -416,7 +432,7 @@ class PaiementPersonnel(models.Model):
         indexes = [
             models.Index(fields=['personnel']),
             models.Index(fields=['projet']),
-            models.Index(fields=['date_paiement']),
+            models.Index(fields=['date_paiement', 'id']),
             models.Index(fields=['statut']),
         ]
     
@@ -455,3 +471,180 @@ class PaiementPersonnel(models.Model):
             'Rejeté': 'bg-danger',
         }
         return statut_classes.get(self.statut, 'bg-secondary')
+
+
+class LotPaie(models.Model):
+    """
+    Paie mensuelle (ou de toute autre période) : les paiements de toutes les
+    affectations de la période, créés en attente puis validés ensemble
+    """
+    STATUT_CHOICES = [
+        ('Brouillon', 'Brouillon'),
+        ('Validé', 'Validé'),
+    ]
+    
+    periode_debut = models.DateField(
+        verbose_name='Début de période'
+    )
+    periode_fin = models.DateField(
+        verbose_name='Fin de période'
+    )
+    date_paiement = models.DateField(
+        verbose_name='Date de paiement'
+    )
+    mode_paiement = models.CharField(
+        max_length=20,
+        choices=PaiementPersonnel.MODE_PAIEMENT_CHOICES,
+        default='Espèces',
+        verbose_name='Mode de paiement'
+    )
+    statut = models.CharField(
+        max_length=20,
+        choices=STATUT_CHOICES,
+        default='Brouillon',
+        verbose_name='Statut'
+    )
+    saisi_par = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.RESTRICT,
+        related_name='lots_paie_saisis',
+        verbose_name='Saisi par'
+    )
+    date_validation = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Date de validation'
+    )
+    valide_par = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='lots_paie_valides',
+        verbose_name='Validé par'
+    )
+    date_creation = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Date de création'
+    )
+    
+    class Meta:
+        verbose_name = 'Lot de paie'
+        verbose_name_plural = 'Lots de paie'
+        ordering = ['-periode_debut', '-date_creation']
+        indexes = [
+            models.Index(fields=['periode_debut', 'periode_fin']),
+        ]
+    
+    def __str__(self):
+        return f"Paie du {self.periode_debut:%d/%m/%Y} au {self.periode_fin:%d/%m/%Y}"
+    
+    def get_absolute_url(self):
+        return reverse('personnel:lot_detail', kwargs={'pk': self.pk})
+    
+    def get_statut_badge_class(self):
+        """Retourne la classe CSS pour le badge de statut"""
+        return 'bg-success' if self.statut == 'Validé' else 'bg-warning'
+    
+    @classmethod
+    def generer(cls, periode_debut, periode_fin, utilisateur, date_paiement=None,
+                mode_paiement='Espèces', batch_size=1000):
+        """
+        Crée le lot de paie de la période et ses paiements en attente : un paiement
+        par couple (employé actif, projet), du nombre de jours d'affectation compris
+        dans la période multiplié par le salaire journalier. Les jours sont calculés
+        en une requête groupée et les paiements insérés en masse.
+        Lève ValidationError si la période est invalide ou chevauche un autre lot.
+        """
+        if periode_fin < periode_debut:
+            raise ValidationError('La fin de période doit être postérieure à son début.')
+        
+        with transaction.atomic():
+            if cls.objects.filter(periode_debut__lte=periode_fin, periode_fin__gte=periode_debut).exists():
+                raise ValidationError('Un lot de paie existe déjà sur cette période.')
+            lot = cls.objects.create(
+                periode_debut=periode_debut,
+                periode_fin=periode_fin,
+                date_paiement=date_paiement or periode_fin,
+                mode_paiement=mode_paiement,
+                saisi_par=utilisateur
+            )
+            
+            dus = AffectationPersonnel.sur_periode(periode_debut, periode_fin).filter(
+                personnel__actif=True, personnel__salaire_journalier__gt=0
+            ).values('personnel_id', 'projet_id').annotate(
+                jours=Sum(AffectationPersonnel.jours_sur_periode(periode_debut, periode_fin)),
+                salaire_journalier=Max('personnel__salaire_journalier'),
+            ).values_list('personnel_id', 'projet_id', 'jours', 'salaire_journalier').order_by(
+                'personnel_id', 'projet_id'
+            )
+            
+            description = str(lot)
+            PaiementPersonnel.objects.bulk_create([
+                PaiementPersonnel(
+                    personnel_id=personnel_id,
+                    projet_id=projet_id,
+                    date_paiement=lot.date_paiement,
+                    montant=(jours * salaire_journalier).quantize(Decimal('0.01')),
+                    nombre_jours=jours,
+                    mode_paiement=mode_paiement,
+                    statut='En_attente',
+                    description=description,
+                    saisi_par=utilisateur,
+                    lot=lot
+                )
+                for personnel_id, projet_id, jours, salaire_journalier in dus
+            ], batch_size=batch_size)
+        return lot
+    
+    def valider(self, utilisateur, batch_size=1000):
+        """
+        Valide en une transaction tous les paiements encore en attente du lot :
+        dépenses insérées par Transaction.creer_en_masse (soldes et agrégats reportés
+        par projet) et statuts mis à jour en une seule requête.
+        Lève ValidationError si le lot est déjà validé. Retourne le nombre de paiements validés.
+        """
+        from apps.finances.models import Transaction
+        
+        maintenant = timezone.now()
+        
+        with transaction.atomic():
+            # Le changement de statut conditionnel verrouille le lot : une seconde
+            # validation concurrente ne trouve plus de ligne à mettre à jour
+            valides = LotPaie.objects.filter(pk=self.pk, statut='Brouillon').update(
+                statut='Validé', date_validation=maintenant, valide_par=utilisateur
+            )
+            if not valides:
+                raise ValidationError('Ce lot de paie est déjà validé.')
+            
+            en_attente = self.paiements.filter(statut='En_attente')
+            paiements = list(en_attente.values_list(
+                'projet_id', 'montant', 'date_paiement', 'mode_paiement', 'description',
+                'personnel__prenom', 'personnel__nom'
+            ).order_by('pk'))
+            Transaction.creer_en_masse([
+                Transaction(
+                    projet_id=projet_id,
+                    type='Dépense',
+                    categorie='Paiement Personnel',
+                    montant=montant,
+                    description=f'Paiement {prenom} {nom} - {description or ""}',
+                    date_transaction=date_paiement,
+                    mode_paiement=mode_paiement,
+                    statut='Validée',
+                    saisi_par=utilisateur
+                )
+                for projet_id, montant, date_paiement, mode_paiement, description, prenom, nom in paiements
+            ], batch_size=batch_size)
+            
+            # Un paiement validé ou rejeté individuellement entre-temps annule tout
+            if en_attente.update(
+                statut='Validé', date_validation=maintenant, valide_par=utilisateur,
+                date_modification=maintenant
+            ) != len(paiements):
+                raise ValidationError('Des paiements du lot ont été modifiés pendant la validation.')
+        
+        self.statut = 'Validé'
+        self.date_validation = maintenant
+        self.valide_par = utilisateur
+        return len(paiements)
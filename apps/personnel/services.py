@@ -0,0 +1,113 @@
+"""
+Calcul de la paie du personnel : jours travaillés, salaire dû, montant payé et reste à payer
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Max, Sum
+
+from apps.core.utils.requetes import DateReferenceMixin
+from apps.projects.models import Projet
+
+from .models import AffectationPersonnel, PaiementPersonnel
+
+
+class EtatPaie(DateReferenceMixin):
+    """
+    État de la paie par employé et par projet, calculé en deux requêtes groupées
+    (jours d'affectation, paiements validés) quel que soit le nombre d'employés.
+
+    - `lignes` : une ligne par couple (employé, projet) ayant au moins une affectation,
+      identifiés par leurs clés primaires
+    - `par_personnel` : totaux par employé, tous ses paiements validés compris
+    - `totaux` : totaux de l'ensemble des employés retenus
+
+    Le salaire dû est le nombre de jours d'affectation multiplié par le salaire
+    journalier (voir AffectationPersonnel.jours_travailles).
+    """
+    COLONNES = ['jours', 'salaire_du', 'total_paye', 'reste_a_payer']
+
+    def __init__(self, personnel=None, date_reference=None):
+        """`personnel` : employés ou clés primaires à retenir (tout le personnel par défaut)"""
+        self.date_reference = date_reference or date.today()
+        affectations = AffectationPersonnel.objects.all()
+        paiements = PaiementPersonnel.objects.filter(statut='Validé')
+        if personnel is not None:
+            affectations = affectations.filter(personnel__in=personnel)
+            paiements = paiements.filter(personnel__in=personnel)
+
+        payes = {
+            (personnel_id, projet_id): total
+            for personnel_id, projet_id, total in paiements.values('personnel_id', 'projet_id').annotate(
+                total=Sum('montant')
+            ).values_list('personnel_id', 'projet_id', 'total').order_by()
+        }
+
+        # Regroupement sur les seules clés (index unique personnel, projet, date_debut) ;
+        # le salaire journalier, identique dans le groupe, est lu par un MAX
+        zero = Decimal('0')
+        self.lignes = []
+        self.par_personnel = {}
+        for personnel_id, projet_id, jours, salaire_journalier in affectations.values(
+            'personnel_id', 'projet_id'
+        ).annotate(
+            jours=Sum(AffectationPersonnel.jours_travailles(self.date_reference)),
+            salaire_journalier=Max('personnel__salaire_journalier'),
+        ).values_list('personnel_id', 'projet_id', 'jours', 'salaire_journalier').order_by('personnel_id', 'projet_id'):
+            salaire_du = jours * salaire_journalier if salaire_journalier else zero
+            total_paye = payes.get((personnel_id, projet_id), zero)
+            self.lignes.append({
+                'personnel_id': personnel_id,
+                'projet_id': projet_id,
+                'salaire_journalier': salaire_journalier,
+                'jours': jours,
+                'salaire_du': salaire_du,
+                'total_paye': total_paye,
+                'reste_a_payer': salaire_du - total_paye,
+            })
+            totaux = self.par_personnel.get(personnel_id)
+            if totaux is None:
+                self.par_personnel[personnel_id] = {
+                    'jours': jours, 'salaire_du': salaire_du, 'total_paye': zero, 'reste_a_payer': zero
+                }
+            else:
+                totaux['jours'] += jours
+                totaux['salaire_du'] += salaire_du
+
+        # Tous les paiements validés comptent dans le total payé de l'employé, y compris
+        # sur des projets sans affectation
+        for (personnel_id, _), total in payes.items():
+            totaux = self.par_personnel.get(personnel_id)
+            if totaux is None:
+                totaux = self.par_personnel[personnel_id] = self._totaux_vides()
+            totaux['total_paye'] += total
+
+        self.totaux = self._totaux_vides()
+        for totaux in self.par_personnel.values():
+            totaux['reste_a_payer'] = totaux['salaire_du'] - totaux['total_paye']
+            for colonne in self.COLONNES:
+                self.totaux[colonne] += totaux[colonne]
+
+    @staticmethod
+    def _totaux_vides():
+        return {'jours': 0, 'salaire_du': Decimal('0'), 'total_paye': Decimal('0'), 'reste_a_payer': Decimal('0')}
+
+    def get_totaux_personnel(self, personnel_id):
+        """Totaux d'un employé (à zéro s'il n'a ni affectation ni paiement)"""
+        return self.par_personnel.get(personnel_id, self._totaux_vides())
+
+    def get_lignes_personnel(self, personnel_id):
+        """Lignes par projet d'un employé"""
+        return [ligne for ligne in self.lignes if ligne['personnel_id'] == personnel_id]
+
+    def get_context_personnel(self, personnel_id):
+        """Contexte de la fiche d'un employé : totaux et détail par projet (projets chargés en une requête)"""
+        totaux = self.get_totaux_personnel(personnel_id)
+        lignes = self.get_lignes_personnel(personnel_id)
+        projets = Projet.objects.in_bulk([ligne['projet_id'] for ligne in lignes])
+        return {
+            'salaire_du_total': totaux['salaire_du'],
+            'total_paye': totaux['total_paye'],
+            'reste_a_payer': totaux['reste_a_payer'],
+            'paiements_par_projet': [dict(ligne, projet=projets[ligne['projet_id']]) for ligne in lignes],
+        }
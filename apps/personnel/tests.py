@@ -1,8 +1,14 @@
-from django.test import TestCase
+import time
+
+from django.test import TestCase, Client as TestClient
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db.models import Sum
+from django.urls import reverse
 from decimal import Decimal
 from datetime import date, timedelta
-from apps.personnel.models import Personnel, PaiementPersonnel, AffectationPersonnel
+from apps.personnel.models import Personnel, PaiementPersonnel, AffectationPersonnel, LotPaie
+from apps.personnel.services import EtatPaie
 from apps.projects.models import Projet
 from apps.clients.models import Client
 from apps.finances.models import Transaction
@@ -257,3 +263,347 @@ class PaiementPersonnelModelTest(TestCase):
         # Vérifier que le budget a diminué
         budget_apres = self.projet.get_budget_disponible()
         self.assertEqual(budget_apres, budget_avant - Decimal('500000.00'))
+
+
+class EtatPaieTest(TestCase):
+    """Tests pour le calcul groupé de la paie"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        self.projet = Projet.objects.create(
+            nom_projet='Projet A', client=client, montant_prevu=Decimal('10000000.00'), statut='En_cours'
+        )
+        self.autre_projet = Projet.objects.create(
+            nom_projet='Projet B', client=client, montant_prevu=Decimal('10000000.00'), statut='En_cours'
+        )
+        self.personnel = Personnel.objects.create(
+            nom='Diallo', prenom='Mamadou', fonction='Maçon', type_contrat='Journalier',
+            salaire_journalier=Decimal('50000.00')
+        )
+        # 10 jours terminés sur le projet A, deux affectations (5 jours + en cours) sur le projet B
+        AffectationPersonnel.objects.create(
+            personnel=self.personnel, projet=self.projet,
+            date_debut=date(2026, 1, 1), date_fin=date(2026, 1, 10)
+        )
+        AffectationPersonnel.objects.create(
+            personnel=self.personnel, projet=self.autre_projet,
+            date_debut=date(2026, 2, 1), date_fin=date(2026, 2, 5)
+        )
+        AffectationPersonnel.objects.create(
+            personnel=self.personnel, projet=self.autre_projet, date_debut=date.today() - timedelta(days=2)
+        )
+        self.paiement(self.projet, '200000.00')
+        self.paiement(self.autre_projet, '100000.00')
+        self.paiement(self.autre_projet, '999999.00', statut='En_attente')
+    
+    def paiement(self, projet, montant, statut='Validé', personnel=None):
+        return PaiementPersonnel.objects.create(
+            personnel=personnel or self.personnel,
+            projet=projet,
+            date_paiement=date.today(),
+            montant=Decimal(montant),
+            statut=statut,
+            saisi_par=self.user
+        )
+    
+    def test_jours_salaire_et_reste(self):
+        """Test : Jours travaillés bornes incluses, salaire dû, payé et reste par projet"""
+        etat = EtatPaie([self.personnel.pk])
+        
+        lignes = {ligne['projet_id']: ligne for ligne in etat.lignes}
+        self.assertEqual(lignes[self.projet.pk]['jours'], 10)
+        self.assertEqual(lignes[self.projet.pk]['salaire_du'], Decimal('500000.00'))
+        self.assertEqual(lignes[self.projet.pk]['reste_a_payer'], Decimal('300000.00'))
+        self.assertEqual(lignes[self.autre_projet.pk]['jours'], 8)
+        self.assertEqual(lignes[self.autre_projet.pk]['total_paye'], Decimal('100000.00'))
+        
+        totaux = etat.get_totaux_personnel(self.personnel.pk)
+        self.assertEqual(totaux['salaire_du'], self.personnel.get_salaire_du())
+        self.assertEqual(totaux['total_paye'], self.personnel.get_total_paiements())
+        self.assertEqual(totaux['reste_a_payer'], self.personnel.get_reste_a_payer())
+        self.assertEqual(
+            lignes[self.autre_projet.pk]['salaire_du'], self.personnel.get_salaire_du(self.autre_projet)
+        )
+    
+    def test_sans_salaire_journalier_et_sans_affectation(self):
+        """Test : Salaire dû nul sans salaire journalier ; paiement sans affectation compté dans le total"""
+        prestataire = Personnel.objects.create(
+            nom='Camara', prenom='Aïssatou', fonction='Autre', type_contrat='Prestataire'
+        )
+        AffectationPersonnel.objects.create(
+            personnel=prestataire, projet=self.projet, date_debut=date(2026, 1, 1), date_fin=date(2026, 1, 3)
+        )
+        self.paiement(self.autre_projet, '40000.00', personnel=prestataire)
+        
+        etat = EtatPaie()
+        self.assertEqual(etat.get_lignes_personnel(prestataire.pk)[0]['salaire_du'], Decimal('0'))
+        self.assertEqual(etat.get_totaux_personnel(prestataire.pk)['total_paye'], Decimal('40000.00'))
+        self.assertEqual(etat.get_totaux_personnel(prestataire.pk)['reste_a_payer'], Decimal('-40000.00'))
+        self.assertEqual(etat.totaux['total_paye'], Decimal('340000.00'))
+    
+    def test_deux_requetes(self):
+        """Test : L'état de toute l'entreprise se calcule en deux requêtes"""
+        with self.assertNumQueries(2):
+            EtatPaie()
+    
+    def test_fiche_et_export(self):
+        """Test : La fiche employé et l'export Excel utilisent l'état de la paie"""
+        client = TestClient()
+        client.force_login(self.user)
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            response = client.get(reverse('personnel:detail', args=[self.personnel.pk]))
+            export = client.get(reverse('personnel:paie_export_excel'))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_paye'], Decimal('300000.00'))
+        self.assertEqual(len(response.context['paiements_par_projet']), 2)
+        self.assertContains(response, self.autre_projet.code_projet)
+        self.assertEqual(export.status_code, 200)
+        self.assertIn('etat_paie_', export['Content-Disposition'])
+
+
+class EtatPaieDebitTest(TestCase):
+    """Test de performance : paie de toute l'entreprise"""
+    NOMBRE_EMPLOYES = 5000
+    
+    def test_paie_entreprise(self):
+        """Test : La paie de 5 000 employés se calcule en moins de 100 ms"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        projets = [
+            Projet.objects.create(nom_projet=f'Projet {numero}', client=client, montant_prevu=Decimal('1000000.00'))
+            for numero in range(20)
+        ]
+        employes = Personnel.objects.bulk_create([
+            Personnel(
+                nom=f'Nom {numero}', prenom='Prénom', fonction='Maçon', type_contrat='Journalier',
+                salaire_journalier=Decimal('40000.00')
+            )
+            for numero in range(self.NOMBRE_EMPLOYES)
+        ])
+        AffectationPersonnel.objects.bulk_create([
+            AffectationPersonnel(
+                personnel=employe, projet=projets[(numero + decalage) % len(projets)],
+                date_debut=date(2026, 1, 1) + timedelta(days=decalage * 30),
+                date_fin=date(2026, 1, 20) + timedelta(days=decalage * 30)
+            )
+            for numero, employe in enumerate(employes)
+            for decalage in range(2)
+        ], batch_size=1000)
+        PaiementPersonnel.objects.bulk_create([
+            PaiementPersonnel(
+                personnel=employe, projet=projets[numero % len(projets)], date_paiement=date(2026, 2, 1),
+                montant=Decimal('100000.00'), statut='Validé', saisi_par=user
+            )
+            for numero, employe in enumerate(employes)
+        ], batch_size=1000)
+        
+        # Premier calcul non chronométré (requêtes compilées, cache de pages SQLite),
+        # puis meilleur de cinq : la mesure ne dépend pas de la charge de la suite
+        EtatPaie()
+        durees = []
+        for _ in range(5):
+            debut = time.perf_counter()
+            etat = EtatPaie()
+            durees.append(time.perf_counter() - debut)
+        
+        self.assertEqual(len(etat.lignes), 2 * self.NOMBRE_EMPLOYES)
+        self.assertEqual(etat.totaux['salaire_du'], Decimal('40000.00') * 40 * self.NOMBRE_EMPLOYES)
+        self.assertEqual(etat.totaux['reste_a_payer'], Decimal('1500000.00') * self.NOMBRE_EMPLOYES)
+        self.assertLess(min(durees), 0.1)
+
+
+class LotPaieTest(TestCase):
+    """Tests pour la paie par lot"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        self.projet = Projet.objects.create(
+            nom_projet='Projet A', client=client, montant_prevu=Decimal('10000000.00'), statut='En_cours'
+        )
+        self.autre_projet = Projet.objects.create(
+            nom_projet='Projet B', client=client, montant_prevu=Decimal('10000000.00'), statut='En_cours'
+        )
+        self.macon = Personnel.objects.create(
+            nom='Diallo', prenom='Mamadou', fonction='Maçon', type_contrat='Journalier',
+            salaire_journalier=Decimal('50000.00')
+        )
+        self.chauffeur = Personnel.objects.create(
+            nom='Bah', prenom='Ibrahima', fonction='Chauffeur', type_contrat='CDD',
+            salaire_journalier=Decimal('30000.00')
+        )
+        # Maçon : depuis le 20 août (en cours) sur A, du 10 au 12 puis du 25 au 30 septembre sur B
+        self.affecter(self.macon, self.projet, date(2026, 8, 20))
+        self.affecter(self.macon, self.autre_projet, date(2026, 9, 10), date(2026, 9, 12))
+        self.affecter(self.macon, self.autre_projet, date(2026, 9, 25), date(2026, 10, 5))
+        # Chauffeur : terminé avant la période
+        self.affecter(self.chauffeur, self.projet, date(2026, 8, 1), date(2026, 8, 31))
+        
+        self.debut = date(2026, 9, 1)
+        self.fin = date(2026, 9, 30)
+    
+    def affecter(self, personnel, projet, date_debut, date_fin=None):
+        return AffectationPersonnel.objects.create(
+            personnel=personnel, projet=projet, date_debut=date_debut, date_fin=date_fin
+        )
+    
+    def test_generer_jours_de_la_periode(self):
+        """Test : Un paiement en attente par employé et projet, jours limités à la période"""
+        lot = LotPaie.generer(self.debut, self.fin, self.user)
+        
+        paiements = {paiement.projet_id: paiement for paiement in lot.paiements.all()}
+        self.assertEqual(len(paiements), 2)
+        self.assertEqual(paiements[self.projet.pk].nombre_jours, 30)
+        self.assertEqual(paiements[self.projet.pk].montant, Decimal('1500000.00'))
+        self.assertEqual(paiements[self.autre_projet.pk].nombre_jours, 9)
+        self.assertEqual(paiements[self.autre_projet.pk].montant, Decimal('450000.00'))
+        self.assertTrue(all(paiement.statut == 'En_attente' for paiement in paiements.values()))
+        self.assertEqual(lot.date_paiement, self.fin)
+        self.assertEqual(lot.statut, 'Brouillon')
+    
+    def test_generer_exclut_inactifs_et_sans_salaire(self):
+        """Test : Les employés inactifs ou sans salaire journalier ne sont pas payés par lot"""
+        inactif = Personnel.objects.create(
+            nom='Sow', prenom='Alpha', fonction='Maçon', type_contrat='Journalier',
+            salaire_journalier=Decimal('40000.00'), actif=False
+        )
+        prestataire = Personnel.objects.create(
+            nom='Camara', prenom='Aïssatou', fonction='Autre', type_contrat='Prestataire'
+        )
+        self.affecter(inactif, self.projet, date(2026, 9, 1))
+        self.affecter(prestataire, self.projet, date(2026, 9, 1))
+        
+        lot = LotPaie.generer(self.debut, self.fin, self.user)
+        
+        self.assertEqual(set(lot.paiements.values_list('personnel_id', flat=True)), {self.macon.pk})
+    
+    def test_generer_periode_deja_payee(self):
+        """Test : Deux lots ne peuvent pas couvrir la même période"""
+        LotPaie.generer(self.debut, self.fin, self.user)
+        
+        with self.assertRaises(ValidationError):
+            LotPaie.generer(date(2026, 9, 15), date(2026, 10, 15), self.user)
+        with self.assertRaises(ValidationError):
+            LotPaie.generer(self.fin, self.debut, self.user)
+        self.assertEqual(LotPaie.objects.count(), 1)
+    
+    def test_valider(self):
+        """Test : La validation crée les dépenses et valide les paiements en attente"""
+        lot = LotPaie.generer(self.debut, self.fin, self.user)
+        rejete = lot.paiements.get(projet=self.autre_projet)
+        rejete.statut = 'Rejeté'
+        rejete.save()
+        budget_avant = self.projet.get_budget_disponible()
+        
+        nombre = lot.valider(self.user)
+        
+        self.assertEqual(nombre, 1)
+        lot.refresh_from_db()
+        self.assertEqual(lot.statut, 'Validé')
+        self.assertEqual(lot.valide_par, self.user)
+        paiement = lot.paiements.get(projet=self.projet)
+        self.assertEqual(paiement.statut, 'Validé')
+        self.assertIsNotNone(paiement.date_validation)
+        self.assertEqual(lot.paiements.get(pk=rejete.pk).statut, 'Rejeté')
+        
+        depense = Transaction.objects.get(categorie='Paiement Personnel')
+        self.assertEqual(depense.projet, self.projet)
+        self.assertEqual(depense.type, 'Dépense')
+        self.assertEqual(depense.montant, Decimal('1500000.00'))
+        self.assertEqual(depense.date_transaction, self.fin)
+        self.assertEqual(self.projet.get_budget_disponible(), budget_avant - Decimal('1500000.00'))
+        
+        with self.assertRaises(ValidationError):
+            lot.valider(self.user)
+        self.assertEqual(Transaction.objects.count(), 1)
+    
+    def test_vues(self):
+        """Test : Lancement, détail et validation d'une paie depuis les vues"""
+        client = TestClient()
+        client.force_login(self.user)
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            response = client.post(reverse('personnel:lot_create'), {
+                'periode_debut': '2026-09-01', 'periode_fin': '2026-09-30', 'mode_paiement': 'Virement'
+            })
+            lot = LotPaie.objects.get()
+            self.assertRedirects(response, reverse('personnel:lot_detail', args=[lot.pk]))
+            
+            detail = client.get(reverse('personnel:lot_detail', args=[lot.pk]))
+            self.assertEqual(detail.status_code, 200)
+            self.assertEqual(detail.context['montant_total'], Decimal('1950000.00'))
+            self.assertContains(detail, 'Valider la Paie')
+            
+            client.post(reverse('personnel:lot_valider', args=[lot.pk]))
+            liste = client.get(reverse('personnel:lot_list'))
+        
+        self.assertEqual(lot.paiements.filter(statut='Validé', mode_paiement='Virement').count(), 2)
+        self.assertEqual(Transaction.objects.filter(mode_paiement='Virement').count(), 2)
+        self.assertEqual(liste.status_code, 200)
+        self.assertEqual(liste.context['lots'][0].nombre_paiements, 2)
+    
+    def test_suppression_admin(self):
+        """Test : L'admin supprime un lot brouillon mais refuse un lot validé et ses dépenses"""
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        client = TestClient()
+        client.force_login(admin)
+        brouillon = LotPaie.generer(self.debut, self.fin, self.user)
+        with self.settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            client.post(reverse('admin:personnel_lotpaie_delete', args=[brouillon.pk]), {'post': 'yes'})
+            self.assertFalse(LotPaie.objects.exists())
+            
+            lot = LotPaie.generer(self.debut, self.fin, self.user)
+            lot.valider(self.user)
+            response = client.post(reverse('admin:personnel_lotpaie_delete', args=[lot.pk]), {'post': 'yes'})
+            self.assertEqual(response.status_code, 403)
+            client.post(reverse('admin:personnel_lotpaie_changelist'), {
+                'action': 'delete_selected', '_selected_action': [lot.pk], 'post': 'yes'
+            })
+        
+        self.assertEqual(lot.paiements.count(), 2)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+
+class LotPaieDebitTest(TestCase):
+    """Test de performance : validation d'une paie de 2 000 paiements"""
+    NOMBRE_EMPLOYES = 2000
+    
+    def test_valider_lot(self):
+        """Test : Une paie de 2 000 paiements se génère et se valide en moins d'une seconde chacune"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        client = Client.objects.create(nom_complet='Client Test', telephone='622000000')
+        projets = [
+            Projet.objects.create(nom_projet=f'Projet {numero}', client=client, montant_prevu=Decimal('1000000.00'))
+            for numero in range(20)
+        ]
+        employes = Personnel.objects.bulk_create([
+            Personnel(
+                nom=f'Nom {numero}', prenom='Prénom', fonction='Maçon', type_contrat='Journalier',
+                salaire_journalier=Decimal('40000.00')
+            )
+            for numero in range(self.NOMBRE_EMPLOYES)
+        ])
+        AffectationPersonnel.objects.bulk_create([
+            AffectationPersonnel(
+                personnel=employe, projet=projets[numero % len(projets)], date_debut=date(2026, 8, 1)
+            )
+            for numero, employe in enumerate(employes)
+        ], batch_size=1000)
+        
+        debut = time.perf_counter()
+        lot = LotPaie.generer(date(2026, 9, 1), date(2026, 9, 30), user)
+        duree_generation = time.perf_counter() - debut
+        
+        debut = time.perf_counter()
+        nombre = lot.valider(user)
+        duree_validation = time.perf_counter() - debut
+        
+        self.assertEqual(nombre, self.NOMBRE_EMPLOYES)
+        self.assertEqual(PaiementPersonnel.objects.filter(statut='Validé').count(), self.NOMBRE_EMPLOYES)
+        self.assertEqual(
+            Transaction.objects.filter(categorie='Paiement Personnel').aggregate(total=Sum('montant'))['total'],
+            Decimal('1200000.00') * self.NOMBRE_EMPLOYES
+        )
+        self.assertLess(duree_generation, 1)
+        self.assertLess(duree_validation, 1)
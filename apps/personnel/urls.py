@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, exports
 
 app_name = 'personnel'
 
@@ -26,4 +26,13 @@ urlpatterns = [
     path('paiements/<int:pk>/modifier/', views.PaiementPersonnelUpdateView.as_view(), name='paiement_update'),
     path('paiements/<int:pk>/valider/', views.valider_paiement, name='paiement_valider'),
     path('paiements/<int:pk>/rejeter/', views.rejeter_paiement, name='paiement_rejeter'),
+    
+    # Lots de paie
+    path('paie/', views.LotPaieListView.as_view(), name='lot_list'),
+    path('paie/nouvelle/', views.lot_paie_create, name='lot_create'),
+    path('paie/<int:pk>/', views.LotPaieDetailView.as_view(), name='lot_detail'),
+    path('paie/<int:pk>/valider/', views.valider_lot_paie, name='lot_valider'),
+    
+    # État de la paie
+    path('paie/export/excel/', exports.export_paie_excel, name='paie_export_excel'),
 ]
@@ -4,9 +4,13 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView, DetailView, DeleteView
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import Q, Count
-from .models import Personnel, AffectationPersonnel, PaiementPersonnel
-from .forms import PersonnelForm, AffectationPersonnelForm, PaiementPersonnelForm
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q, Count, Sum
+from apps.core.pagination import KeysetPaginationMixin
+from .models import Personnel, AffectationPersonnel, PaiementPersonnel, LotPaie
+from .forms import PersonnelForm, AffectationPersonnelForm, PaiementPersonnelForm, LotPaieForm
+from .services import EtatPaie
 
 
 @login_required
@@ -115,13 +119,8 @@ class PersonnelDetailView(LoginRequiredMixin, DetailView):
         context['affectations'] = self.object.affectations.select_related('projet').order_by('-date_debut')
         context['affectations_actives'] = self.object.affectations.filter(date_fin__isnull=True)
         
-        # Calculs financiers globaux
-        context['salaire_du_total'] = self.object.get_salaire_du()
-        context['total_paye'] = self.object.get_total_paiements()
-        context['reste_a_payer'] = self.object.get_reste_a_payer()
-        
-        # Paiements détaillés par projet
-        context['paiements_par_projet'] = self.object.get_paiements_par_projet()
+        # Calculs financiers globaux et détaillés par projet (voir EtatPaie)
+        context.update(EtatPaie([self.object.pk]).get_context_personnel(self.object.pk))
         
         # Tous les paiements récents
         context['paiements_recents'] = self.object.paiements.select_related('projet').order_by('-date_paiement')[:10]
@@ -145,8 +144,9 @@ class PersonnelDeleteView(LoginRequiredMixin, DeleteView):
         context['nb_taches_responsable'] = personnel.taches_responsable.count()
         
         # Calculs financiers
-        context['total_paiements'] = personnel.get_total_paiements()
-        context['salaire_du'] = personnel.get_salaire_du()
+        totaux = EtatPaie([personnel.pk]).get_totaux_personnel(personnel.pk)
+        context['total_paiements'] = totaux['total_paye']
+        context['salaire_du'] = totaux['salaire_du']
         
         # Total des éléments
         context['total_elements'] = (
@@ -225,7 +225,7 @@ def terminer_affectation(request, pk):
 
 
 # ===== PAIEMENTS =====
-class PaiementPersonnelListView(LoginRequiredMixin, ListView):
+class PaiementPersonnelListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Liste des paiements du personnel"""
     model = PaiementPersonnel
     template_name = 'personnel/paiement_list.html'
@@ -349,3 +349,77 @@ def rejeter_paiement(request, pk):
     
     context = {'paiement': paiement}
     return render(request, 'personnel/paiement_rejeter.html', context)
+
+
+# ===== LOTS DE PAIE =====
+class LotPaieListView(LoginRequiredMixin, ListView):
+    """Liste des paies (lots de paiements)"""
+    model = LotPaie
+    template_name = 'personnel/lot_list.html'
+    context_object_name = 'lots'
+    paginate_by = 20
+    
+    def get_queryset(self):
+        return LotPaie.objects.select_related('saisi_par', 'valide_par').annotate(
+            nombre_paiements=Count('paiements'),
+            montant_total=Sum('paiements__montant')
+        ).order_by('-periode_debut', '-date_creation')
+
+
+@login_required
+def lot_paie_create(request):
+    """Lancer la paie d'une période : création des paiements en attente"""
+    form = LotPaieForm(request.POST or None)
+    
+    if request.method == 'POST' and form.is_valid():
+        try:
+            lot = LotPaie.generer(
+                form.cleaned_data['periode_debut'],
+                form.cleaned_data['periode_fin'],
+                request.user,
+                date_paiement=form.cleaned_data['date_paiement'],
+                mode_paiement=form.cleaned_data['mode_paiement']
+            )
+        except ValidationError as erreur:
+            form.add_error(None, erreur.message)
+        else:
+            messages.success(request, f'{lot} créée : {lot.paiements.count()} paiement(s) en attente.')
+            return redirect('personnel:lot_detail', pk=lot.pk)
+    
+    context = {'form': form}
+    return render(request, 'personnel/lot_form.html', context)
+
+
+class LotPaieDetailView(LoginRequiredMixin, DetailView):
+    """Détails d'une paie : totaux par statut et paiements"""
+    model = LotPaie
+    template_name = 'personnel/lot_detail.html'
+    context_object_name = 'lot'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        paiements = self.object.paiements.select_related('personnel', 'projet').order_by(
+            'personnel__nom', 'personnel__prenom', 'projet__code_projet'
+        )
+        context['paiements'] = Paginator(paiements, 50).get_page(self.request.GET.get('page'))
+        context['totaux_par_statut'] = self.object.paiements.values('statut').annotate(
+            nombre=Count('id'), montant=Sum('montant')
+        ).order_by('statut')
+        context['montant_total'] = sum(ligne['montant'] for ligne in context['totaux_par_statut'])
+        return context
+
+
+@login_required
+def valider_lot_paie(request, pk):
+    """Valider d'un bloc les paiements en attente d'une paie"""
+    lot = get_object_or_404(LotPaie, pk=pk)
+    
+    if request.method == 'POST':
+        try:
+            nombre = lot.valider(request.user)
+        except ValidationError as erreur:
+            messages.error(request, erreur.message)
+        else:
+            messages.success(request, f'{lot} validée : {nombre} paiement(s) validé(s).')
+    
+    return redirect('personnel:lot_detail', pk=pk)
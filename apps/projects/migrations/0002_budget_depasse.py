@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:29
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def initialiser_depassements(apps, schema_editor):
+    """Calcule le drapeau de dépassement des projets existants à partir des soldes"""
+    Projet = apps.get_model('projects', 'Projet')
+    projets = []
+    for projet in Projet.objects.values(
+        'pk', 'montant_prevu', 'solde__total_depots', 'solde__total_depenses'
+    ).iterator():
+        budget_disponible = (
+            (projet['montant_prevu'] or Decimal('0'))
+            + (projet['solde__total_depots'] or Decimal('0'))
+            - (projet['solde__total_depenses'] or Decimal('0'))
+        )
+        if budget_disponible < 0:
+            projets.append(Projet(
+                pk=projet['pk'], budget_depasse=True, montant_depassement=-budget_disponible
+            ))
+    Projet.objects.bulk_update(projets, ['budget_depasse', 'montant_depassement'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        ('finances', '0004_agregatjournalier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projet',
+            name='budget_depasse',
+            field=models.BooleanField(default=False, help_text='Calculé automatiquement', verbose_name='Budget dépassé'),
+        ),
+        migrations.AddField(
+            model_name='projet',
+            name='montant_depassement',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Calculé automatiquement', max_digits=15, verbose_name='Montant du dépassement'),
+        ),
+        migrations.AddIndex(
+            model_name='projet',
+            index=models.Index(fields=['budget_depasse', 'statut'], name='projects_pr_budget__563c05_idx'),
+        ),
+        migrations.RunPython(initialiser_depassements, migrations.RunPython.noop),
+    ]
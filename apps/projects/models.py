@@ -3,7 +3,44 @@ from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
-from datetime import datetime
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast, Coalesce
+from decimal import Decimal
+
+from apps.core.models import SequenceNumerotation
+
+
+class ProjetQuerySet(models.QuerySet):
+    """QuerySet des projets avec annotations financières"""
+    
+    def with_financials(self):
+        """
+        Annote dépôts, retraits, dépenses, budget disponible et pourcentage consommé
+        en une seule requête (jointure sur les soldes matérialisés)
+        """
+        montant = models.DecimalField(max_digits=15, decimal_places=2)
+        zero = Value(Decimal('0'), output_field=montant)
+        return self.annotate(
+            total_depots=Coalesce(F('solde__total_depots'), zero, output_field=montant),
+            total_retraits=Coalesce(F('solde__total_retraits'), zero, output_field=montant),
+            total_depenses=Coalesce(F('solde__total_depenses'), zero, output_field=montant),
+        ).annotate(
+            budget_total=models.ExpressionWrapper(
+                F('montant_prevu') + F('total_depots'), output_field=montant
+            ),
+            budget_disponible=models.ExpressionWrapper(
+                F('montant_prevu') + F('total_depots') - F('total_depenses'), output_field=montant
+            ),
+        ).annotate(
+            pourcentage_budget_consomme=Case(
+                When(
+                    budget_total__gt=0,
+                    then=Cast('total_depenses', FloatField()) * Value(100.0) / Cast('budget_total', FloatField())
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
 
 
 class Projet(models.Model):
@@ -86,6 +123,18 @@ class Projet(models.Model):
         null=True,
         verbose_name='Ville du chantier'
     )
+    budget_depasse = models.BooleanField(
+        default=False,
+        verbose_name='Budget dépassé',
+        help_text='Calculé automatiquement'
+    )
+    montant_depassement = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0.00,
+        verbose_name='Montant du dépassement',
+        help_text='Calculé automatiquement'
+    )
     pourcentage_avancement = models.IntegerField(
         default=0,
         validators=[MinValueValidator(0), MaxValueValidator(100)],
@@ -100,6 +149,8 @@ class Projet(models.Model):
         verbose_name='Date de modification'
     )
     
+    objects = ProjetQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Projet'
         verbose_name_plural = 'Projets'
@@ -109,85 +160,193 @@ class Projet(models.Model):
             models.Index(fields=['statut']),
             models.Index(fields=['client']),
             models.Index(fields=['date_debut', 'date_fin_prevue']),
+            models.Index(fields=['budget_depasse', 'statut']),
         ]
     
     def __str__(self):
         return f"{self.code_projet} - {self.nom_projet}"
     
+    CHAMPS_DEPASSEMENT = ['budget_depasse', 'montant_depassement']
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        projet = super().from_db(db, field_names, values)
+        projet._montant_prevu_charge = projet.__dict__.get('montant_prevu')
+        return projet
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._montant_prevu_charge = self.__dict__.get('montant_prevu')
+    
     def save(self, *args, **kwargs):
         if not self.code_projet:
             # Génération automatique du code projet
-            year = datetime.now().year
-            last_projet = Projet.objects.filter(
-                code_projet__startswith=f'PROJ-{year}-'
-            ).order_by('code_projet').last()
-            
-            if last_projet:
-                last_number = int(last_projet.code_projet.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.code_projet = f'PROJ-{year}-{new_number:03d}'
+            self.code_projet = SequenceNumerotation.prochain_code('PROJ')
+        
+        # Le dépassement n'est recalculé (une lecture du solde) que si le montant
+        # prévu a pu changer ; sinon ses colonnes, tenues à jour par les
+        # transactions, ne sont pas réécrites depuis une instance peut-être périmée
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            recalculer = bool({'montant_prevu', *self.CHAMPS_DEPASSEMENT} & set(update_fields))
+            if recalculer:
+                kwargs['update_fields'] = {*update_fields, *self.CHAMPS_DEPASSEMENT}
+        elif self._state.adding:
+            recalculer = False
+        else:
+            recalculer = self.montant_prevu != getattr(self, '_montant_prevu_charge', None)
+            if not recalculer:
+                differes = self.get_deferred_fields()
+                kwargs['update_fields'] = [
+                    champ.name for champ in self._meta.concrete_fields
+                    if not champ.primary_key and champ.attname not in differes
+                    and champ.name not in self.CHAMPS_DEPASSEMENT
+                ]
+        
+        etat_precedent = None
+        if recalculer:
+            etat_precedent = Projet.objects.filter(pk=self.pk).values(
+                'budget_depasse', 'solde__total_depots', 'solde__total_depenses'
+            ).first()
+        if etat_precedent:
+            self.montant_depassement = Projet.calculer_depassement(
+                self.montant_prevu,
+                etat_precedent['solde__total_depots'],
+                etat_precedent['solde__total_depenses']
+            )
+            self.budget_depasse = self.montant_depassement > 0
         
         super().save(*args, **kwargs)
+        self._montant_prevu_charge = self.montant_prevu
+        
+        if etat_precedent and self.budget_depasse and not etat_precedent['budget_depasse']:
+            self.notifier_depassement()
     
     def get_absolute_url(self):
         return reverse('projects:detail', kwargs={'pk': self.pk})
     
+    def has_financials(self):
+        """Indique si l'instance provient de Projet.objects.with_financials()"""
+        return 'budget_disponible' in self.__dict__
+    
+    def get_soldes(self):
+        """Retourne les soldes du projet (dépôts, retraits, dépenses validés)"""
+        if self.has_financials():
+            return {
+                'total_depots': self.total_depots,
+                'total_retraits': self.total_retraits,
+                'total_depenses': self.total_depenses,
+            }
+        
+        from apps.finances.models import SoldeProjet
+        soldes = SoldeProjet.objects.filter(projet_id=self.pk).values(
+            'total_depots', 'total_retraits', 'total_depenses'
+        ).first()
+        return soldes or {
+            'total_depots': Decimal('0'),
+            'total_retraits': Decimal('0'),
+            'total_depenses': Decimal('0'),
+        }
+    
     def get_total_depots(self):
         """Retourne le total des dépôts validés"""
-        from apps.finances.models import Transaction
-        total = Transaction.objects.filter(
-            projet=self,
-            type='Dépôt',
-            statut='Validée'
-        ).aggregate(total=models.Sum('montant'))['total']
-        return total or 0
+        return self.get_soldes()['total_depots']
     
     def get_total_retraits(self):
         """Retourne le total des retraits validés"""
-        from apps.finances.models import Transaction
-        total = Transaction.objects.filter(
-            projet=self,
-            type='Retrait',
-            statut='Validée'
-        ).aggregate(total=models.Sum('montant'))['total']
-        return total or 0
+        return self.get_soldes()['total_retraits']
     
     def get_total_depenses(self):
         """Retourne le total de toutes les dépenses (Dépenses + Achats + Paiements Personnel)"""
-        from apps.finances.models import Transaction
-        
-        # Total des transactions de type Dépense (inclut achats, dépenses, paiements personnel)
-        total_depenses = Transaction.objects.filter(
-            projet=self,
-            type='Dépense',
-            statut='Validée'
-        ).aggregate(total=models.Sum('montant'))['total'] or 0
-        
-        return total_depenses
+        # Les transactions de type Dépense incluent achats, dépenses et paiements personnel
+        return self.get_soldes()['total_depenses']
     
     def get_solde_disponible(self):
         """Retourne le solde disponible (Dépôts - Retraits)"""
-        return self.get_total_depots() - self.get_total_retraits()
+        soldes = self.get_soldes()
+        return soldes['total_depots'] - soldes['total_retraits']
     
     def get_budget_disponible(self):
         """Retourne le budget disponible (Budget initial + Dépôts - Dépenses)"""
-        return self.montant_prevu + self.get_total_depots() - self.get_total_depenses()
+        if self.has_financials():
+            return self.budget_disponible
+        soldes = self.get_soldes()
+        return self.montant_prevu + soldes['total_depots'] - soldes['total_depenses']
     
     def get_pourcentage_budget_consomme(self):
         """Retourne le pourcentage du budget consommé"""
-        from decimal import Decimal
-        budget_total = self.montant_prevu + self.get_total_depots()
+        if self.has_financials():
+            return self.pourcentage_budget_consomme
+        soldes = self.get_soldes()
+        budget_total = self.montant_prevu + soldes['total_depots']
         if budget_total > 0:
-            return float((self.get_total_depenses() / budget_total) * Decimal('100'))
+            return float((soldes['total_depenses'] / budget_total) * Decimal('100'))
         return 0
     
     def is_budget_depasse(self):
         """Vérifie si le budget est dépassé"""
         return self.get_budget_disponible() < 0
     
+    @staticmethod
+    def calculer_depassement(montant_prevu, total_depots, total_depenses):
+        """Retourne le montant du dépassement de budget (0 si le budget est respecté)"""
+        budget_disponible = Decimal(montant_prevu or 0) + (total_depots or 0) - (total_depenses or 0)
+        return -budget_disponible if budget_disponible < 0 else Decimal('0')
+    
+    @classmethod
+    def actualiser_depassement(cls, projet_id):
+        """
+        Recalcule le drapeau de dépassement d'un projet à partir de son solde
+        et notifie le passage en dépassement
+        """
+        etat = cls.objects.filter(pk=projet_id).values(
+            'montant_prevu', 'budget_depasse', 'montant_depassement',
+            'solde__total_depots', 'solde__total_depenses'
+        ).first()
+        if etat is None:
+            return
+        
+        montant_depassement = cls.calculer_depassement(
+            etat['montant_prevu'], etat['solde__total_depots'], etat['solde__total_depenses']
+        )
+        budget_depasse = montant_depassement > 0
+        if montant_depassement == etat['montant_depassement'] and budget_depasse == etat['budget_depasse']:
+            return
+        
+        cls.objects.filter(pk=projet_id).update(
+            budget_depasse=budget_depasse,
+            montant_depassement=montant_depassement
+        )
+        if budget_depasse and not etat['budget_depasse']:
+            cls.objects.get(pk=projet_id).notifier_depassement()
+    
+    def notifier_depassement(self):
+        """Crée une alerte pour le responsable du projet et les administrateurs/managers"""
+        from django.contrib.auth import get_user_model
+        from apps.core.models import Notification
+        
+        User = get_user_model()
+        destinataires = set(User.objects.filter(
+            models.Q(role__in=['Admin', 'Manager']) | models.Q(is_superuser=True),
+            is_active=True
+        ).values_list('pk', flat=True))
+        if self.responsable_id:
+            destinataires.add(self.responsable_id)
+        
+        Notification.objects.bulk_create([
+            Notification(
+                utilisateur_id=utilisateur_id,
+                titre=f'Budget dépassé : {self.code_projet}',
+                message=(
+                    f'Le projet {self.nom_projet} dépasse son budget de '
+                    f'{self.montant_depassement:,.0f} GNF.'.replace(',', ' ')
+                ),
+                type='Alerte',
+                lien=self.get_absolute_url(),
+            )
+            for utilisateur_id in destinataires
+        ])
+    
     def get_duree_prevue_jours(self):
         """Retourne la durée prévue en jours"""
         if self.date_debut and self.date_fin_prevue:
@@ -305,3 +305,217 @@ class ProjetBudgetTest(TestCase):
         # Vérifier que le budget est dépassé
         self.assertTrue(self.projet.is_budget_depasse())
         self.assertLess(self.projet.get_budget_disponible(), 0)
+
+
+class ProjetWithFinancialsTest(TestCase):
+    """Tests pour Projet.objects.with_financials()"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        
+        self.client = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        
+        self.projet_sain = Projet.objects.create(
+            code_projet='PROJ-TEST-001',
+            nom_projet='Projet Sain',
+            client=self.client,
+            montant_prevu=Decimal('1000000.00'),
+            statut='En_cours'
+        )
+        self.projet_depasse = Projet.objects.create(
+            code_projet='PROJ-TEST-002',
+            nom_projet='Projet Dépassé',
+            client=self.client,
+            montant_prevu=Decimal('1000000.00'),
+            statut='En_cours'
+        )
+        self.projet_vide = Projet.objects.create(
+            code_projet='PROJ-TEST-003',
+            nom_projet='Projet Sans Transaction',
+            client=self.client,
+            statut='Planifié'
+        )
+        
+        for projet, type_transaction, montant in [
+            (self.projet_sain, 'Dépôt', '500000.00'),
+            (self.projet_sain, 'Dépense', '300000.00'),
+            (self.projet_depasse, 'Dépense', '1500000.00'),
+        ]:
+            Transaction.objects.create(
+                projet=projet,
+                type=type_transaction,
+                montant=Decimal(montant),
+                date_transaction=date.today(),
+                saisi_par=self.user
+            )
+    
+    def test_annotations_identiques_aux_methodes(self):
+        """Test : Les annotations donnent les mêmes valeurs que les méthodes"""
+        for projet in Projet.objects.with_financials():
+            reference = Projet.objects.get(pk=projet.pk)
+            self.assertEqual(projet.get_total_depots(), reference.get_total_depots())
+            self.assertEqual(projet.get_total_depenses(), reference.get_total_depenses())
+            self.assertEqual(projet.get_budget_disponible(), reference.get_budget_disponible())
+            self.assertAlmostEqual(
+                projet.get_pourcentage_budget_consomme(),
+                reference.get_pourcentage_budget_consomme()
+            )
+            self.assertEqual(projet.is_budget_depasse(), reference.is_budget_depasse())
+    
+    def test_une_seule_requete(self):
+        """Test : Les méthodes financières ne déclenchent aucune requête supplémentaire"""
+        with self.assertNumQueries(1):
+            projets = list(Projet.objects.with_financials())
+            for projet in projets:
+                projet.get_budget_disponible()
+                projet.get_pourcentage_budget_consomme()
+                projet.is_budget_depasse()
+    
+    def test_filtre_et_tri_en_sql(self):
+        """Test : Dépassement de budget et classement par dépenses en SQL"""
+        depasses = Projet.objects.with_financials().filter(budget_depasse=True)
+        self.assertEqual(list(depasses), [self.projet_depasse])
+        
+        top = list(Projet.objects.with_financials().order_by('-total_depenses'))
+        self.assertEqual(top[0], self.projet_depasse)
+        self.assertEqual(top[-1], self.projet_vide)
+        self.assertEqual(top[-1].total_depenses, Decimal('0'))
+
+
+class ProjetDepassementBudgetTest(TestCase):
+    """Tests pour le drapeau persistant de dépassement de budget"""
+    
+    def setUp(self):
+        """Préparation des données de test"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            password='testpass123',
+            role='Manager'
+        )
+        self.client = Client.objects.create(
+            nom_complet='Client Test',
+            telephone='622000000'
+        )
+        self.projet = Projet.objects.create(
+            code_projet='PROJ-TEST-001',
+            nom_projet='Projet Test Budget',
+            client=self.client,
+            responsable=self.user,
+            montant_prevu=Decimal('1000000.00'),
+            statut='En_cours'
+        )
+    
+    def creer_transaction(self, type_transaction, montant, **kwargs):
+        return Transaction.objects.create(
+            projet=self.projet,
+            type=type_transaction,
+            montant=Decimal(montant),
+            date_transaction=date.today(),
+            saisi_par=self.user,
+            **kwargs
+        )
+    
+    def test_drapeau_maintenu_par_les_transactions(self):
+        """Test : Le drapeau suit les dépenses et dépôts validés"""
+        transaction = self.creer_transaction('Dépense', '1500000.00')
+        self.projet.refresh_from_db()
+        self.assertTrue(self.projet.budget_depasse)
+        self.assertEqual(self.projet.montant_depassement, Decimal('500000.00'))
+        
+        self.creer_transaction('Dépôt', '200000.00')
+        self.projet.refresh_from_db()
+        self.assertEqual(self.projet.montant_depassement, Decimal('300000.00'))
+        
+        transaction.delete()
+        self.projet.refresh_from_db()
+        self.assertFalse(self.projet.budget_depasse)
+        self.assertEqual(self.projet.montant_depassement, Decimal('0'))
+    
+    def test_transaction_en_attente_ignoree(self):
+        """Test : Une dépense en attente ne déclenche pas le dépassement"""
+        self.creer_transaction('Dépense', '1500000.00', statut='En_attente')
+        self.projet.refresh_from_db()
+        self.assertFalse(self.projet.budget_depasse)
+    
+    def test_modification_du_budget_prevu(self):
+        """Test : Modifier le montant prévu recalcule le drapeau"""
+        self.creer_transaction('Dépense', '1500000.00')
+        projet = Projet.objects.get(pk=self.projet.pk)
+        projet.montant_prevu = Decimal('2000000.00')
+        projet.save()
+        projet.refresh_from_db()
+        self.assertFalse(projet.budget_depasse)
+        
+        projet.montant_prevu = Decimal('1000000.00')
+        projet.save()
+        projet.refresh_from_db()
+        self.assertTrue(projet.budget_depasse)
+        self.assertEqual(projet.montant_depassement, Decimal('500000.00'))
+    
+    def test_modification_du_budget_prevu_par_champs(self):
+        """Test : save(update_fields=...) enregistre le drapeau recalculé et n'alerte qu'une fois"""
+        from apps.core.models import Notification
+        
+        self.creer_transaction('Dépense', '900000.00')
+        alertes = Notification.objects.filter(type='Alerte', lien=self.projet.get_absolute_url())
+        projet = Projet.objects.get(pk=self.projet.pk)
+        projet.montant_prevu = Decimal('800000.00')
+        projet.save(update_fields=['montant_prevu'])
+        projet.save(update_fields=['montant_prevu'])
+        
+        projet.refresh_from_db()
+        self.assertTrue(projet.budget_depasse)
+        self.assertEqual(projet.montant_depassement, Decimal('100000.00'))
+        self.assertEqual(alertes.count(), 2)
+    
+    def test_enregistrement_sans_changement_de_budget(self):
+        """Test : Sans changement du montant prévu, save() ne relit pas le solde ni ne réécrit le drapeau"""
+        projet = Projet.objects.get(pk=self.projet.pk)
+        self.creer_transaction('Dépense', '1500000.00')
+        projet.description = 'Description modifiée'
+        
+        with self.assertNumQueries(1):
+            projet.save()
+        
+        projet.refresh_from_db()
+        self.assertEqual(projet.description, 'Description modifiée')
+        self.assertTrue(projet.budget_depasse)
+        
+        with self.assertNumQueries(1):
+            projet.save(update_fields=['description'])
+    
+    def test_notification_au_passage_en_depassement(self):
+        """Test : Une alerte est créée uniquement lors du passage en dépassement"""
+        from apps.core.models import Notification
+        
+        self.creer_transaction('Dépense', '1500000.00')
+        alertes = Notification.objects.filter(type='Alerte', lien=self.projet.get_absolute_url())
+        self.assertEqual(
+            set(alertes.values_list('utilisateur', flat=True)),
+            {self.user.pk, self.manager.pk}
+        )
+        
+        # Dépassement aggravé : pas de nouvelle alerte
+        self.creer_transaction('Dépense', '100000.00')
+        self.assertEqual(alertes.count(), 2)
+    
+    def test_modification_transaction_sans_fausse_alerte(self):
+        """Test : Modifier un dépôt ne crée pas d'alerte transitoire"""
+        from apps.core.models import Notification
+        
+        depot = self.creer_transaction('Dépôt', '500000.00')
+        self.creer_transaction('Dépense', '1200000.00')
+        depot.description = 'Dépôt corrigé'
+        depot.save()
+        self.assertFalse(Notification.objects.exists())
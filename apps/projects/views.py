@@ -17,7 +17,7 @@ class ProjetListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        queryset = Projet.objects.select_related('client', 'responsable').all()
+        queryset = Projet.objects.select_related('client', 'responsable').with_financials()
         
         # Filtres
         search = self.request.GET.get('search')
@@ -47,6 +47,9 @@ class ProjetDetailView(LoginRequiredMixin, DetailView):
     template_name = 'projects/projet_detail.html'
     context_object_name = 'projet'
     
+    def get_queryset(self):
+        return Projet.objects.with_financials()
+    
     def get_context_data(self, **kwargs):
         from django.db.models import Sum, Count
         from django.db.models.functions import TruncDate
@@ -110,6 +110,16 @@ if DB_ENGINE == 'django.db.backends.sqlite3':
         'default': {
             'ENGINE': DB_ENGINE,
             'NAME': BASE_DIR / config('DB_NAME', default='db.sqlite3'),
+            # Attente du verrou d'écriture (5 s par défaut) : les reports de mouvements
+            # concurrents se mettent en file au lieu d'échouer
+            'OPTIONS': {
+                'timeout': 30,
+            },
+            # Base de test sur fichier : les tests multi-threads ont besoin du verrouillage
+            # SQLite réel (le cache partagé en mémoire échoue au lieu d'attendre)
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 else:
@@ -251,6 +261,25 @@ CURRENCY_SYMBOL = 'GNF'
 # Pagination
 ITEMS_PER_PAGE = 20
 
+# Cache (mémoire locale par défaut ; utiliser un cache partagé, par exemple
+# django.core.cache.backends.filebased.FileBasedCache ou db.DatabaseCache,
+# lorsque plusieurs processus servent l'application)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='etragc'),
+    }
+}
+
+# Durée de vie maximale (secondes) des instantanés du tableau de bord en cache.
+# Ils sont invalidés à chaque écriture ; ce délai n'est qu'un filet de sécurité.
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=300, cast=int)
+
+# Passage automatique des factures échues en retard depuis le processus web.
+# Désactivé par défaut : préférer une tâche planifiée lançant age_overdue_invoices.
+FACTURES_RETARD_AUTO = config('FACTURES_RETARD_AUTO', default=False, cast=bool)
+FACTURES_RETARD_INTERVALLE = config('FACTURES_RETARD_INTERVALLE', default=86400, cast=int)  # secondes
+
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB